@@ -0,0 +1,262 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+import numpy as np
+from loguru import logger
+
+from backend.analysis_store import AnalysisStore, hash_file
+
+# 算法调整后递增，旧的缓存特征会被重新计算
+FEATURES_VERSION = 1
+
+SAMPLE_RATE = 16000
+FRAME_MS = 40
+HOP_MS = 10
+F0_MIN = 60.0
+F0_MAX = 500.0
+VOICED_THRESHOLD = 0.45  # 归一化自相关峰值
+MIN_VOICED_FRAMES = 20
+
+# 只有预估值之间差距足够大时才给出性别/年龄判断
+MALE_F0_MAX = 160.0
+FEMALE_F0_MIN = 180.0
+CHILD_F0_MIN = 280.0
+
+
+def load_mono(file_path: str, sample_rate: int = SAMPLE_RATE, max_seconds: float = 30.0) -> np.ndarray:
+    """解码为单声道 float32 采样（-1~1），最多取前 max_seconds 秒"""
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(file_path)
+    audio = audio[:int(max_seconds * 1000)].set_channels(1).set_frame_rate(sample_rate)
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    return samples / float(1 << (8 * audio.sample_width - 1))
+
+
+def _frames(samples: np.ndarray, frame_len: int, hop: int) -> np.ndarray:
+    """切分为重叠帧 (帧数, frame_len)，不复制数据"""
+    if len(samples) < frame_len:
+        samples = np.pad(samples, (0, frame_len - len(samples)))
+    return np.lib.stride_tricks.sliding_window_view(samples, frame_len)[::hop]
+
+
+def _count_syllables(env_db: np.ndarray, active: np.ndarray, radius: int = 6, min_rise_db: float = 3.0) -> int:
+    """按能量包络的局部峰值估算音节数"""
+    if len(env_db) < 2 * radius + 1:
+        return 0
+    smoothed = np.convolve(env_db, np.ones(5) / 5, mode='same')
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(smoothed, radius, mode='edge'), 2 * radius + 1)
+    is_peak = (smoothed == windows.max(axis=1)) & (smoothed - windows.min(axis=1) >= min_rise_db) & active
+    # 平台上的相邻帧只算一个峰
+    return int(np.count_nonzero(is_peak[1:] & ~is_peak[:-1]) + int(is_peak[0]))
+
+
+def extract_features(file_path: str, sample_rate: int = SAMPLE_RATE, max_seconds: float = 30.0) -> dict:
+    """
+    计算本地声学特征（纯 CPU，在进程池中运行）
+
+    返回:
+        dict: 时长、基频统计（Hz）、浊音占比、频谱质心（Hz）、响度统计（dBFS）、语速（音节/秒）。
+              浊音帧太少时基频相关字段为 None。
+    """
+    samples = load_mono(file_path, sample_rate, max_seconds)
+    frame_len = sample_rate * FRAME_MS // 1000
+    hop = sample_rate * HOP_MS // 1000
+    frames = _frames(samples, frame_len, hop)
+
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    rms_db = 20 * np.log10(rms)
+    # 有声段：比最响帧低 35dB 以内且高于 -55dBFS
+    active = (rms_db > rms_db.max() - 35) & (rms_db > -55)
+
+    # 帧自相关（FFT 计算），在 F0_MIN~F0_MAX 对应的时延范围内找峰值
+    windowed = (frames - frames.mean(axis=1, keepdims=True)) * np.hanning(frame_len)
+    spectrum = np.fft.rfft(windowed, n=2 * frame_len, axis=1)
+    autocorr = np.fft.irfft(np.abs(spectrum) ** 2, axis=1)[:, :frame_len]
+    autocorr /= autocorr[:, :1] + 1e-12
+    min_lag = int(sample_rate / F0_MAX)
+    max_lag = min(int(sample_rate / F0_MIN), frame_len - 1)
+    lags = np.argmax(autocorr[:, min_lag:max_lag], axis=1) + min_lag
+    strength = autocorr[np.arange(len(lags)), lags]
+    voiced = active & (strength > VOICED_THRESHOLD)
+    f0 = sample_rate / lags[voiced]
+
+    # 频谱质心（有声帧的平均值）
+    magnitude = np.abs(spectrum[:, ::2])
+    freqs = np.fft.rfftfreq(frame_len, 1 / sample_rate)[:magnitude.shape[1]]
+    centroid = (magnitude @ freqs) / (magnitude.sum(axis=1) + 1e-12)
+
+    active_db = rms_db[active]
+    active_seconds = np.count_nonzero(active) * HOP_MS / 1000
+    syllables = _count_syllables(rms_db, active)
+
+    has_f0 = len(f0) >= MIN_VOICED_FRAMES
+    return {
+        'version': FEATURES_VERSION,
+        'duration': round(len(samples) / sample_rate, 2),
+        'f0Median': round(float(np.median(f0)), 1) if has_f0 else None,
+        'f0P10': round(float(np.percentile(f0, 10)), 1) if has_f0 else None,
+        'f0P90': round(float(np.percentile(f0, 90)), 1) if has_f0 else None,
+        # 音高起伏（半音标准差）
+        'f0RangeSemitones': round(float(np.std(12 * np.log2(f0 / np.median(f0)))), 2) if has_f0 else None,
+        'voicedRatio': round(float(np.count_nonzero(voiced) / max(np.count_nonzero(active), 1)), 3),
+        'spectralCentroid': round(float(centroid[active].mean()), 1) if active.any() else 0.0,
+        'loudnessDb': round(float(active_db.mean()), 1) if active.any() else -120.0,
+        'loudnessStdDb': round(float(active_db.std()), 2) if active.any() else 0.0,
+        'dynamicRangeDb': round(float(np.percentile(active_db, 95) - np.percentile(active_db, 10)), 1)
+        if active.any() else 0.0,
+        'speakingRate': round(float(syllables / active_seconds), 2) if active_seconds > 0 else 0.0
+    }
+
+
+def estimate_attributes(features: dict) -> dict:
+    """根据声学特征粗略预估性别/年龄段/标签（取值与 parse_analysis 一致，无法判断时为“未知”）"""
+    gender = "未知"
+    age = "未知"
+    tags: list[str] = []
+    f0 = features.get('f0Median')
+
+    if f0 is not None:
+        if f0 >= CHILD_F0_MIN:
+            age = "8-12岁"
+        elif f0 <= MALE_F0_MAX:
+            gender = "男"
+        elif f0 >= FEMALE_F0_MIN:
+            gender = "女"
+
+        if f0 < 110:
+            tags.append('低沉')
+        elif f0 > 240:
+            tags.append('高亢')
+        if features.get('f0RangeSemitones', 0) < 1.5:
+            tags.append('平静')
+        elif features.get('f0RangeSemitones', 0) > 4:
+            tags.append('活泼')
+
+    centroid = features.get('spectralCentroid', 0)
+    if centroid > 2000:
+        tags.append('明亮')
+    elif 0 < centroid < 900:
+        tags.append('浑厚')
+
+    rate = features.get('speakingRate', 0)
+    if rate > 5.5:
+        tags.append('快速')
+    elif 0 < rate < 3:
+        tags.append('缓慢')
+
+    if features.get('dynamicRangeDb', 0) > 25:
+        tags.append('有力')
+
+    return {'gender': gender, 'age': age, 'tags': tags}
+
+
+def check_analysis(result: dict, features: dict) -> list[str]:
+    """用声学特征核对远程分析结果，返回可疑之处（为空表示没有明显矛盾）"""
+    warnings: list[str] = []
+    f0 = features.get('f0Median')
+    if f0 is None:
+        return warnings
+
+    if result.get('gender') == "男" and f0 > 200:
+        warnings.append(f"性别为男但基频中位数 {f0:.0f}Hz 偏高")
+    elif result.get('gender') == "女" and f0 < 140:
+        warnings.append(f"性别为女但基频中位数 {f0:.0f}Hz 偏低")
+
+    if result.get('age') in ("5-7岁", "8-12岁") and f0 < 180:
+        warnings.append(f"年龄段为儿童但基频中位数 {f0:.0f}Hz 偏低")
+
+    return warnings
+
+
+class FeatureExtractor:
+    """在进程池中批量提取声学特征，结果按内容哈希缓存在 AnalysisStore"""
+
+    def __init__(self, store: Optional[AnalysisStore] = None, num_workers: int = 0):
+        self.store = store
+        self.num_workers = num_workers
+        self.is_running = False
+        self.should_stop = False
+
+    def get(self, file_path: str) -> dict:
+        """获取单个文件的特征（优先使用缓存）"""
+        content_hash = hash_file(file_path)
+        features = self.store.get_features(content_hash, FEATURES_VERSION) if self.store else None
+        if features is None:
+            features = extract_features(file_path)
+            if self.store:
+                self.store.put_features(content_hash, features)
+        return features
+
+    def run(self, files: list[str], on_result: Callable[[str, Optional[dict], str], None]) -> dict:
+        """
+        提取一批文件的特征
+
+        参数:
+            files: 音频文件路径
+            on_result: 每个文件完成时回调 (路径, 特征或 None, 错误信息)
+
+        返回:
+            dict: {'total', 'done', 'cached', 'failed'}
+        """
+        self.is_running = True
+        self.should_stop = False
+        counts = {'total': len(files), 'done': 0, 'cached': 0, 'failed': 0}
+
+        def finish(path: str, features: Optional[dict], error: str = ""):
+            counts['done' if features is not None else 'failed'] += 1
+            on_result(path, features, error)
+
+        try:
+            # 哈希在线程池中计算（hashlib 处理大块数据时释放 GIL），命中缓存的直接返回
+            pending: list[tuple[str, str]] = []
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as hashers:
+                for path, content_hash in hashers.map(lambda p: (p, _safe_hash(p)), files):
+                    if self.should_stop:
+                        hashers.shutdown(cancel_futures=True)
+                        break
+                    if not content_hash:
+                        finish(path, None, "无法读取文件")
+                        continue
+                    cached = self.store.get_features(content_hash, FEATURES_VERSION) if self.store else None
+                    if cached is not None:
+                        counts['cached'] += 1
+                        finish(path, cached)
+                    else:
+                        pending.append((path, content_hash))
+
+            if pending and not self.should_stop:
+                with ProcessPoolExecutor(max_workers=self.num_workers or None) as executor:
+                    futures = {executor.submit(extract_features, path): (path, h) for path, h in pending}
+                    for future in as_completed(futures):
+                        if self.should_stop:
+                            executor.shutdown(cancel_futures=True)
+                            break
+                        path, content_hash = futures[future]
+                        try:
+                            features = future.result()
+                        except Exception as e:
+                            logger.warning(f"Feature extraction failed for {path}: {e}")
+                            finish(path, None, str(e))
+                            continue
+                        if self.store:
+                            self.store.put_features(content_hash, features)
+                        finish(path, features)
+        finally:
+            self.is_running = False
+
+        logger.info(f"Acoustic features: {counts['done']}/{counts['total']} done "
+                    f"({counts['cached']} cached, {counts['failed']} failed)")
+        return counts
+
+    def stop(self):
+        """停止提取"""
+        self.should_stop = True
+
+
+def _safe_hash(file_path: str) -> str:
+    try:
+        return hash_file(file_path)
+    except OSError:
+        return ""
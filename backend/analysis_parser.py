@@ -0,0 +1,246 @@
+import json
+import re
+from typing import Optional
+
+AnalysisFields = tuple[str, str, str, str, list[str], str]
+
+SECTION_PATTERN = re.compile(r'【(好听的名称|年龄段|声音类型|声音特征|详细描述)】')
+SECTION_KEYS = {
+    '好听的名称': 'name',
+    '年龄段': 'age',
+    '声音类型': 'type',
+    '声音特征': 'tags',
+    '详细描述': 'description',
+}
+
+# 年龄段（下限, 上限, 名称），按数字范围的中点归类
+AGE_BANDS = [
+    (5, 7, "5-7岁"),
+    (8, 12, "8-12岁"),
+    (13, 18, "13-18岁"),
+    (18, 25, "18-25岁"),
+    (25, 35, "25-35岁"),
+    (35, 50, "35-50岁"),
+    (50, 200, "50岁+"),
+]
+AGE_RANGE_PATTERN = re.compile(r'(\d{1,3})\s*(?:岁)?\s*[-~～—–至到]\s*(\d{1,3})')
+AGE_ABOVE_PATTERN = re.compile(r'(\d{1,3})\s*岁?\s*(?:以上|\+|＋)')
+AGE_SINGLE_PATTERN = re.compile(r'(\d{1,3})\s*岁')
+# 没有数字时按词语判断，“男孩/女孩”这类称呼最弱，放在最后
+AGE_WORDS = {
+    '幼儿': "5-7岁", '幼童': "5-7岁",
+    '少年': "13-18岁", '少女': "13-18岁",
+    '青年': "18-25岁",
+    '中年': "35-50岁",
+    '老年': "50岁+", '老人': "50岁+", '老者': "50岁+",
+    '儿童': "8-12岁", '童声': "8-12岁", '小孩': "8-12岁", '男孩': "8-12岁", '女孩': "8-12岁",
+}
+AGE_WORD_PATTERN = re.compile('|'.join(AGE_WORDS))
+
+TAG_SEPARATOR = re.compile(r'[|｜]')
+TAG_KEYWORDS = ['明亮', '沙哑', '圆润', '尖细', '活泼', '温柔', '深沉', '清脆', '沙沙',
+                '成熟', '稚嫩', '柔和', '有力', '高亢', '低沉', '快速', '缓慢', '标准',
+                '方言', '口音', '甜美', '冷漠', '热情', '平静', '性感', '呆萌', '沧桑',
+                '磁性', '爽朗', '文艺', '知性', '俏皮', '浑厚', '轻柔']
+# 所有关键词合成一个正则一次扫描全文（对中文短词比逐个 in 查找快数倍），结果按关键词表排序
+TAG_KEYWORD_PATTERN = re.compile('|'.join(map(re.escape, sorted(TAG_KEYWORDS, key=len, reverse=True))))
+TAG_KEYWORD_ORDER = {k: i for i, k in enumerate(TAG_KEYWORDS)}
+DEFAULT_TAGS = ['参考音', '清晰', '自然']
+MAX_TAGS = 8
+
+JSON_BLOCK_PATTERN = re.compile(r'\{.*\}', re.S)
+
+
+def _age_band(low: int, high: int) -> str:
+    """把数字年龄范围归入最接近的年龄段"""
+    middle = (low + high) / 2
+    for _, band_high, band in AGE_BANDS:
+        if middle <= band_high:
+            return band
+    return AGE_BANDS[-1][2]
+
+
+def _age_band_from(age: int) -> str:
+    """“X 岁”“X 岁以上”归入下限不超过 X 的最后一个年龄段"""
+    band = AGE_BANDS[0][2]
+    for band_low, _, name in AGE_BANDS:
+        if band_low <= age:
+            band = name
+    return band
+
+
+def parse_age(text: str) -> str:
+    """从文本中识别年龄段，无法识别时返回“未知”"""
+    match = AGE_RANGE_PATTERN.search(text)
+    if match:
+        low, high = sorted((int(match.group(1)), int(match.group(2))))
+        if AGE_BANDS[0][0] <= low and high < 120:
+            return _age_band(low, high)
+    match = AGE_ABOVE_PATTERN.search(text)
+    if match:
+        return _age_band_from(int(match.group(1)))
+    match = AGE_SINGLE_PATTERN.search(text)
+    if match:
+        # 单个年龄落在两段交界（如 18 岁）时归入从该岁数开始的年龄段
+        return _age_band_from(int(match.group(1)))
+    words = AGE_WORD_PATTERN.findall(text)
+    if words:
+        # 按表中的优先级取，而不是按出现顺序
+        return AGE_WORDS[min(words, key=list(AGE_WORDS).index)]
+    return "未知"
+
+
+def parse_gender(text: str) -> str:
+    """识别性别（同时出现时以“女”优先，与旧版一致）"""
+    if '女' in text:
+        return "女"
+    if '男' in text:
+        return "男"
+    return "未知"
+
+
+def parse_voice_type(text: str) -> str:
+    """识别声音类型，默认配音"""
+    return "解说" if '解说' in text else "配音"
+
+
+def _finish_tags(tags: list[str], full_text: str) -> list[str]:
+    """去重，标签不足 3 个时从全文补充关键词和默认标签，最多 MAX_TAGS 个"""
+    tags = list(dict.fromkeys(tags))
+    if len(tags) < 3:
+        found = sorted(set(TAG_KEYWORD_PATTERN.findall(full_text)), key=TAG_KEYWORD_ORDER.__getitem__)
+        tags = list(dict.fromkeys(tags + found))
+        if len(tags) < 3:
+            tags = (tags + [t for t in DEFAULT_TAGS if t not in tags])[:3]
+    return tags[:MAX_TAGS]
+
+
+def _split_sections(analysis_text: str) -> dict[str, str]:
+    """按【标题】切分为各段正文（标题同一行的内容算作正文第一行）"""
+    sections: dict[str, str] = {}
+    parts = SECTION_PATTERN.split(analysis_text)
+    # parts: [前言, 标题1, 内容1, 标题2, 内容2, ...]
+    for title, body in zip(parts[1::2], parts[2::2]):
+        key = SECTION_KEYS[title]
+        sections[key] = f"{sections[key]}\n{body}" if key in sections else body
+    return sections
+
+
+def parse_analysis(analysis_text: str) -> AnalysisFields:
+    """解析AI分析结果（按【标题】分段的文本格式）"""
+    sections = _split_sections(analysis_text)
+
+    name = "未知"
+    for line in sections.get('name', '').splitlines():
+        line = line.strip()
+        if line and len(line) <= 6 and ':' not in line and '：' not in line:
+            name = line
+            break
+
+    age_text = sections.get('age', '')
+    age = parse_age(age_text)
+    gender = parse_gender(age_text)
+
+    voice_type = parse_voice_type(sections.get('type', ''))
+
+    tags: list[str] = []
+    tags_text = sections.get('tags', '')
+    if TAG_SEPARATOR.search(tags_text):
+        tags = [t.strip() for t in TAG_SEPARATOR.split(tags_text.replace('\n', '|')) if t.strip()]
+    else:
+        tags = [line.strip() for line in tags_text.splitlines()
+                if line.strip() and ':' not in line and '：' not in line]
+    tags = _finish_tags(tags, analysis_text)
+
+    # 多行描述合并为一行
+    description = ' '.join(sections.get('description', '').split()) or analysis_text
+
+    return name, age, gender, voice_type, tags, description
+
+
+def _load_json_object(text: str) -> Optional[dict]:
+    """从回复中取出 JSON 对象（兼容 ```json 代码块和前后多余文字）"""
+    match = JSON_BLOCK_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_analysis_json(analysis_text: str) -> AnalysisFields:
+    """
+    解析 JSON 格式的分析结果，字段值按文本格式的取值规范化；不是合法 JSON 时退回文本解析
+
+    缺少 description 时描述留空，不回退为整段 JSON 原文
+    """
+    data = _load_json_object(analysis_text)
+    if data is None:
+        return parse_analysis(analysis_text)
+
+    name = str(data.get('name') or '').strip()
+    if not name or len(name) > 6:
+        name = "未知"
+
+    age_value = str(data.get('age') or '')
+    age = age_value if age_value in {band for _, _, band in AGE_BANDS} else parse_age(age_value)
+    gender = parse_gender(str(data.get('gender') or ''))
+    voice_type = parse_voice_type(str(data.get('type') or ''))
+
+    raw_tags = data.get('tags') or []
+    if isinstance(raw_tags, str):
+        raw_tags = TAG_SEPARATOR.split(raw_tags)
+    description = ' '.join(str(data.get('description') or '').split())
+    tags = _finish_tags([str(t).strip() for t in raw_tags if str(t).strip()], description)
+
+    return name, age, gender, voice_type, tags, description
+
+
+def _benchmark(db_path: str, repeat: int):
+    """用 AnalysisStore 中保存的原始回复测试解析速度，并统计与已保存结果不一致的条数"""
+    import sqlite3
+    import time
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT raw, result FROM analysis_results WHERE status = 'done' AND raw != ''"
+    ).fetchall()
+    conn.close()
+    if not rows:
+        print(f"No stored responses in {db_path}")
+        return
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parsed = [(parse_analysis_json if raw.lstrip().startswith(('{', '```')) else parse_analysis)(raw)
+                  for raw, _ in rows]
+    elapsed = time.perf_counter() - started
+
+    keys = ('name', 'age', 'gender', 'type', 'tags', 'description')
+    changed = {k: 0 for k in keys}
+    unknown_age = 0
+    for (_, stored), fields in zip(rows, parsed):
+        stored = json.loads(stored)
+        for key, value in zip(keys, fields):
+            if stored.get(key) != value:
+                changed[key] += 1
+        unknown_age += fields[1] == "未知"
+
+    total = len(rows) * repeat
+    print(f"{len(rows)} responses x {repeat}: {elapsed * 1000:.1f} ms, "
+          f"{elapsed / total * 1e6:.1f} us/response, {total / elapsed:.0f} responses/s")
+    print(f"Unknown age: {unknown_age}/{len(rows)}")
+    print("Differs from stored result: " + ', '.join(f"{k}={v}" for k, v in changed.items()))
+
+
+if __name__ == '__main__':
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Benchmark parse_analysis against stored responses")
+    parser.add_argument('--db', default=str(Path.home() / ".config" / "hetang_dubbing" / "analysis_results.db"))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    _benchmark(args.db, args.repeat)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_results (
+    content_hash TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    result TEXT NOT NULL DEFAULT '{}',
+    error TEXT NOT NULL DEFAULT '',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    raw TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS acoustic_features (
+    content_hash TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    features TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容哈希"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class AnalysisStore:
+    """按文件内容哈希持久化的分析结果
+
+    同一内容的音频无论移动到哪里、在哪次分析中出现都只需远程分析一次；
+    失败的记录会保留错误信息，下次运行时重试。
+    """
+
+    def __init__(self, config_dir: Optional[Path] = None):
+        if config_dir is None:
+            config_dir = Path.home() / ".config" / "hetang_dubbing"
+        self.config_dir = Path(config_dir)
+        self.config_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = self.config_dir / "analysis_results.db"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """旧版数据库补充 raw 列（保存模型原始回复，便于重新解析）"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analysis_results)")}
+        if 'raw' not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE analysis_results ADD COLUMN raw TEXT NOT NULL DEFAULT ''")
+
+    def get(self, content_hash: str) -> Optional[dict]:
+        """获取已成功的分析结果（不含路径），没有或失败时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM analysis_results WHERE content_hash = ? AND status = 'done'",
+                (content_hash,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, content_hash: str, result: dict, raw: str = ""):
+        """保存成功的分析结果（raw 为模型原始回复）"""
+        data = {k: v for k, v in result.items() if k != 'path'}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO analysis_results (content_hash, status, result, error, attempts, updated_at, raw) "
+                "VALUES (?, 'done', ?, '', 1, ?, ?) "
+                "ON CONFLICT(content_hash) DO UPDATE SET status = 'done', result = excluded.result, "
+                "error = '', attempts = attempts + 1, updated_at = excluded.updated_at, raw = excluded.raw",
+                (content_hash, json.dumps(data, ensure_ascii=False), time.time(), raw)
+            )
+
+    def put_failure(self, content_hash: str, error: str):
+        """记录失败（不会覆盖已有的成功结果）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO analysis_results (content_hash, status, error, attempts, updated_at) "
+                "VALUES (?, 'failed', ?, 1, ?) "
+                "ON CONFLICT(content_hash) DO UPDATE SET error = excluded.error, attempts = attempts + 1, "
+                "updated_at = excluded.updated_at WHERE status != 'done'",
+                (content_hash, error, time.time())
+            )
+
+    def get_features(self, content_hash: str, version: int) -> Optional[dict]:
+        """获取本地声学特征，没有或算法版本不一致时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT features FROM acoustic_features WHERE content_hash = ? AND version = ?",
+                (content_hash, version)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_features(self, content_hash: str, features: dict):
+        """保存本地声学特征"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO acoustic_features (content_hash, version, features, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (content_hash, features.get('version', 0), json.dumps(features), time.time())
+            )
+
+    def stats(self) -> dict:
+        """统计各状态数量"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM analysis_results GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
@@ -1,39 +1,92 @@
+import base64
 import os
 import threading
+import time
+import uuid
 import webview
 from pathlib import Path
 from typing import Optional
 from loguru import logger
 
-from backend.audio_service import AudioAnalyzer, find_audio_files
+from backend.acoustic_features import FeatureExtractor, estimate_attributes
+from backend.analysis_store import AnalysisStore
+from backend.audio_service import AnalyzerSettings, AudioAnalyzer, find_audio_files
+from backend.event_bus import EventBus
+from backend.project_export import DEFAULT_CHAPTER_PATTERN, SPLIT_MODES, ProjectExporter
 from backend.project_manager import ProjectManager
 from backend.global_config import GlobalConfig
+from backend.library_watcher import LibraryWatcher
+from backend.metadata_index import MetadataIndex
+from backend.metrics import MetricsRegistry, MetricsServer, performance_report
+from backend.output_verifier import verify_outputs
+from backend.scan_index import ScanIndex
+from backend.subtitles import SUBTITLE_FORMATS, build_cues, write_subtitles
 from backend.tts_service import TTSService
+from backend.voice_index import NotEnoughVoicesError, VoiceIndex
+from backend.waveform_peaks import PeakStore, Peaks
 
 
 class Api:
     """暴露给前端的 API"""
 
     def __init__(self):
-        self.analyzer = AudioAnalyzer()
+        self.global_config = GlobalConfig()
+        self.scan_index = ScanIndex()
+        self.analyzer = AudioAnalyzer(
+            AnalyzerSettings.from_config(self.global_config.config['analyzer']),
+            scan_index=self.scan_index,
+            store=AnalysisStore()
+        )
+        self.feature_extractor = FeatureExtractor(self.analyzer.store)
         self.selected_directory: str = ""
         self.audio_files: list[str] = []
         self._window = None
+        self._event_bus: Optional[EventBus] = None
         self._analysis_thread: Optional[threading.Thread] = None
+        self._library_watcher: Optional[LibraryWatcher] = None
         self.project_manager = ProjectManager()
-        self.global_config = GlobalConfig()
-        self.tts_service = TTSService()
+        self.metadata_index = MetadataIndex()
+        self.voice_index = VoiceIndex()
+        self.peak_store = PeakStore()
+        tts_config = self.global_config.config['tts']
+        self.tts_service = TTSService(
+            time_stretch_quality=tts_config.get('time_stretch_quality', 'balanced'),
+            postprocess_workers=tts_config.get('postprocess_workers', 0)
+        )
+        self.exporter = ProjectExporter(self.tts_service.workers)
+        self.metrics = MetricsRegistry()
+        self.metrics_server: Optional[MetricsServer] = None
+        metrics_port = self.global_config.config.get('metrics', {}).get('prometheus_port', 0)
+        if metrics_port:
+            self.metrics_server = MetricsServer(self.metrics, metrics_port)
+            self.metrics_server.start()
 
     def set_window(self, window):
         """设置 window 引用（仅用于 evaluate_js）"""
         self._window = window
+        if self._event_bus:
+            self._event_bus.stop()
+        self._event_bus = EventBus(self._push_events)
+        self._event_bus.start()
 
-    def _notify_frontend(self, event: str, data: dict):
-        """通知前端事件"""
+    def _push_events(self, js_batch: str):
+        """一次性推送一批事件到前端"""
         if self._window:
-            import json
-            js_data = json.dumps(data, ensure_ascii=False)
-            self._window.evaluate_js(f'window.onBackendEvent && window.onBackendEvent("{event}", {js_data})')
+            self._window.evaluate_js(
+                f'window.onBackendEvents ? window.onBackendEvents({js_batch}) : '
+                f'{js_batch}.forEach(e => window.onBackendEvent && window.onBackendEvent(e.event, e.data))'
+            )
+
+    def _notify_frontend(self, event: str, data: dict, key=None):
+        """通知前端事件（同一事件名下，同一文件或同一行的未推送旧事件会被新事件取代）"""
+        if not self._event_bus:
+            return
+        if key is None:
+            if data.get('file') is not None:
+                key = (event, 'file', data['file'])
+            elif data.get('line_index') is not None:
+                key = (event, 'line', data['line_index'])
+        self._event_bus.emit(event, data, key)
 
     def select_directory(self) -> dict:
         """选择目录"""
@@ -54,7 +107,7 @@ class Api:
         if not os.path.isdir(target_dir):
             return {'success': False, 'files': [], 'error': 'Directory does not exist'}
 
-        self.audio_files = find_audio_files(target_dir)
+        self.audio_files = find_audio_files(target_dir, self.scan_index)
         self.selected_directory = target_dir
 
         file_list = []
@@ -70,10 +123,14 @@ class Api:
         logger.info(f"Found {len(file_list)} audio files in {target_dir}")
         return {'success': True, 'files': file_list, 'directory': target_dir}
 
-    def start_analysis(self, output_dir: str = "") -> dict:
-        """开始分析"""
+    def start_analysis(self, output_dir: str = "", resume_csv: str = "", force: bool = False,
+                       num_workers: int = 0, paths: Optional[list[str]] = None) -> dict:
+        """开始分析（resume_csv 指定已有结果文件时追加续跑，force 时忽略已保存的结果，
+        num_workers 为 0 时使用配置中的并发数，paths 指定时只分析这些文件）"""
         if self.analyzer.is_running:
             return {'success': False, 'error': 'Analysis is already running'}
+        if self.analyzer.workers_alive:
+            return {'success': False, 'error': 'Previous analysis is still stopping, try again in a moment'}
 
         if not self.selected_directory:
             return {'success': False, 'error': 'No directory selected'}
@@ -81,31 +138,109 @@ class Api:
         if not self.audio_files:
             return {'success': False, 'error': 'No audio files found'}
 
+        if not self.analyzer.settings.api_key:
+            return {'success': False,
+                    'error': 'Analyzer API key is not configured (set analyzer.api_key or HETANG_ANALYZER_API_KEY)'}
+
         # 设置输出目录
         if not output_dir:
             output_dir = os.path.expanduser("~/Documents/AudioAnalysis")
 
         os.makedirs(output_dir, exist_ok=True)
 
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_path = os.path.join(output_dir, f"voice_analysis_{timestamp}.csv")
+        resume = bool(resume_csv) and os.path.exists(resume_csv)
+        if resume:
+            csv_path = resume_csv
+        else:
+            from datetime import datetime
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            csv_path = os.path.join(output_dir, f"voice_analysis_{timestamp}.csv")
 
         # 设置进度回调
+        base_dir = self.selected_directory
+
         def on_progress(data: dict):
+            if data.get('type') == 'completed' and data.get('result'):
+                self.metadata_index.upsert_analysis(
+                    os.path.join(base_dir, data['result']['path']), data['result'], base_dir
+                )
             self._notify_frontend('progress', data)
 
         self.analyzer.set_progress_callback(on_progress)
 
         # 在后台线程中运行分析
+        files = [os.path.join(base_dir, p) for p in paths] if paths else None
+
         def run_analysis():
-            self.analyzer.start_analysis(self.selected_directory, csv_path, num_workers=5)
+            self.analyzer.start_analysis(self.selected_directory, csv_path, num_workers=num_workers,
+                                         resume=resume, force=force, files=files)
 
         self._analysis_thread = threading.Thread(target=run_analysis)
         self._analysis_thread.start()
 
         logger.info(f"Analysis started, output to: {csv_path}")
-        return {'success': True, 'csvPath': csv_path}
+        return {'success': True, 'csvPath': csv_path, 'resumed': resume}
+
+    def start_feature_extraction(self, directory: str = "") -> dict:
+        """在本地提取声学特征并预填性别/年龄段/标签（不调用远程分析）"""
+        if self.feature_extractor.is_running:
+            return {'success': False, 'error': 'Feature extraction is already running'}
+
+        target_dir = directory or self.selected_directory
+        if not target_dir or not os.path.isdir(target_dir):
+            return {'success': False, 'error': 'Directory does not exist'}
+
+        def run_extraction():
+            files = find_audio_files(target_dir, self.scan_index)
+            total = len(files)
+            self._notify_frontend('features', {'type': 'start', 'total': total})
+            estimates: list[tuple[str, dict]] = []
+            current = 0
+
+            def on_result(path: str, features: Optional[dict], error: str):
+                nonlocal current
+                current += 1
+                rel_path = os.path.relpath(path, target_dir)
+                if features is None:
+                    self._notify_frontend('features', {
+                        'type': 'error', 'file': rel_path, 'current': current, 'total': total, 'error': error
+                    })
+                    return
+                estimate = estimate_attributes(features)
+                estimates.append((path, estimate))
+                self._notify_frontend('features', {
+                    'type': 'completed', 'file': rel_path, 'current': current, 'total': total,
+                    'features': features, 'estimate': estimate
+                })
+
+            try:
+                counts = self.feature_extractor.run(files, on_result)
+                self.metadata_index.prefill_estimates(estimates, target_dir)
+                self._notify_frontend('features', {'type': 'finish', **counts})
+            except Exception as e:
+                logger.error(f"Feature extraction failed: {e}")
+                self._notify_frontend('features', {'type': 'finish', 'total': total, 'error': str(e)})
+
+        threading.Thread(target=run_extraction, daemon=True).start()
+        return {'success': True}
+
+    def stop_feature_extraction(self) -> dict:
+        """停止提取声学特征"""
+        if not self.feature_extractor.is_running:
+            return {'success': False, 'error': 'Feature extraction is not running'}
+        self.feature_extractor.stop()
+        return {'success': True}
+
+    def get_acoustic_features(self, audio_path: str) -> dict:
+        """获取单个文件的声学特征与预估属性"""
+        if not os.path.exists(audio_path):
+            return {'success': False, 'error': 'File not found'}
+        try:
+            features = self.feature_extractor.get(audio_path)
+            return {'success': True, 'features': features, 'estimate': estimate_attributes(features)}
+        except Exception as e:
+            logger.error(f"Failed to extract features for {audio_path}: {e}")
+            return {'success': False, 'error': str(e)}
 
     def stop_analysis(self) -> dict:
         """停止分析"""
@@ -127,7 +262,8 @@ class Api:
             'isRunning': self.analyzer.is_running,
             'selectedDirectory': self.selected_directory,
             'fileCount': len(self.audio_files),
-            'resultCount': len(self.analyzer.get_results())
+            'resultCount': len(self.analyzer.get_results()),
+            'stats': self.analyzer.get_stats()
         }
 
     def export_csv(self, output_path: str = "") -> dict:
@@ -185,39 +321,187 @@ class Api:
         if not os.path.isdir(directory):
             return {'success': False, 'files': [], 'error': 'Directory does not exist'}
 
-        audio_extensions = {'.wav', '.mp3', '.m4a', '.aac', '.flac', '.ogg'}
         max_size_bytes = max_size_kb * 1024
         ref_files: list[dict] = []
+        identities: dict[str, tuple[int, int]] = {}
+        for full_path, size in self.scan_index.scan(directory, max_depth, identities=identities):
+            if size <= max_size_bytes:
+                ref_files.append(self._reference_file_entry(directory, full_path, size, identities))
 
-        def scan_dir(current_dir: str, current_depth: int):
-            if current_depth > max_depth:
-                return
-            try:
-                for entry in os.scandir(current_dir):
-                    if entry.is_file():
-                        ext = os.path.splitext(entry.name)[1].lower()
-                        if ext in audio_extensions:
-                            try:
-                                size = entry.stat().st_size
-                                if size <= max_size_bytes:
-                                    rel_path = os.path.relpath(entry.path, directory)
-                                    ref_files.append({
-                                        'path': rel_path,
-                                        'fullPath': entry.path,
-                                        'name': entry.name,
-                                        'size': size
-                                    })
-                            except OSError:
-                                pass
-                    elif entry.is_dir() and not entry.name.startswith('.'):
-                        scan_dir(entry.path, current_depth + 1)
-            except PermissionError:
-                pass
-
-        scan_dir(directory, 1)
         logger.info(f"Found {len(ref_files)} reference audio files in {directory}")
         return {'success': True, 'files': ref_files, 'directory': directory}
 
+    def _reference_file_entry(self, directory: str, full_path: str, size: int,
+                              identities: Optional[dict[str, tuple[int, int]]] = None) -> dict:
+        """构造参考音文件条目（identities 中有记录时附带 mtime，供元数据索引跳过未变化的文件）"""
+        entry = {
+            'path': os.path.relpath(full_path, directory),
+            'fullPath': full_path,
+            'name': os.path.basename(full_path),
+            'size': size
+        }
+        if identities and full_path in identities:
+            entry['mtime'] = identities[full_path][0]
+        return entry
+
+    def scan_reference_audio_paged(self, directory: str, max_depth: int = 3, max_size_kb: int = 1024,
+                                   page_size: int = 500, with_tags: bool = True, scan_id: str = '') -> dict:
+        """
+        后台扫描参考音，结果通过 scan 事件分页推送给前端
+
+        scan_id（为空时自动生成）会带在本次扫描的每个事件上，前端据此丢弃已被新扫描取代的旧扫描结果。
+        """
+        if not directory:
+            return {'success': False, 'error': 'No directory specified'}
+
+        if not os.path.isdir(directory):
+            return {'success': False, 'error': 'Directory does not exist'}
+
+        max_size_bytes = max_size_kb * 1024
+        scan_id = scan_id or uuid.uuid4().hex
+
+        def run_scan():
+            total = 0
+            identities: dict[str, tuple[int, int]] = {}
+            seen: set[str] = set()
+            pages = self.scan_index.scan_pages(
+                directory, page_size, max_depth,
+                file_filter=lambda _, size: size <= max_size_bytes,
+                identities=identities
+            )
+            try:
+                for page_index, page in enumerate(pages):
+                    files = [self._reference_file_entry(directory, p, size, identities) for p, size in page]
+                    if with_tags:
+                        with self.global_config.batch():
+                            files = [self._attach_audio_meta(f) for f in files]
+                        self.metadata_index.upsert_clips(directory, files, prune=False)
+                        seen.update(f['fullPath'] for f in files)
+                    total += len(files)
+                    self._notify_frontend('scan', {
+                        'type': 'page',
+                        'scanId': scan_id,
+                        'directory': directory,
+                        'page': page_index,
+                        'files': files
+                    })
+                if with_tags:
+                    # 所有分页写完后才能确定哪些条目已不存在
+                    self.metadata_index.prune_clips(directory, seen)
+            except Exception as e:
+                logger.exception(f"Reference scan failed: {e}")
+                self._notify_frontend('scan', {'type': 'error', 'scanId': scan_id, 'directory': directory,
+                                               'error': str(e)})
+                return
+            logger.info(f"Streamed {total} reference audio files in {directory}")
+            self._notify_frontend('scan', {'type': 'finish', 'scanId': scan_id, 'directory': directory,
+                                           'total': total})
+
+        threading.Thread(target=run_scan, daemon=True).start()
+        return {'success': True, 'directory': directory, 'scanId': scan_id}
+
+    def watch_reference_directory(self, directory: str, max_depth: int = 3, max_size_kb: int = 1024) -> dict:
+        """监听参考音目录，文件增删改名时通过 library 事件推送增量"""
+        if not directory or not os.path.isdir(directory):
+            return {'success': False, 'error': 'Directory does not exist'}
+
+        self.unwatch_reference_directory()
+
+        def on_delta(delta: dict):
+            with self.global_config.batch():
+                added = [
+                    self._attach_audio_meta(self._reference_file_entry(directory, path, size))
+                    for path, size in delta['added']
+                ]
+                renamed = [
+                    {
+                        'from': old_path,
+                        'to': new_path,
+                        'file': self._attach_audio_meta(self._reference_file_entry(directory, new_path, size))
+                    }
+                    for old_path, new_path, size in delta['renamed']
+                ]
+            self.metadata_index.remove_clips(delta['removed'] + [old for old, _, _ in delta['renamed']])
+            self.metadata_index.upsert_clips(directory, added + [r['file'] for r in renamed], prune=False)
+            self._notify_frontend('library', {
+                'type': 'delta',
+                'directory': directory,
+                'added': added,
+                'removed': delta['removed'],
+                'renamed': renamed
+            })
+
+            # 波形峰值在工作进程中后台计算
+            self.peak_store.remove(delta['removed'] + [old for old, _, _ in delta['renamed']])
+            self.tts_service.workers.compute_peaks_background([
+                (path, self.peak_store.target_for(path))
+                for path in [path for path, _ in delta['added']] + [new for _, new, _ in delta['renamed']]
+            ])
+
+            # 音色索引的增量更新需要解码新文件，放在推送之后
+            self.voice_index.remove_files(delta['removed'])
+            for old_path, new_path, _ in delta['renamed']:
+                self.voice_index.rename_file(old_path, new_path)
+            if delta['added']:
+                self.voice_index.update_files([path for path, _ in delta['added']])
+            self.voice_index.save()
+
+        self._library_watcher = LibraryWatcher(
+            directory, self.scan_index, self.global_config, on_delta,
+            max_depth=max_depth, max_size_kb=max_size_kb
+        )
+        self._library_watcher.start()
+        return {'success': True, 'directory': directory, 'mode': self._library_watcher.mode}
+
+    def unwatch_reference_directory(self) -> dict:
+        """停止监听参考音目录"""
+        if self._library_watcher:
+            self._library_watcher.stop()
+            self._library_watcher = None
+        return {'success': True}
+
+    def build_voice_index(self, directory: str, max_depth: int = 3, max_size_kb: int = 1024) -> dict:
+        """后台同步参考音的音色相似度索引（只计算新增或变化的文件），进度通过 similarity 事件推送"""
+        if self.voice_index.is_running:
+            return {'success': False, 'error': 'Voice index is already building'}
+
+        if not directory or not os.path.isdir(directory):
+            return {'success': False, 'error': 'Directory does not exist'}
+
+        max_size_bytes = max_size_kb * 1024
+
+        def run_build():
+            files = [path for path, size in self.scan_index.scan(directory, max_depth) if size <= max_size_bytes]
+
+            def on_progress(done: int, total: int):
+                self._notify_frontend('similarity', {
+                    'type': 'progress', 'directory': directory, 'current': done, 'total': total
+                }, key=('similarity', directory))
+
+            try:
+                result = self.voice_index.sync_directory(directory, files, on_progress)
+                self._notify_frontend('similarity', {'type': 'finish', 'directory': directory, **result})
+            except Exception as e:
+                logger.exception(f"Voice index build failed: {e}")
+                self._notify_frontend('similarity', {'type': 'error', 'directory': directory, 'error': str(e)})
+
+        threading.Thread(target=run_build, daemon=True).start()
+        return {'success': True, 'directory': directory}
+
+    def find_similar_voices(self, audio_path: str, k: int = 10, directory: str = "") -> dict:
+        """查找音色相近的参考音（directory 不为空时只在该目录内查找）"""
+        if not os.path.exists(audio_path):
+            return {'success': False, 'error': 'File not found', 'results': []}
+        try:
+            results = self.voice_index.find_similar(audio_path, k, directory)
+            return {'success': True, 'results': results}
+        except NotEnoughVoicesError as e:
+            # 索引条目不足，提示用户先建立索引，不是错误
+            return {'success': False, 'error': str(e), 'results': []}
+        except Exception as e:
+            logger.error(f"Similar voice search failed: {e}")
+            return {'success': False, 'error': str(e), 'results': []}
+
     def parse_text_content(self, text: str, delimiter: str = "|") -> dict:
         """解析粘贴的文本内容"""
         if not text.strip():
@@ -306,19 +590,27 @@ class Api:
                 emo_weight=1.0,
                 emo_random=False
             )
+            self.metrics.record_line(result['spans'], result['success'])
 
             if result["success"]:
                 logger.info(f"配音生成成功: {output_file}")
                 return {
                     'success': True,
                     'output': str(output_file),
+                    'loudness': result.get('loudness'),
+                    'timing': result.get('timing'),
+                    'spans': result['spans'],
                     'line_index': line_index
                 }
             else:
                 logger.error(f"配音生成失败: {result.get('error', '未知错误')}")
+                if not output_file.exists():
+                    # 后处理失败时输出已被删除，旧配音的峰值也不再有效
+                    self.peak_store.remove([str(output_file)])
                 return {
                     'success': False,
                     'error': result.get('error', '配音生成失败'),
+                    'spans': result['spans'],
                     'line_index': line_index
                 }
 
@@ -334,11 +626,13 @@ class Api:
     def add_favorite(self, audio_path: str) -> dict:
         """添加收藏"""
         success = self.global_config.add_favorite(audio_path)
+        self.metadata_index.update_clip(audio_path, favorite=True)
         return {'success': success}
 
     def remove_favorite(self, audio_path: str) -> dict:
         """移除收藏"""
         success = self.global_config.remove_favorite(audio_path)
+        self.metadata_index.update_clip(audio_path, favorite=False)
         return {'success': success}
 
     def get_favorites(self) -> dict:
@@ -359,6 +653,7 @@ class Api:
     def set_audio_note(self, audio_path: str, note: str) -> dict:
         """设置音频备注"""
         self.global_config.set_note(audio_path, note)
+        self.metadata_index.update_clip(audio_path, note=note)
         return {'success': True}
 
     def get_audio_note(self, audio_path: str) -> dict:
@@ -369,6 +664,7 @@ class Api:
     def set_audio_tags(self, audio_path: str, tags: list[str]) -> dict:
         """设置音频标签"""
         self.global_config.set_tags(audio_path, tags)
+        self.metadata_index.update_clip(audio_path, tags=tags)
         return {'success': True}
 
     def get_audio_tags(self, audio_path: str) -> dict:
@@ -388,23 +684,9 @@ class Api:
             return scan_result
 
         # 为每个音频文件添加标签和备注信息
-        files_with_meta = []
-        for file in scan_result['files']:
-            # 获取或生成标签
-            existing_tags = self.global_config.get_tags(file['fullPath'])
-            if not existing_tags:
-                # 自动提取标签
-                auto_tags = self.global_config.extract_tags_from_filename(file['name'])
-                if auto_tags:
-                    self.global_config.set_tags(file['fullPath'], auto_tags)
-                    existing_tags = auto_tags
-
-            files_with_meta.append({
-                **file,
-                'tags': existing_tags,
-                'note': self.global_config.get_note(file['fullPath']),
-                'isFavorite': self.global_config.is_favorite(file['fullPath'])
-            })
+        with self.global_config.batch():
+            files_with_meta = [self._attach_audio_meta(file) for file in scan_result['files']]
+        self.metadata_index.upsert_clips(scan_result['directory'], files_with_meta)
 
         return {
             'success': True,
@@ -412,6 +694,43 @@ class Api:
             'directory': scan_result['directory']
         }
 
+    def _attach_audio_meta(self, file: dict) -> dict:
+        """为参考音条目附加标签、备注和收藏信息（无标签时从文件名自动提取）"""
+        existing_tags = self.global_config.get_tags(file['fullPath'])
+        if not existing_tags:
+            auto_tags = self.global_config.extract_tags_from_filename(file['name'])
+            if auto_tags:
+                self.global_config.set_tags(file['fullPath'], auto_tags)
+                existing_tags = auto_tags
+
+        return {
+            **file,
+            'tags': existing_tags,
+            'note': self.global_config.get_note(file['fullPath']),
+            'isFavorite': self.global_config.is_favorite(file['fullPath'])
+        }
+
+    def search_reference_audio(self, query: str = "", filters: Optional[dict] = None,
+                               limit: int = 50, offset: int = 0) -> dict:
+        """搜索参考音（标签、备注、文件名、分析结果），返回排序结果和分面统计"""
+        try:
+            result = self.metadata_index.search(query, filters, limit, offset)
+            return {'success': True, **result}
+        except Exception as e:
+            logger.error(f"Reference search failed: {e}")
+            return {'success': False, 'error': str(e), 'results': [], 'total': 0, 'facets': {}}
+
+    def import_analysis_csv(self, csv_path: str, base_dir: str) -> dict:
+        """把分析结果 CSV 导入元数据索引"""
+        if not os.path.exists(csv_path):
+            return {'success': False, 'error': 'File not found'}
+        try:
+            count = self.metadata_index.import_analysis_csv(csv_path, base_dir)
+            return {'success': True, 'count': count}
+        except Exception as e:
+            logger.error(f"Failed to import analysis CSV: {e}")
+            return {'success': False, 'error': str(e)}
+
     def get_audio_data_url(self, audio_path: str) -> dict:
         """获取音频文件的 data URL（用于前端播放）"""
         import base64
@@ -443,98 +762,242 @@ class Api:
             logger.error(f"Failed to read audio file: {e}")
             return {'success': False, 'error': str(e)}
 
-    def export_project(self, project_name: str) -> dict:
-        """导出项目：合并音频并生成SRT字幕"""
-        import shutil
-        from pydub import AudioSegment
+    def _load_peaks(self, audio_path: str, adjacent: bool = False) -> Peaks:
+        """读取峰值 sidecar，缺失或过期时在工作进程中计算"""
+        peaks = self.peak_store.get(audio_path)
+        if peaks is None:
+            self.tts_service.workers.compute_peaks(audio_path, self.peak_store.target_for(audio_path, adjacent))
+            peaks = self.peak_store.get(audio_path)
+            if peaks is None:
+                raise RuntimeError(f"Failed to compute peaks for {audio_path}")
+        return peaks
+
+    @staticmethod
+    def _peaks_payload(peaks: Peaks, bins: int, start_ms: int = 0, end_ms: Optional[int] = None) -> dict:
+        """按显示宽度选取峰值，min/max 交替的 int8 数据以 base64 传给前端"""
+        start_frame = start_ms * peaks.frame_rate // 1000
+        end_frame = None if end_ms is None else end_ms * peaks.frame_rate // 1000
+        level = peaks.select(bins, start_frame, end_frame)
+        return {
+            'frameRate': peaks.frame_rate,
+            'durationMs': peaks.duration_ms,
+            'startMs': start_frame // level.samples_per_bin * level.samples_per_bin * 1000 // peaks.frame_rate
+            if peaks.frame_rate else 0,
+            'samplesPerBin': level.samples_per_bin,
+            'bins': len(level.data),
+            'peaks': base64.b64encode(level.data.tobytes()).decode('ascii')
+        }
+
+    def get_waveform_peaks(self, audio_path: str, bins: int = 800, start_ms: int = 0,
+                           end_ms: Optional[int] = None) -> dict:
+        """获取音频波形峰值（任意缩放级别），不需要把音频传给前端"""
+        try:
+            if not os.path.exists(audio_path):
+                return {'success': False, 'error': 'File not found'}
+            peaks = self._load_peaks(audio_path)
+            return {'success': True, **self._peaks_payload(peaks, bins, start_ms, end_ms)}
+        except Exception as e:
+            logger.error(f"Failed to get peaks for {audio_path}: {e}")
+            return {'success': False, 'error': str(e)}
 
+    def get_project_peaks(self, project_name: str, bins: int = 2000) -> dict:
+        """获取整个项目的时间线波形：按时长把 bins 分给已生成的各条配音"""
         try:
-            # 加载项目数据
             project_result = self.load_project(project_name)
             if not project_result['success']:
                 return {'success': False, 'error': 'Failed to load project'}
 
-            project_data = project_result['data']
-            tasks = project_data.get('tasks', [])
-
-            if not tasks:
-                return {'success': False, 'error': 'No tasks in project'}
-
-            # 检查是否所有任务都已完成
-            incomplete = [t for t in tasks if t.get('status') != 'completed']
-            if incomplete:
-                return {'success': False, 'error': f'There are {len(incomplete)} incomplete tasks'}
+            tasks = sorted(project_result['data'].get('tasks', []), key=lambda t: t.get('index', 0))
+            lines = [(task, self._load_peaks(task['outputFile'], adjacent=True)) for task in tasks
+                     if task.get('outputFile') and os.path.exists(task['outputFile'])]
+            total_ms = sum(peaks.duration_ms for _, peaks in lines)
+
+            result = []
+            current_ms = 0
+            for task, peaks in lines:
+                line_bins = max(1, bins * peaks.duration_ms // total_ms) if total_ms else 1
+                result.append({
+                    'index': task.get('index', 0),
+                    'offsetMs': current_ms,
+                    **self._peaks_payload(peaks, line_bins)
+                })
+                current_ms += peaks.duration_ms
+            return {'success': True, 'durationMs': total_ms, 'lines': result}
+        except Exception as e:
+            logger.exception(f"Failed to get project peaks: {e}")
+            return {'success': False, 'error': str(e)}
 
-            # 选择导出目录
-            result = self._window.create_file_dialog(
-                webview.FOLDER_DIALOG,
-                directory=str(Path.home() / 'Documents')
-            )
+    def _load_export_tasks(self, project_name: str) -> tuple[Optional[dict], list[dict], str]:
+        """加载待导出的项目，返回 (项目数据, 按顺序排列的任务, 错误信息)"""
+        project_result = self.load_project(project_name)
+        if not project_result['success']:
+            return None, [], 'Failed to load project'
+
+        project_data = project_result['data']
+        tasks = project_data.get('tasks', [])
+        if not tasks:
+            return None, [], 'No tasks in project'
+
+        # 检查是否所有任务都已完成
+        incomplete = [t for t in tasks if t.get('status') != 'completed']
+        if incomplete:
+            return None, [], f'There are {len(incomplete)} incomplete tasks'
+        return project_data, sorted(tasks, key=lambda t: t.get('index', 0)), ""
+
+    def _requeue_invalid(self, project_name: str, project_data: dict, check_checksum: Optional[bool] = None) -> list[dict]:
+        """校验已完成任务的输出文件，把缺失或损坏的任务改回待生成并保存项目，返回有问题的任务"""
+        if check_checksum is None:
+            check_checksum = self.global_config.config['export'].get('verify_checksums', True)
+        tasks = project_data.get('tasks', [])
+        invalid = verify_outputs(tasks, check_checksum)
+        if invalid:
+            by_index = {item['index']: item for item in invalid}
+            for task in tasks:
+                item = by_index.get(task.get('index', 0))
+                if item:
+                    task['status'] = 'pending'
+                    task['error'] = item['message']
+            self.project_manager.save_project(project_name, project_data)
+            logger.warning(f"{len(invalid)} lines failed verification and were requeued: "
+                           f"{[(item['index'], item['issue']) for item in invalid[:20]]}")
+        return invalid
+
+    def verify_project(self, project_name: str, check_checksum: Optional[bool] = None) -> dict:
+        """
+        并行校验项目所有已完成配音的文件头、采样数和哈希，有问题的任务改回待生成
+
+        返回:
+            dict: {'success', 'checked': 校验的任务数, 'invalid': [{'index', 'outputFile', 'issue', 'message'}]}
+        """
+        try:
+            project_result = self.load_project(project_name)
+            if not project_result['success']:
+                return {'success': False, 'error': 'Failed to load project'}
+            project_data = project_result['data']
+            checked = sum(1 for t in project_data.get('tasks', []) if t.get('status') == 'completed')
+            invalid = self._requeue_invalid(project_name, project_data, check_checksum)
+            return {'success': True, 'checked': checked, 'invalid': invalid}
+        except Exception as e:
+            logger.exception(f"Verify project failed: {e}")
+            return {'success': False, 'error': str(e)}
 
-            if not result or not result[0]:
+    def _choose_export_path(self, project_name: str) -> Optional[Path]:
+        """选择导出目录，在其中创建 <项目名>_export，取消时返回 None"""
+        result = self._window.create_file_dialog(
+            webview.FOLDER_DIALOG,
+            directory=str(Path.home() / 'Documents')
+        )
+        if not result or not result[0]:
+            return None
+
+        export_path = Path(result[0]) / f"{project_name}_export"
+        export_path.mkdir(parents=True, exist_ok=True)
+        return export_path
+
+    def _subtitle_formats(self, formats: Optional[list[str]]) -> list[str]:
+        formats = formats or self.global_config.config['export'].get('subtitle_formats', ['srt'])
+        return [fmt for fmt in formats if fmt in SUBTITLE_FORMATS] or ['srt']
+
+    def export_project(self, project_name: str, subtitle_formats: Optional[list[str]] = None,
+                       split_mode: Optional[str] = None, max_part_minutes: Optional[float] = None) -> dict:
+        """
+        导出项目：合并音频并生成字幕（SRT，可选 VTT / LRC / JSON）
+
+        长项目可按章节标记行（split_mode='chapters'）或时长（max_part_minutes）分成多段并行导出，
+        每段有自己的音频和字幕，另写清单 JSON 和 CUE 表。参数为 None 时使用 export 配置。
+        """
+        try:
+            project_data, tasks, error = self._load_export_tasks(project_name)
+            if project_data is None:
+                return {'success': False, 'error': error}
+
+            # 缺失或损坏的配音不再跳过，改回待生成，由前端重新生成后再导出
+            started = time.perf_counter()
+            invalid = self._requeue_invalid(project_name, project_data)
+            self.metrics.observe('export_verify', time.perf_counter() - started)
+            if invalid:
+                return {'success': False, 'error': f'{len(invalid)} audio files are missing or corrupt',
+                        'invalid': invalid}
+
+            export_path = self._choose_export_path(project_name)
+            if export_path is None:
                 return {'success': False, 'error': 'Export cancelled'}
 
-            export_dir = Path(result[0])
-            export_name = f"{project_name}_export"
-            export_path = export_dir / export_name
-            export_path.mkdir(parents=True, exist_ok=True)
-
             logger.info(f"Exporting project to: {export_path}")
 
-            # 按顺序合并音频并生成SRT
-            combined_audio = AudioSegment.empty()
-            srt_content = []
-            current_time_ms = 0
-
-            for i, task in enumerate(sorted(tasks, key=lambda t: t.get('index', 0))):
-                output_file = task.get('outputFile')
-                if not output_file or not os.path.exists(output_file):
-                    logger.warning(f"Audio file not found: {output_file}")
-                    continue
-
-                # 加载音频
-                audio = AudioSegment.from_file(output_file)
-                duration_ms = len(audio)
-
-                # 添加到合并音频
-                combined_audio += audio
-
-                # 生成SRT条目
-                start_time = self._format_srt_time(current_time_ms)
-                end_time = self._format_srt_time(current_time_ms + duration_ms)
-                srt_content.append(f"{i + 1}")
-                srt_content.append(f"{start_time} --> {end_time}")
-                srt_content.append(task.get('content', ''))
-                srt_content.append('')
-
-                current_time_ms += duration_ms
-
-            # 保存合并的音频
-            output_audio_path = export_path / f"{project_name}.wav"
-            combined_audio.export(str(output_audio_path), format="wav")
-            logger.info(f"Exported audio: {output_audio_path}")
-
-            # 保存SRT字幕
-            output_srt_path = export_path / f"{project_name}.srt"
-            with open(output_srt_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(srt_content))
-            logger.info(f"Exported SRT: {output_srt_path}")
+            # 响度归一化：使用生成时缓存在任务上的测量值，缺失或文件已变化的由工作进程在解码时测量
+            tts_config = self.global_config.config['tts']
+            normalize = None
+            if tts_config.get('loudness_normalize', True):
+                normalize = (tts_config.get('loudness_target', -16.0), tts_config.get('loudness_max_peak', -1.0))
+
+            export_config = self.global_config.config['export']
+            split_mode = split_mode or export_config.get('split_mode', 'none')
+            if split_mode not in SPLIT_MODES:
+                return {'success': False, 'error': f'Unknown split mode: {split_mode}'}
+            started = time.perf_counter()
+            result = self.exporter.export(
+                project_name, tasks, export_path,
+                subtitle_formats=self._subtitle_formats(subtitle_formats),
+                normalize=normalize,
+                split_mode=split_mode,
+                max_part_minutes=export_config.get('max_part_minutes', 0) if max_part_minutes is None
+                else max_part_minutes,
+                chapter_pattern=export_config.get('chapter_pattern') or DEFAULT_CHAPTER_PATTERN
+            )
+            self.metrics.observe('export_render', time.perf_counter() - started)
+            logger.info(f"Exported {len(result['parts'])} parts to {export_path}")
+
+            # 新测量的响度写回项目，下次导出直接复用
+            measured = result['loudness']
+            if measured:
+                for task in tasks:
+                    if task.get('index', 0) in measured:
+                        task['loudness'] = measured[task.get('index', 0)]
+                self.project_manager.save_project(project_name, project_data)
+                logger.info(f"Measured loudness for {len(measured)} lines")
 
             return {
                 'success': True,
-                'path': str(export_path)
+                'path': str(export_path),
+                'parts': [{k: part[k] for k in ('number', 'title', 'duration', 'lines')} for part in result['parts']],
+                'manifest': result['manifest'],
+                'loudness': measured
             }
 
         except Exception as e:
             logger.exception(f"Export failed: {e}")
             return {'success': False, 'error': str(e)}
 
-    def _format_srt_time(self, ms: int) -> str:
-        """格式化毫秒为SRT时间格式 (HH:MM:SS,mmm)"""
-        hours = ms // 3600000
-        minutes = (ms % 3600000) // 60000
-        seconds = (ms % 60000) // 1000
-        milliseconds = ms % 1000
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+    def get_metrics(self) -> dict:
+        """本次运行的各阶段耗时直方图（p50/p95 按分桶估算）和计数"""
+        return {'success': True, **self.metrics.snapshot()}
+
+    def get_performance_report(self, project_name: str) -> dict:
+        """项目性能报告：按任务上记录的各阶段耗时统计，找出最耗时的阶段"""
+        project_result = self.load_project(project_name)
+        if not project_result['success']:
+            return {'success': False, 'error': 'Failed to load project'}
+        return {'success': True, **performance_report(project_result['data'].get('tasks', []))}
 
+    def export_subtitles(self, project_name: str, formats: Optional[list[str]] = None) -> dict:
+        """只导出字幕：时间全部来自任务记录或 WAV 文件头，不解码音频"""
+        try:
+            project_data, tasks, error = self._load_export_tasks(project_name)
+            if project_data is None:
+                return {'success': False, 'error': error}
 
+            export_path = self._choose_export_path(project_name)
+            if export_path is None:
+                return {'success': False, 'error': 'Export cancelled'}
+
+            cues = build_cues(tasks)
+            if len(cues) < len(tasks):
+                logger.warning(f"{len(tasks) - len(cues)} lines have no readable audio and were skipped")
+            paths = write_subtitles(cues, str(export_path / project_name), self._subtitle_formats(formats))
+            logger.info(f"Exported subtitles: {paths}")
+            return {'success': True, 'path': str(export_path), 'files': paths, 'cues': len(cues)}
+
+        except Exception as e:
+            logger.exception(f"Subtitle export failed: {e}")
+            return {'success': False, 'error': str(e)}
@@ -0,0 +1,66 @@
+import os
+from loguru import logger
+
+# ffmpeg 导出参数：格式 -> (pydub format, 扩展名, codec)
+EXPORT_FORMATS = {
+    'flac': ('flac', '.flac', None),
+    'opus': ('ogg', '.ogg', 'libopus'),
+    'wav': ('wav', '.wav', None),
+}
+
+
+def preprocess_for_analysis(
+    file_path: str,
+    output_dir: str,
+    output_name: str,
+    fmt: str = 'flac',
+    sample_rate: int = 16000,
+    max_seconds: float = 20.0,
+    silence_thresh_db: float = -50.0
+) -> dict:
+    """
+    为声音分析准备精简版音频：去掉首尾静音、转单声道并降采样、限制时长后转码
+
+    在进程池中运行，只依赖参数和文件系统，返回结果为可序列化的 dict。
+
+    参数:
+        file_path: 原始音频文件路径
+        output_dir: 输出目录
+        output_name: 输出文件名（不含扩展名）
+        fmt: 输出格式 flac / opus / wav
+        sample_rate: 输出采样率
+        max_seconds: 最长保留时长（秒）
+        silence_thresh_db: 静音阈值（dB）
+
+    返回:
+        dict: {'output': str, 'original_bytes': int, 'bytes': int, 'duration_ms': int}
+    """
+    from pydub import AudioSegment
+    from pydub.silence import detect_leading_silence
+
+    export_format, ext, codec = EXPORT_FORMATS[fmt]
+
+    audio = AudioSegment.from_file(file_path)
+    audio = audio.set_channels(1).set_frame_rate(sample_rate)
+
+    start = detect_leading_silence(audio, silence_threshold=silence_thresh_db)
+    end = len(audio) - detect_leading_silence(audio.reverse(), silence_threshold=silence_thresh_db)
+    if end > start:
+        audio = audio[start:end]
+    audio = audio[:int(max_seconds * 1000)]
+
+    output_file = os.path.join(output_dir, output_name + ext)
+    if codec:
+        audio.export(output_file, format=export_format, codec=codec)
+    else:
+        audio.export(output_file, format=export_format)
+
+    original_bytes = os.path.getsize(file_path)
+    new_bytes = os.path.getsize(output_file)
+    logger.debug(f"Preprocessed {file_path}: {original_bytes} -> {new_bytes} bytes")
+    return {
+        'output': output_file,
+        'original_bytes': original_bytes,
+        'bytes': new_bytes,
+        'duration_ms': len(audio)
+    }
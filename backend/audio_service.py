@@ -2,75 +2,244 @@ import http.client
 import json
 import os
 import csv
+import shutil
+import socket
+import tempfile
 import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from queue import Queue
+from queue import Empty, Queue
 from typing import Callable, Optional
+from urllib.parse import urlsplit
 from loguru import logger
 
-# API 配置
-API_KEY = "sk-uXZW4Tnvm1i3LPFt9TUF6d3WK0NLTMdfDQrZEhq2QRtReSTs"
-API_HOST = "api.shaohua.fun"
+from backend.acoustic_features import FEATURES_VERSION, check_analysis
+from backend.analysis_parser import parse_analysis, parse_analysis_json
+from backend.analysis_store import AnalysisStore, hash_file
+from backend.audio_preprocess import EXPORT_FORMATS, preprocess_for_analysis
+from backend.rate_limiter import AdaptiveRateLimiter, RunMetrics
+from backend.result_writer import ResultWriter, open_sinks
+from backend.scan_index import ScanIndex
+
+
+@dataclass
+class AnalyzerSettings:
+    """分析服务配置（来自 GlobalConfig 的 analyzer 段，可被环境变量覆盖）"""
+    base_url: str
+    api_key: str
+    model: str = "gemini-2.5-pro-preview-05-06"
+    timeout: float = 120.0
+    num_workers: int = 5
+    requests_per_second: float = 0  # 0 表示不限速
+    upload_bytes_per_second: float = 0  # 0 表示不限速
+    max_retries: int = 5
+    preprocess: bool = False  # 上传前裁剪静音、转单声道低采样率并限制时长
+    preprocess_format: str = 'flac'  # flac / opus / wav
+    preprocess_sample_rate: int = 16000
+    preprocess_max_seconds: float = 20.0
+    preprocess_workers: int = 0  # 0 表示使用 CPU 核数
+    output_formats: tuple[str, ...] = ('csv',)  # 除 CSV 外还可输出 jsonl / sqlite
+    response_format: str = 'text'  # text：按【标题】分段；json：要求模型直接输出 JSON
+    stop_timeout: float = 5.0  # 停止后最多等待工作线程多少秒
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'AnalyzerSettings':
+        """从配置构造，环境变量 HETANG_ANALYZER_BASE_URL / HETANG_ANALYZER_API_KEY 优先"""
+        return cls(
+            base_url=os.environ.get('HETANG_ANALYZER_BASE_URL') or config.get('base_url', ''),
+            api_key=os.environ.get('HETANG_ANALYZER_API_KEY') or config.get('api_key', ''),
+            model=config.get('model') or cls.model,
+            timeout=float(config.get('timeout') or cls.timeout),
+            num_workers=int(config.get('num_workers') or cls.num_workers),
+            requests_per_second=float(config.get('requests_per_second') or 0),
+            upload_bytes_per_second=float(config.get('upload_bytes_per_second') or 0),
+            max_retries=int(config.get('max_retries', cls.max_retries)),
+            preprocess=bool(config.get('preprocess', False)),
+            preprocess_format=config.get('preprocess_format') or cls.preprocess_format,
+            preprocess_sample_rate=int(config.get('preprocess_sample_rate') or cls.preprocess_sample_rate),
+            preprocess_max_seconds=float(config.get('preprocess_max_seconds') or cls.preprocess_max_seconds),
+            preprocess_workers=int(config.get('preprocess_workers') or 0),
+            output_formats=tuple(config.get('output_formats') or cls.output_formats),
+            response_format=config.get('response_format') or cls.response_format,
+            stop_timeout=float(config.get('stop_timeout') or cls.stop_timeout)
+        )
+
+    @property
+    def path_prefix(self) -> str:
+        return urlsplit(self.base_url).path.rstrip('/')
+
+
+class ApiError(Exception):
+    """分析服务返回了错误状态码"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status == 429 or self.status >= 500
+
+
+# 连接在请求送达前就断开或被拒绝，可以安全重发；读超时等情况服务端可能已经处理（并计费），不重试
+RETRYABLE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    ConnectionResetError,
+    ConnectionRefusedError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """请求失败后是否值得重试：429/5xx 和连接被重置/拒绝；本地文件错误、超时等直接失败"""
+    if isinstance(error, ApiError):
+        return error.retryable
+    return isinstance(error, RETRYABLE_CONNECTION_ERRORS)
+
+
+def read_json_response(res: http.client.HTTPResponse) -> dict:
+    """读取响应，状态码异常时抛出 ApiError"""
+    data = res.read()
+    if res.status >= 400:
+        retry_after = res.getheader('Retry-After')
+        try:
+            retry_seconds = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_seconds = None
+        raise ApiError(res.status, data[:200].decode('utf-8', errors='replace'), retry_seconds)
+    return json.loads(data.decode("utf-8"))
+
+
+def get_connection(settings: AnalyzerSettings) -> http.client.HTTPConnection:
+    """创建新的HTTP连接（http:// 地址用于本地替身服务）"""
+    parts = urlsplit(settings.base_url)
+    if parts.scheme == 'http':
+        return http.client.HTTPConnection(parts.netloc, timeout=settings.timeout)
+    return http.client.HTTPSConnection(parts.netloc, timeout=settings.timeout)
+
+
+class ConnectionPool:
+    """按线程复用的持久连接，请求失败时丢弃连接并重连一次
+
+    所有连接都带有 settings.timeout 的套接字超时；abort() 会中断各线程正在进行的读写。
+    """
+
+    def __init__(self, settings: AnalyzerSettings):
+        self.settings = settings
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: set[http.client.HTTPConnection] = set()
+        self._aborted = False
+
+    def get(self) -> http.client.HTTPConnection:
+        """获取当前线程的连接"""
+        if self._aborted:
+            raise InterruptedError("Connection pool aborted")
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = get_connection(self.settings)
+            self._local.conn = conn
+            with self._lock:
+                self._all.add(conn)
+        return conn
+
+    def discard(self):
+        """关闭并丢弃当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                self._all.discard(conn)
+            conn.close()
 
-# 线程锁用于CSV写操作
-csv_lock = threading.Lock()
+    def request(self, fn: Callable[[http.client.HTTPConnection], str]) -> str:
+        """在当前线程的连接上执行请求，复用的连接已被服务端关闭时重连重试一次"""
+        try:
+            return fn(self.get())
+        except RETRYABLE_CONNECTION_ERRORS:
+            self.discard()
+            if self._aborted:
+                raise InterruptedError("Connection pool aborted")
+            return fn(self.get())
+
+    def abort(self):
+        """中断所有连接：shutdown 套接字让其他线程中阻塞的读写立即出错返回，之后不再建立新连接"""
+        with self._lock:
+            self._aborted = True
+            conns, self._all = self._all, set()
+        for conn in conns:
+            sock = conn.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            conn.close()
 
+    def close_all(self):
+        """关闭所有线程的连接"""
+        with self._lock:
+            conns, self._all = self._all, set()
+        for conn in conns:
+            conn.close()
 
-def get_connection() -> http.client.HTTPSConnection:
-    """创建新的HTTP连接"""
-    return http.client.HTTPSConnection(API_HOST)
 
+class MultipartFileBody:
+    """流式 multipart/form-data 请求体
 
-def upload(file_path: str, conn: http.client.HTTPSConnection) -> str:
-    """上传文件到API"""
-    import mimetypes
-    from codecs import encode
+    只预先生成头尾两段，文件内容按块读取发送，配合预先计算的 Content-Length，
+    http.client 不会使用分块编码，内存占用与文件大小无关。
+    """
 
-    dataList = []
     boundary = 'wL36Yn8afVp8Ag7AmP8qZ0SA4n1v9T'
 
-    filename = os.path.basename(file_path)
-
-    dataList.append(encode('--' + boundary))
-    dataList.append(encode('Content-Disposition: form-data; name="file"; filename="{0}"'.format(filename)))
-
-    fileType = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
-    dataList.append(encode('Content-Type: {}'.format(fileType)))
-    dataList.append(encode(''))
-
-    with open(file_path, 'rb') as f:
-        dataList.append(f.read())
-
-    dataList.append(encode('--' + boundary + '--'))
-    dataList.append(encode(''))
-    body = b'\r\n'.join(dataList)
-    payload = body
+    def __init__(self, file_path: str, field_name: str = 'file', chunk_size: int = 64 * 1024):
+        import mimetypes
+
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        filename = os.path.basename(file_path)
+        file_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        self.head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: {file_type}\r\n'
+            f'\r\n'
+        ).encode('utf-8')
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self.content_length = len(self.head) + os.path.getsize(file_path) + len(self.tail)
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __iter__(self):
+        yield self.head
+        with open(self.file_path, 'rb') as f:
+            while chunk := f.read(self.chunk_size):
+                yield chunk
+        yield self.tail
+
+
+def upload(file_path: str, conn: http.client.HTTPConnection, settings: AnalyzerSettings) -> str:
+    """上传文件到API（流式发送文件内容）"""
+    body = MultipartFileBody(file_path)
     headers = {
-        'Authorization': f'Bearer {API_KEY}',
-        'Content-type': 'multipart/form-data; boundary={}'.format(boundary)
+        'Authorization': f'Bearer {settings.api_key}',
+        'Content-Type': body.content_type,
+        'Content-Length': str(body.content_length)
     }
-    conn.request("POST", "/v1/files", payload, headers)
-    res = conn.getresponse()
-    data = res.read()
-
-    raw_str = data.decode("utf-8")
-    json_data = json.loads(raw_str)
+    conn.request("POST", f"{settings.path_prefix}/v1/files", iter(body), headers)
+    json_data = read_json_response(conn.getresponse())
     url = json_data['url']
     return url
 
 
-def detect(audio_url: str, conn: http.client.HTTPSConnection) -> str:
-    """分析音频特点"""
-    payload = json.dumps({
-        "model": "gemini-2.5-pro-preview-05-06",
-        "stream": False,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": """请分析这个音频的声音特点，并按以下格式输出结果：
+TEXT_PROMPT = """请分析这个音频的声音特点，并按以下格式输出结果：
 
 【好听的名称】请为这个声音起一个2-6个字的好听的人名或昵称（可使用汉字、简洁创意的词汇）
 
@@ -94,6 +263,32 @@ def detect(audio_url: str, conn: http.client.HTTPSConnection) -> str:
 7. 适用场景
 
 请严格按照这个格式输出。"""
+
+JSON_PROMPT = """请分析这个音频的声音特点，只输出一个 JSON 对象，不要输出其他内容：
+
+{
+  "name": "为这个声音起的2-6个字的好听的人名或昵称",
+  "age": "年龄段，取值之一：5-7岁、8-12岁、13-18岁、18-25岁、25-35岁、35-50岁、50岁+",
+  "gender": "男 或 女",
+  "type": "最适用的用途：配音 或 解说",
+  "tags": ["3-8个声音特征标签"],
+  "description": "用150字左右精准描述这个声音的特点，包括年龄段和性别特征、音色质地、音调高低范围、语速和节奏特点、情感特质、音量大小和力度特点、适用场景"
+}"""
+
+
+def detect(audio_url: str, conn: http.client.HTTPConnection, settings: AnalyzerSettings) -> str:
+    """分析音频特点（response_format 为 json 时要求模型直接输出 JSON）"""
+    json_mode = settings.response_format == 'json'
+    request = {
+        "model": settings.model,
+        "stream": False,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": JSON_PROMPT if json_mode else TEXT_PROMPT
                     },
                     {
                         "type": "image_url",
@@ -105,135 +300,82 @@ def detect(audio_url: str, conn: http.client.HTTPSConnection) -> str:
             }
         ],
         "max_tokens": 4000
-    })
+    }
+    if json_mode:
+        request["response_format"] = {"type": "json_object"}
+    payload = json.dumps(request)
     headers = {
         'Accept': 'application/json',
-        'Authorization': f'Bearer {API_KEY}',
+        'Authorization': f'Bearer {settings.api_key}',
         'Content-Type': 'application/json'
     }
-    conn.request("POST", "/v1/chat/completions", payload, headers)
-    res = conn.getresponse()
-    data = res.read()
-
-    raw_str = data.decode("utf-8")
-    json_data = json.loads(raw_str)
+    conn.request("POST", f"{settings.path_prefix}/v1/chat/completions", payload, headers)
+    json_data = read_json_response(conn.getresponse())
 
     result = json_data['choices'][0]['message']['content']
     return result
 
 
-def parse_analysis(analysis_text: str) -> tuple[str, str, str, str, list[str], str]:
-    """解析AI分析结果"""
-    lines = analysis_text.split('\n')
-
-    name = "未知"
-    age = "未知"
-    gender = "未知"
-    voice_type = "配音"
-    tags: list[str] = []
-    description = analysis_text
-
-    current_section: Optional[str] = None
-
-    # 按段落解析
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        if '【好听的名称】' in line:
-            current_section = 'name'
-            name_text = line.replace('【好听的名称】', '').strip()
-            if name_text and len(name_text) <= 6:
-                name = name_text
-        elif '【年龄段】' in line:
-            current_section = 'age'
-        elif '【声音类型】' in line:
-            current_section = 'type'
-        elif '【声音特征】' in line:
-            current_section = 'tags'
-        elif '【详细描述】' in line:
-            current_section = 'description'
-        elif current_section == 'name' and not line.startswith('【'):
-            if len(line) <= 6 and line and ':' not in line:
-                name = line
-        elif current_section == 'age' and not line.startswith('【'):
-            if '女' in line or '女孩' in line:
-                gender = "女"
-            elif '男' in line or '男孩' in line:
-                gender = "男"
-
-            if '5' in line and '7' in line:
-                age = "5-7岁"
-            elif '8' in line and '12' in line:
-                age = "8-12岁"
-            elif '13' in line and '18' in line:
-                age = "13-18岁"
-            elif '18' in line and '25' in line:
-                age = "18-25岁"
-            elif '25' in line and '35' in line:
-                age = "25-35岁"
-            elif '35' in line and '50' in line:
-                age = "35-50岁"
-            elif '50' in line:
-                age = "50岁+"
-        elif current_section == 'type' and not line.startswith('【'):
-            if '解说' in line:
-                voice_type = "解说"
-            elif '配音' in line:
-                voice_type = "配音"
-        elif current_section == 'tags' and not line.startswith('【'):
-            if '|' in line:
-                tag_list = [t.strip() for t in line.split('|') if t.strip()]
-                tags.extend(tag_list)
-            elif line and ':' not in line:
-                tags.append(line)
-        elif current_section == 'description' and not line.startswith('【'):
-            if line:
-                description = line
-
-    if len(tags) < 3:
-        tag_keywords = ['明亮', '沙哑', '圆润', '尖细', '活泼', '温柔', '深沉', '清脆', '沙沙',
-                        '成熟', '稚嫩', '柔和', '有力', '高亢', '低沉', '快速', '缓慢', '标准',
-                        '方言', '口音', '甜美', '冷漠', '热情', '平静', '性感', '呆萌', '沧桑',
-                        '磁性', '爽朗', '文艺', '知性', '俏皮', '浑厚', '轻柔']
-
-        for keyword in tag_keywords:
-            if keyword in analysis_text:
-                tags.append(keyword)
-
-        if len(tags) < 3:
-            default_tags = ['参考音', '清晰', '自然']
-            tags.extend(default_tags[:3 - len(tags)])
-
-    tags = tags[:8]
-
-    return name, age, gender, voice_type, tags, description
-
-
-def find_audio_files(base_dir: str) -> list[str]:
-    """递归查找所有音频文件"""
-    audio_extensions = ['.wav', '.mp3', '.m4a', '.aac', '.flac', '.ogg']
-    audio_files: list[str] = []
-
-    for root, dirs, files in os.walk(base_dir):
-        for file in files:
-            if os.path.splitext(file)[1].lower() in audio_extensions:
-                audio_files.append(os.path.join(root, file))
-
-    return audio_files
+def load_csv_results(csv_path: str) -> list[dict]:
+    """读取分析结果CSV"""
+    results: list[dict] = []
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 7:
+                continue
+            name, rel_path, age, gender, voice_type, tags_str, description = row[:7]
+            results.append({
+                'name': name,
+                'path': rel_path,
+                'age': age,
+                'gender': gender,
+                'type': voice_type,
+                'tags': [t for t in tags_str.split('|') if t],
+                'description': description
+            })
+    return results
+
+
+def find_audio_files(base_dir: str, scan_index: Optional[ScanIndex] = None) -> list[str]:
+    """递归查找所有音频文件（并行扫描，未变化的目录复用扫描索引）"""
+    if scan_index is None:
+        scan_index = ScanIndex()
+    return sorted(path for path, _ in scan_index.scan(base_dir))
 
 
 class AudioAnalyzer:
     """音频分析器"""
 
-    def __init__(self):
+    def __init__(self, settings: AnalyzerSettings, scan_index: Optional[ScanIndex] = None,
+                 store: Optional[AnalysisStore] = None):
+        self.settings = settings
+        self.pool: Optional[ConnectionPool] = None
+        self.limiter: Optional[AdaptiveRateLimiter] = None
+        self.metrics = RunMetrics()
+        self._preprocess_executor: Optional[ProcessPoolExecutor] = None
+        self._preprocess_dir: str = ""
+        self.scan_index = scan_index
+        self.store = store
+        self.force = False
         self.is_running = False
         self.should_stop = False
         self.results: list[dict] = []
         self.progress_callback: Optional[Callable[[dict], None]] = None
         self.base_dir: str = ""
         self.csv_file: str = ""
+        self.writer: Optional[ResultWriter] = None
+        self._queue: Optional[Queue] = None
+        self._num_workers = 0
+        # 上一次运行的工作线程；停止超时后被放弃的线程仍在使用 pool / writer / should_stop，
+        # 全部退出之前不能开始新的运行
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def workers_alive(self) -> bool:
+        """上一次运行是否还有未退出的工作线程"""
+        return any(thread.is_alive() for thread in self._threads)
 
     def set_progress_callback(self, callback: Callable[[dict], None]):
         """设置进度回调函数"""
@@ -244,32 +386,115 @@ class AudioAnalyzer:
         if self.progress_callback:
             self.progress_callback(data)
 
-    def init_csv(self, csv_path: str):
-        """初始化CSV文件"""
+    def init_output(self, csv_path: str, resume: bool = False) -> list[dict]:
+        """打开结果输出（CSV 及配置的其他格式）；resume 时保留已有内容并返回 CSV 中的记录"""
         self.csv_file = csv_path
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['名称', '相对路径', '年龄', '性别', '类型', '标签', '描述'])
-
-    def save_to_csv(self, name: str, relative_path: str, age: str, gender: str,
-                    voice_type: str, tags: list[str], description: str):
-        """保存单条记录到CSV"""
-        with csv_lock:
-            with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                tags_str = '|'.join(tags)
-                writer.writerow([name, relative_path, age, gender, voice_type, tags_str, description])
-                f.flush()
+        existing: list[dict] = []
+        if resume and os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+            existing = load_csv_results(csv_path)
+        self.writer = ResultWriter(open_sinks(csv_path, list(self.settings.output_formats), resume=resume))
+        return existing
+
+    def save_result(self, result: dict):
+        """提交单条结果，由写入线程批量落盘"""
+        self.writer.write(result)
+
+    def close_output(self):
+        """写完剩余结果并关闭输出"""
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    def _call_api(self, fn: Callable[[http.client.HTTPConnection], str], upload_size: int = 0) -> str:
+        """按限速发起请求，遇到 429/5xx 或连接被重置/拒绝时退避重试，其他错误直接抛出"""
+        attempt = 0
+        stopped = lambda: self.should_stop
+        while True:
+            if not self.limiter.acquire_request(stopped):
+                raise InterruptedError("Analysis stopped")
+            if upload_size and not self.limiter.acquire_upload(upload_size, stopped):
+                raise InterruptedError("Analysis stopped")
+
+            self.metrics.add(requests=1)
+            try:
+                result = self.pool.request(fn)
+                self.limiter.on_success()
+                if upload_size:
+                    self.metrics.add(bytes_uploaded=upload_size)
+                return result
+            except (ApiError, http.client.HTTPException, OSError) as e:
+                if not is_retryable(e) or attempt >= self.settings.max_retries or self.should_stop:
+                    raise
+                retry_after = None
+                if isinstance(e, ApiError) and e.status == 429:
+                    self.limiter.on_throttled()
+                    self.metrics.add(throttled=1)
+                    retry_after = e.retry_after
+                self.pool.discard()
+                delay = self.limiter.backoff_delay(attempt, retry_after)
+                logger.warning(f"Request failed ({e}), retrying in {delay:.1f}s")
+                self.metrics.add(retries=1)
+                deadline = time.monotonic() + delay
+                while time.monotonic() < deadline and not self.should_stop:
+                    time.sleep(min(0.2, deadline - time.monotonic()))
+                attempt += 1
+
+    def _prepare_upload(self, file_path: str, index: int) -> str:
+        """在进程池中生成精简版音频，失败时退回原文件"""
+        if not self._preprocess_executor:
+            return file_path
+        try:
+            future = self._preprocess_executor.submit(
+                preprocess_for_analysis, file_path, self._preprocess_dir, f"{index:06d}",
+                self.settings.preprocess_format, self.settings.preprocess_sample_rate,
+                self.settings.preprocess_max_seconds
+            )
+            while True:
+                try:
+                    info = future.result(timeout=0.2)
+                    break
+                except TimeoutError:
+                    if self.should_stop:
+                        future.cancel()
+                        raise InterruptedError("Analysis stopped")
+        except InterruptedError:
+            raise
+        except Exception as e:
+            logger.warning(f"Preprocess failed for {file_path}, uploading original: {e}")
+            return file_path
+        if info['bytes'] >= info['original_bytes']:
+            os.remove(info['output'])
+            return file_path
+        self.metrics.add(bytes_saved=info['original_bytes'] - info['bytes'])
+        return info['output']
 
     def process_single_file(self, file_path: str, index: int, total: int) -> Optional[dict]:
         """处理单个音频文件"""
         if self.should_stop:
             return None
 
+        content_hash: Optional[str] = None
         try:
-            conn = get_connection()
             relative_path = os.path.relpath(file_path, self.base_dir)
 
+            # 相同内容已分析过则直接复用
+            if self.store:
+                content_hash = hash_file(file_path)
+                cached = None if self.force else self.store.get(content_hash)
+                if cached:
+                    self.metrics.add(files_done=1, files_cached=1)
+                    result = {**cached, 'path': relative_path}
+                    self.save_result(result)
+                    self.notify_progress({
+                        'type': 'completed',
+                        'file': relative_path,
+                        'current': index + 1,
+                        'total': total,
+                        'result': result,
+                        'cached': True
+                    })
+                    return result
+
             logger.info(f"Processing: {relative_path}")
             self.notify_progress({
                 'type': 'processing',
@@ -278,23 +503,26 @@ class AudioAnalyzer:
                 'total': total
             })
 
-            # 上传文件
-            audio_url = upload(file_path, conn)
+            # 上传文件（可选先精简）
+            upload_path = self._prepare_upload(file_path, index)
+            try:
+                audio_url = self._call_api(lambda conn: upload(upload_path, conn, self.settings),
+                                           upload_size=os.path.getsize(upload_path))
+            finally:
+                if upload_path != file_path:
+                    os.remove(upload_path)
             logger.info(f"Uploaded: {relative_path}")
 
             if self.should_stop:
-                conn.close()
                 return None
 
             # 分析音频
-            analysis = detect(audio_url, conn)
+            analysis = self._call_api(lambda conn: detect(audio_url, conn, self.settings))
             logger.info(f"Analyzed: {relative_path}")
 
             # 解析结果
-            name, age, gender, voice_type, tags, description = parse_analysis(analysis)
-
-            # 保存到CSV
-            self.save_to_csv(name, relative_path, age, gender, voice_type, tags, description)
+            parse = parse_analysis_json if self.settings.response_format == 'json' else parse_analysis
+            name, age, gender, voice_type, tags, description = parse(analysis)
 
             result = {
                 'name': name,
@@ -306,19 +534,44 @@ class AudioAnalyzer:
                 'description': description
             }
 
+            if self.store and content_hash:
+                self.store.put(content_hash, result, raw=analysis)
+                # 已提取过本地声学特征时核对性别/年龄段
+                features = self.store.get_features(content_hash, FEATURES_VERSION)
+                warnings = check_analysis(result, features) if features else []
+                if warnings:
+                    logger.warning(f"Suspicious analysis for {relative_path}: {'; '.join(warnings)}")
+                    result['warnings'] = warnings
+
+            # 写入线程异步序列化，提交后不能再修改 result
+            self.save_result(result)
+
+            self.metrics.add(files_done=1)
             self.notify_progress({
                 'type': 'completed',
                 'file': relative_path,
                 'current': index + 1,
                 'total': total,
-                'result': result
+                'result': result,
+                'stats': self.metrics.snapshot()
             })
 
-            conn.close()
             return result
 
+        except InterruptedError:
+            return None
+
         except Exception as e:
+            # 停止时被中断的请求不算失败，下次运行会重新处理
+            if self.should_stop:
+                return None
             logger.error(f"Error processing {file_path}: {str(e)}")
+            self.metrics.add(files_failed=1)
+            # 出错后连接状态不可信，下次重新建立
+            if self.pool:
+                self.pool.discard()
+            if self.store and content_hash:
+                self.store.put_failure(content_hash, str(e))
             self.notify_progress({
                 'type': 'error',
                 'file': os.path.relpath(file_path, self.base_dir),
@@ -328,24 +581,44 @@ class AudioAnalyzer:
             })
             return None
 
-    def start_analysis(self, base_dir: str, csv_path: str, num_workers: int = 5):
-        """开始分析"""
+    def start_analysis(self, base_dir: str, csv_path: str, num_workers: int = 0,
+                       resume: bool = False, force: bool = False, files: Optional[list[str]] = None):
+        """开始分析
+
+        files 不为空时只分析其中的文件（如本地特征初筛后选出的片段），否则分析 base_dir 下全部音频。
+
+        resume 为 True 时追加到已有的 csv_path，已在其中的文件直接跳过；
+        其余文件按内容哈希复用已成功的分析结果，只有新文件和之前失败的文件会请求远程分析。
+        force 为 True 时忽略已保存的结果全部重新分析。
+        num_workers 为 0 时使用配置中的并发数；请求速率和上传带宽按配置限速，429/5xx 自动退避重试。
+        上一次运行停止时被放弃的工作线程还没退出时抛出 RuntimeError。
+        """
+        if self.workers_alive:
+            raise RuntimeError("Workers of the previous analysis are still stopping")
         self.is_running = True
         self.should_stop = False
-        self.results = []
+        self.force = force
         self.base_dir = base_dir
+        self.pool = ConnectionPool(self.settings)
+        self.limiter = AdaptiveRateLimiter(self.settings.requests_per_second,
+                                           self.settings.upload_bytes_per_second)
+        self.metrics = RunMetrics()
+        num_workers = num_workers or self.settings.num_workers
 
-        # 初始化CSV
-        self.init_csv(csv_path)
+        # 打开结果输出
+        self.results = self.init_output(csv_path, resume)
+        done_paths = {r['path'] for r in self.results}
 
         # 查找音频文件
-        audio_files = find_audio_files(base_dir)
+        candidates = sorted(files) if files else find_audio_files(base_dir, self.scan_index)
+        audio_files = [f for f in candidates if os.path.relpath(f, base_dir) not in done_paths]
         total = len(audio_files)
 
-        logger.info(f"Found {total} audio files")
+        logger.info(f"Found {total} audio files to analyze ({len(done_paths)} already in {csv_path})")
         self.notify_progress({
             'type': 'start',
-            'total': total
+            'total': total,
+            'skipped': len(done_paths)
         })
 
         if not audio_files:
@@ -354,62 +627,110 @@ class AudioAnalyzer:
                 'total': 0,
                 'success': 0
             })
+            self.close_output()
             self.is_running = False
             return
 
-        # 创建任务队列
+        # 上传前精简音频（解码/转码是 CPU 密集型，放在进程池中）
+        if self.settings.preprocess and self.settings.preprocess_format in EXPORT_FORMATS:
+            self._preprocess_dir = tempfile.mkdtemp(prefix="hetang_analysis_")
+            self._preprocess_executor = ProcessPoolExecutor(
+                max_workers=self.settings.preprocess_workers or None
+            )
+
+        # 创建任务队列：先放入全部任务，再为每个工作线程放一个结束标记
         queue: Queue = Queue()
+        for index, file_path in enumerate(audio_files):
+            queue.put((index, file_path))
+        for _ in range(num_workers):
+            queue.put(None)
+        self._queue = queue
+        self._num_workers = num_workers
         results_lock = threading.Lock()
 
         def worker():
             while True:
                 item = queue.get()
-                if item is None:
+                if item is None or self.should_stop:
                     break
                 index, file_path = item
                 result = self.process_single_file(file_path, index, total)
                 if result:
                     with results_lock:
                         self.results.append(result)
-                queue.task_done()
 
-        # 启动工作线程
-        threads = []
+        # 启动工作线程（守护线程：停止时超时仍未退出的线程不会阻止程序退出）
+        threads = self._threads = []
         for _ in range(num_workers):
-            thread = threading.Thread(target=worker)
+            thread = threading.Thread(target=worker, daemon=True)
             thread.start()
             threads.append(thread)
 
-        # 添加任务到队列
-        for index, file_path in enumerate(audio_files):
+        # 等待工作线程结束；停止后最多再等 stop_timeout 秒
+        stop_deadline: Optional[float] = None
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.2)
             if self.should_stop:
-                break
-            queue.put((index, file_path))
-
-        # 等待所有任务完成
-        queue.join()
-
-        # 停止工作线程
-        for _ in range(num_workers):
-            queue.put(None)
+                if stop_deadline is None:
+                    stop_deadline = time.monotonic() + self.settings.stop_timeout
+                elif time.monotonic() >= stop_deadline:
+                    alive = sum(thread.is_alive() for thread in threads)
+                    logger.warning(f"{alive} analysis workers did not stop within "
+                                   f"{self.settings.stop_timeout}s, abandoning them")
+                    break
 
-        for thread in threads:
-            thread.join()
+        self._queue = None
+        self.pool.close_all()
+        self.close_output()
+        if self._preprocess_executor:
+            self._preprocess_executor.shutdown(cancel_futures=True)
+            self._preprocess_executor = None
+            shutil.rmtree(self._preprocess_dir, ignore_errors=True)
 
+        success = len(self.results) - len(done_paths)
+        stats = self.metrics.snapshot()
         self.notify_progress({
             'type': 'finish',
             'total': total,
-            'success': len(self.results)
+            'success': success,
+            'stopped': self.should_stop,
+            'stats': stats
         })
 
         self.is_running = False
-        logger.info(f"Analysis completed. {len(self.results)}/{total} files processed successfully")
+        logger.info(f"Analysis completed. {success}/{total} files processed successfully, "
+                    f"{stats['filesPerMinute']} files/min, {stats['retries']} retries, "
+                    f"{stats['throttled']} throttled")
 
     def stop_analysis(self):
-        """停止分析"""
+        """停止分析：丢弃排队中的任务，中断进行中的请求和预处理"""
         self.should_stop = True
         logger.info("Stopping analysis...")
 
+        queue = self._queue
+        if queue is not None:
+            dropped = 0
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except Empty:
+                    break
+                dropped += item is not None
+            # 结束标记也被清掉了，重新放入让等待中的工作线程退出
+            for _ in range(self._num_workers):
+                queue.put(None)
+            logger.info(f"Dropped {dropped} queued files")
+
+        if self.pool:
+            self.pool.abort()
+        if self._preprocess_executor:
+            self._preprocess_executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        """获取本次运行的吞吐统计"""
+        return self.metrics.snapshot()
+
     def get_results(self) -> list[dict]:
         """获取分析结果"""
         return self.results
@@ -0,0 +1,471 @@
+import io
+import os
+import threading
+import wave
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Union
+
+import numpy as np
+from loguru import logger
+
+from backend.analysis_store import hash_file
+from backend.loudness import measure_file, normalization_gain_db
+from backend.metrics import StageTimer
+from backend.time_stretch import DEFAULT_PRESET, PCM_DTYPES, float_to_pcm, pcm_to_float, segment_pcm, wsola
+from backend.wav_file import open_wav, read_wav_header
+from backend.waveform_peaks import SIDECAR_SUFFIX, compute_peaks, compute_peaks_file, write_peaks
+
+# PCM 描述：{'shm': 共享内存名, 'frames', 'channels', 'sample_width', 'frame_rate'}
+PcmInfo = dict
+
+SILENCE_CHUNK_MS = 10
+
+
+def share_pcm(data, channels: int, sample_width: int, frame_rate: int) -> tuple[shared_memory.SharedMemory, PcmInfo]:
+    """把 PCM 数据（bytes / memoryview / 连续的 NumPy 数组）放进新建的共享内存，返回 (共享内存, 描述)；创建者负责 close/unlink"""
+    view = memoryview(data).cast('B')
+    shm = create_shared(len(view))
+    shm.buf[:len(view)] = view
+    return shm, {
+        'shm': shm.name,
+        'frames': len(view) // (channels * sample_width),
+        'channels': channels,
+        'sample_width': sample_width,
+        'frame_rate': frame_rate
+    }
+
+
+def create_shared(size: int) -> shared_memory.SharedMemory:
+    """新建共享内存（至少 1 字节）；创建者负责 close/unlink"""
+    return shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+
+def open_pcm(info: PcmInfo) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    """按描述打开共享内存，返回 (共享内存, 直接映射其内容的整数数组 (采样数 × 声道数,))"""
+    shm = shared_memory.SharedMemory(name=info['shm'])
+    count = info['frames'] * info['channels']
+    return shm, np.ndarray((count,), dtype=PCM_DTYPES[info['sample_width']], buffer=shm.buf)
+
+
+def release_pcm(shm: shared_memory.SharedMemory, unlink: bool = False):
+    try:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    except (BufferError, FileNotFoundError):
+        pass
+
+
+def read_wav_bytes(data: bytes) -> Optional[tuple[memoryview, int, int, int]]:
+    """解析内存中的 PCM WAV，返回 (采样数据, 声道数, 采样字节数, 采样率)；非 16/32 位 PCM 时返回 None"""
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wav:
+            channels, sample_width, frame_rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            if sample_width not in (2, 4):
+                return None
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    return memoryview(frames), channels, sample_width, frame_rate
+
+
+def load_pcm(file_path: str, channels: Optional[int] = None, sample_width: Optional[int] = None,
+             frame_rate: Optional[int] = None) -> tuple[np.ndarray, int, int, int]:
+    """
+    读取音频为整数 PCM 数组 (采样数, 声道数)，编码与 WAV 文件相同（8 位无符号），可选转换为指定格式
+
+    16/32 位 PCM WAV 且格式已符合要求时直接返回文件的内存映射（项目自己生成的配音都是这种情况），
+    其他情况用 pydub 解码和转换。
+
+    返回:
+        (数组, 声道数, 采样字节数, 采样率)
+    """
+    opened = open_wav(file_path)
+    if opened is not None:
+        info, pcm = opened
+        if (info.sample_width in (2, 4)
+                and channels in (None, info.channels)
+                and sample_width in (None, info.sample_width)
+                and frame_rate in (None, info.frame_rate)):
+            return pcm, info.channels, info.sample_width, info.frame_rate
+
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(file_path)
+    if channels and audio.channels != channels:
+        audio = audio.set_channels(channels)
+    if audio.sample_width not in PCM_DTYPES:
+        audio = audio.set_sample_width(2)
+    if sample_width and audio.sample_width != sample_width:
+        audio = audio.set_sample_width(sample_width)
+    if frame_rate and audio.frame_rate != frame_rate:
+        audio = audio.set_frame_rate(frame_rate)
+    pcm = segment_pcm(audio).reshape(-1, audio.channels)
+    return pcm, audio.channels, audio.sample_width, audio.frame_rate
+
+
+def leading_silence_ms(samples: np.ndarray, frame_rate: int, silence_thresh_db: float) -> int:
+    """开头静音时长（毫秒），按 10ms 分块计算响度，与 pydub chunk.dBFS 逐块判断的结果一致"""
+    chunk = frame_rate * SILENCE_CHUNK_MS // 1000
+    n_chunks = -(-len(samples) // chunk)
+    if n_chunks == 0:
+        return 0
+    padded = np.zeros((n_chunks * chunk, samples.shape[1]), dtype=np.float32)
+    padded[:len(samples)] = samples
+    power = (padded * padded).reshape(n_chunks, -1).sum(axis=1)
+    # 最后一块可能不满，按实际采样数求均值
+    counts = np.full(n_chunks, chunk * samples.shape[1], dtype=np.float32)
+    counts[-1] = (len(samples) - (n_chunks - 1) * chunk) * samples.shape[1]
+    with np.errstate(divide='ignore'):
+        chunk_db = 10 * np.log10(power / counts)
+    loud = np.flatnonzero(chunk_db > silence_thresh_db)
+    return int(loud[0]) * SILENCE_CHUNK_MS if len(loud) else n_chunks * SILENCE_CHUNK_MS
+
+
+def write_wav(output_file: str, pcm: np.ndarray, channels: int, sample_width: int, frame_rate: int):
+    with wave.open(output_file, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(frame_rate)
+        wav.writeframes(pcm)
+
+
+def process_speech(
+    source: Union[PcmInfo, str],
+    output_file: str,
+    speed: float = 1.0,
+    quality: str = DEFAULT_PRESET,
+    silence_thresh_db: float = -50.0,
+    keep_ms: int = 50
+) -> dict:
+    """
+    配音后处理：删除开头静音、变速（保持音高），写出 WAV 和波形峰值 sidecar（在进程池中运行）
+
+    参数:
+        source: 共享内存中的 PCM 描述，或需要先解码的音频文件路径
+        output_file: 输出 WAV 路径
+        speed: 语速倍率
+        quality: 变速质量预设
+        silence_thresh_db: 静音阈值（dB）
+        keep_ms: 保留的开头静音时长（毫秒）
+
+    返回:
+        dict: {'output', 'trimmed_ms', 'frames', 'frame_rate', 'duration_ms', 'loudness', 'checksum',
+               'spans': 各阶段耗时（decode / trim / speed / write / analyze，秒）}
+    """
+    shm = None
+    timer = StageTimer()
+    try:
+        with timer.span('decode'):
+            if isinstance(source, str):
+                pcm, channels, sample_width, frame_rate = load_pcm(source)
+            else:
+                channels, sample_width, frame_rate = source['channels'], source['sample_width'], source['frame_rate']
+                shm, pcm = open_pcm(source)
+
+            samples = pcm_to_float(pcm, sample_width, channels)
+            # 转换完成后就不再需要共享内存/内存映射里的原始数据（输出可能覆盖同一个文件）
+            del pcm
+            if shm is not None:
+                release_pcm(shm)
+                shm = None
+
+        with timer.span('trim'):
+            silence_ms = leading_silence_ms(samples, frame_rate, silence_thresh_db)
+            trimmed_ms = max(0, silence_ms - keep_ms)
+            if trimmed_ms:
+                samples = samples[trimmed_ms * frame_rate // 1000:]
+
+        if speed != 1.0 and len(samples):
+            with timer.span('speed'):
+                samples = wsola(samples, speed, frame_rate, quality)
+
+        with timer.span('write'):
+            write_wav(output_file, float_to_pcm(samples, sample_width), channels, sample_width, frame_rate)
+        with timer.span('analyze'):
+            write_peaks(output_file + SIDECAR_SUFFIX, compute_peaks(samples, frame_rate), output_file)
+            # 响度在这里顺便测好，导出时不必重新解码测量
+            loudness = measure_file(output_file, samples, frame_rate)
+            # 导出前校验文件是否损坏
+            checksum = hash_file(output_file)
+        return {
+            'output': output_file,
+            'trimmed_ms': trimmed_ms,
+            'frames': len(samples),
+            'frame_rate': frame_rate,
+            'duration_ms': len(samples) * 1000 // frame_rate,
+            'loudness': loudness,
+            'checksum': checksum,
+            'spans': timer.spans
+        }
+    finally:
+        if shm is not None:
+            release_pcm(shm)
+
+
+def estimate_pcm_bytes(file_path: str, channels: Optional[int] = None, sample_width: Optional[int] = None,
+                       frame_rate: Optional[int] = None) -> int:
+    """按 WAV 文件头估算解码并转换为指定格式后的 PCM 字节数；不是 WAV 时返回 0"""
+    info = read_wav_header(file_path)
+    if info is None or not info.frame_rate:
+        return 0
+    frames = info.frames
+    if frame_rate and frame_rate != info.frame_rate:
+        # 重采样后的帧数取整可能多一帧
+        frames = -(-frames * frame_rate // info.frame_rate) + 1
+    sample_width = sample_width or (info.sample_width if info.sample_width in PCM_DTYPES else 2)
+    return frames * (channels or info.channels) * sample_width
+
+
+def decode_into_shared(file_path: str, shm_name: str, capacity: int, channels: Optional[int] = None,
+                       sample_width: Optional[int] = None, frame_rate: Optional[int] = None,
+                       gain_db: Optional[float] = None, normalize: Optional[tuple[float, float]] = None) -> PcmInfo:
+    """
+    解码音频文件，写入调用方创建的共享内存（在进程池中运行）
+
+    共享内存由调用方创建并持有到读取完毕：Windows 上最后一个句柄关闭时共享内存即被销毁，
+    不能由工作进程创建、关闭后再交给调用方打开。
+    解码结果超过 capacity 字节时不写入，返回值的 'needed' 为实际需要的字节数。
+
+    gain_db 不为 None 时先施加该增益；否则若给出 normalize=(目标响度, 峰值上限)，
+    先测量响度（结果放在返回值的 'loudness' 中）再施加相应增益。
+    """
+    pcm, channels, sample_width, frame_rate = load_pcm(file_path, channels, sample_width, frame_rate)
+    loudness = None
+    if gain_db is not None or normalize is not None:
+        samples = pcm_to_float(pcm, sample_width, channels)
+        if gain_db is None:
+            loudness = measure_file(file_path, samples, frame_rate)
+            gain_db = normalization_gain_db(loudness, *normalize)
+        if gain_db:
+            samples *= np.float32(10 ** (gain_db / 20))
+            pcm = float_to_pcm(samples, sample_width)
+
+    view = memoryview(pcm).cast('B')
+    info = {
+        'shm': shm_name,
+        'frames': len(view) // (channels * sample_width),
+        'channels': channels,
+        'sample_width': sample_width,
+        'frame_rate': frame_rate,
+        'gainDb': gain_db or 0.0
+    }
+    if loudness is not None:
+        info['loudness'] = loudness
+    if len(view) > capacity:
+        info['needed'] = len(view)
+        return info
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        shm.buf[:len(view)] = view
+    finally:
+        release_pcm(shm)
+    return info
+
+
+class AudioWorkerPool:
+    """
+    音频后处理进程池
+
+    调用方线程只负责网络 I/O 和把 PCM 放进共享内存，解码、删静音、变速和编码在独立进程中进行，
+    不占用 API 线程的 GIL。进程池按需创建；进程池不可用时退回在当前线程中处理。
+    """
+
+    def __init__(self, num_workers: int = 0):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.num_workers)
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        """丢弃已损坏的进程池；其他线程可能已经换上了新的进程池，只在仍是同一个时重置"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        return self._get_executor().submit(fn, *args)
+
+    def _run(self, fn, *args):
+        """在进程池中执行并等待结果；进程池损坏时重建一次，仍失败则在当前线程执行"""
+        for _ in range(2):
+            executor = self._get_executor()
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                logger.warning("Audio worker pool broken, recreating")
+                self._discard(executor)
+        return fn(*args)
+
+    def process_speech(self, audio_data: bytes, output_file: str, speed: float = 1.0,
+                       quality: str = DEFAULT_PRESET, silence_thresh_db: float = -50.0, keep_ms: int = 50) -> dict:
+        """
+        对 TTS 返回的音频做后处理并写到 output_file
+
+        PCM WAV 直接放入共享内存交给工作进程；其他格式先写到 output_file，由工作进程解码后覆盖。
+        """
+        parsed = read_wav_bytes(audio_data)
+        if parsed is None:
+            with open(output_file, 'wb') as f:
+                f.write(audio_data)
+            return self._run(process_speech, output_file, output_file, speed, quality, silence_thresh_db, keep_ms)
+
+        frames, channels, sample_width, frame_rate = parsed
+        shm, info = share_pcm(frames, channels, sample_width, frame_rate)
+        try:
+            return self._run(process_speech, info, output_file, speed, quality, silence_thresh_db, keep_ms)
+        finally:
+            release_pcm(shm, unlink=True)
+
+    def concat_to_wav(self, files: list[str], output_file: str, gains: Optional[list[Optional[float]]] = None,
+                      normalize: Optional[tuple[float, float]] = None, window: int = 0,
+                      target: Optional[tuple[int, int, int]] = None) -> list[dict]:
+        """
+        按顺序拼接音频为一个 WAV
+
+        各文件在工作进程中解码并转换为统一格式，写入本线程按 WAV 文件头预估大小创建的共享内存；
+        本线程按顺序把共享内存直接写入输出文件，
+        同时最多有 window 个文件在解码（默认进程数的 2 倍），限制共享内存占用。
+        可以在多个线程中同时调用（例如分章节导出）。
+
+        参数:
+            gains: 每个文件的增益（dB），为 None 的项在给出 normalize 时由工作进程测量后计算
+            normalize: (目标响度 LUFS, 峰值上限 dBFS)，为 None 时不做响度归一化
+            target: 输出格式 (声道数, 采样字节数, 采样率)，为 None 时使用第一个文件的格式
+
+        返回:
+            list[dict]: 每个文件 {'path', 'frames', 'frame_rate', 'duration_ms', 'gainDb'}，与 files 顺序一致；
+                        本次新测量了响度的文件另有 'loudness'
+        """
+        if not files:
+            raise ValueError("No audio files to concatenate")
+        window = window or self.num_workers * 2
+        gains = gains or [None] * len(files)
+
+        shm, info = self._decode_shared(files[0], target or (None, None, None), gains[0], normalize)
+        target = (info['channels'], info['sample_width'], info['frame_rate'])
+        results: list[dict] = []
+        pending: deque = deque()  # (共享内存, future)
+        next_index = 1
+
+        def fill():
+            nonlocal next_index
+            while next_index < len(files) and len(pending) < window:
+                path = files[next_index]
+                segment = create_shared(estimate_pcm_bytes(path, *target))
+                try:
+                    future = self._submit(decode_into_shared, path, segment.name, segment.size, *target,
+                                          gains[next_index], normalize)
+                except BaseException:
+                    release_pcm(segment, unlink=True)
+                    raise
+                pending.append((segment, future))
+                next_index += 1
+
+        written = 0
+        try:
+            with wave.open(output_file, 'wb') as wav:
+                wav.setnchannels(target[0])
+                wav.setsampwidth(target[1])
+                wav.setframerate(target[2])
+                fill()
+                for index, path in enumerate(files):
+                    nbytes = info['frames'] * target[0] * target[1]
+                    wav.writeframesraw(shm.buf[:nbytes])
+                    release_pcm(shm, unlink=True)
+                    shm = None
+                    result = {
+                        'path': path,
+                        'frames': info['frames'],
+                        'frame_rate': target[2],
+                        'duration_ms': info['frames'] * 1000 // target[2],
+                        'gainDb': info['gainDb']
+                    }
+                    if 'loudness' in info:
+                        result['loudness'] = info['loudness']
+                    results.append(result)
+                    written += 1
+                    if pending:
+                        shm, future = pending.popleft()
+                        info = future.result()
+                        if 'needed' in info:
+                            release_pcm(shm, unlink=True)
+                            shm = None
+                            shm, info = self._redecode(files[index + 1], info)
+                        fill()
+        finally:
+            # 出错时等正在解码的任务结束，再释放尚未写入的共享内存
+            if shm is not None:
+                release_pcm(shm, unlink=True)
+            for segment, future in pending:
+                try:
+                    future.result()
+                except Exception:
+                    pass
+                release_pcm(segment, unlink=True)
+
+        logger.info(f"Concatenated {written} files into {output_file}")
+        return results
+
+    def _decode_shared(self, path: str, target: tuple, gain_db: Optional[float],
+                       normalize: Optional[tuple[float, float]]) -> tuple[shared_memory.SharedMemory, PcmInfo]:
+        """在工作进程中解码到新建的共享内存并等待完成，返回 (共享内存, 描述)；调用方负责 unlink"""
+        shm = create_shared(estimate_pcm_bytes(path, *target))
+        try:
+            info = self._run(decode_into_shared, path, shm.name, shm.size, *target, gain_db, normalize)
+        except BaseException:
+            release_pcm(shm, unlink=True)
+            raise
+        if 'needed' not in info:
+            return shm, info
+        release_pcm(shm, unlink=True)
+        return self._redecode(path, info)
+
+    def _redecode(self, path: str, info: PcmInfo) -> tuple[shared_memory.SharedMemory, PcmInfo]:
+        """按工作进程报告的实际大小换一块共享内存重新解码（文件不是 WAV、无法预估大小时）"""
+        shm = create_shared(info['needed'])
+        try:
+            # 沿用第一次算出的增益，不再重新测量响度
+            decoded = self._run(decode_into_shared, path, shm.name, shm.size, info['channels'],
+                                info['sample_width'], info['frame_rate'], info['gainDb'] or None, None)
+        except BaseException:
+            release_pcm(shm, unlink=True)
+            raise
+        if 'loudness' in info:
+            decoded['loudness'] = info['loudness']
+        return shm, decoded
+
+    def compute_peaks(self, source_path: str, sidecar_path: str) -> dict:
+        """计算峰值 sidecar 并等待完成"""
+        return self._run(compute_peaks_file, source_path, sidecar_path)
+
+    def compute_peaks_background(self, items: list[tuple[str, str]]):
+        """在后台为一批 (音频路径, sidecar 路径) 计算峰值，不等待结果"""
+        def on_done(future, path):
+            if future.exception() is not None:
+                logger.warning(f"Failed to compute peaks for {path}: {future.exception()}")
+
+        for source_path, sidecar_path in items:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(compute_peaks_file, source_path, sidecar_path)
+            except BrokenProcessPool:
+                self._discard(executor)
+                return
+            future.add_done_callback(lambda f, p=source_path: on_done(f, p))
+
+    def close(self, wait: bool = False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,431 @@
+"""
+生成与导出流水线的基准测试
+
+在本地启动一个模拟 TTS 服务（返回合成的 WAV，可配置延迟和错误率），按真实项目规模依次测量：
+generate（请求 + 后处理）、trim_leading_silence、adjust_speed（WSOLA，并与旧版 pydub 变速 adjust_speed_legacy 对比）、
+导出（校验 + 合并 + 字幕）、save_project，报告每秒行数、p50/p95 延迟、峰值内存和写入字节数。
+
+    python -m backend.benchmark --lines 100 2000 20000 --json result.json
+    python -m backend.benchmark --lines 1000 --baseline result.json  # 吞吐下降超过容差时退出码为 1
+"""
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from backend.metrics import performance_report
+from backend.output_verifier import verify_outputs
+from backend.project_export import ProjectExporter
+from backend.project_manager import ProjectManager
+from backend.tts_service import TTSService
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SAMPLE_RATE = 24000
+SENTENCE_CHARS = '荷塘月色曲曲折折的田田的叶子中间零星地点缀着些白花有袅娜地开着的有羞涩地打着朵儿的'
+
+
+def synth_wav(seconds: float, lead_silence: float = 0.3, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """合成一段带开头静音、谐波和音节包络的"语音"，16 位单声道 WAV"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voice = sum(np.sin(2 * np.pi * 160 * h * t) / h for h in range(1, 6))
+    voice *= 0.5 * (1 - np.cos(2 * np.pi * 4 * t)) * 0.25
+    pcm = np.concatenate([np.zeros(int(lead_silence * sample_rate)), voice])
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((pcm * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+class StubTTSServer:
+    """
+    本地模拟 TTS 服务，接口与真实服务相同（POST JSON，返回 WAV）
+
+    参数:
+        latency: 平均响应延迟（秒），实际在 ±jitter 比例内均匀分布
+        error_rate: 返回 HTTP 500 的概率
+        seconds_per_char: 合成音频每个字的时长
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.5, error_rate: float = 0.0,
+                 seconds_per_char: float = 0.2, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seconds_per_char = seconds_per_char
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/tts"
+
+    def _draw(self) -> tuple[float, bool]:
+        with self._random_lock:
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            return max(0.0, delay), self._random.random() < self.error_rate
+
+    def start(self) -> 'StubTTSServer':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                started = time.perf_counter()
+                delay, failed = stub._draw()
+                time.sleep(delay)
+                if failed:
+                    body, status, content_type = b'{"detail": "synthetic error"}', 500, 'application/json'
+                else:
+                    seconds = max(0.5, len(payload.get('text', '')) * stub.seconds_per_char)
+                    body, status, content_type = synth_wav(seconds), 200, 'audio/wav'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Server-Timing', f"tts;dur={(time.perf_counter() - started) * 1000:.1f}")
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+@dataclass
+class StageResult:
+    name: str
+    lines: int
+    seconds: float
+    latencies: list[float] = field(default_factory=list)  # 每次调用的耗时（秒）
+    bytes_written: int = 0
+    errors: int = 0
+    peak_rss_mb: float = 0.0
+
+    @property
+    def lines_per_sec(self) -> float:
+        return self.lines / self.seconds if self.seconds else 0.0
+
+    def percentile_ms(self, q: float) -> Optional[float]:
+        return float(np.percentile(self.latencies, q) * 1000) if self.latencies else None
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'lines': self.lines,
+            'seconds': round(self.seconds, 3),
+            'linesPerSec': round(self.lines_per_sec, 2),
+            'p50Ms': self.percentile_ms(50),
+            'p95Ms': self.percentile_ms(95),
+            'bytesWritten': self.bytes_written,
+            'errors': self.errors,
+            'peakRssMb': round(self.peak_rss_mb, 1)
+        }
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """进程（或已回收的子进程中最大的）峰值常驻内存，不支持的平台返回 0"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux 单位是 KB，macOS 是字节
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _file_size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _tree_size(path: Path) -> int:
+    return sum(_file_size(p) for p in path.rglob('*') if p.is_file())
+
+
+def _timed(fn, *args, **kwargs) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def legacy_adjust_speed(audio_file: str, speed: float, output_file: str):
+    """旧版变速：加速用 pydub speedup（切片拼接），减速用改帧率后重采样（音高会变低），作为 WSOLA 的对照"""
+    from pydub import AudioSegment
+    from pydub.effects import speedup
+
+    audio = AudioSegment.from_wav(audio_file)
+    if speed > 1.0:
+        adjusted = speedup(audio, playback_speed=speed)
+    else:
+        slowed = audio._spawn(audio.raw_data, overrides={"frame_rate": int(audio.frame_rate * speed)})
+        adjusted = slowed.set_frame_rate(audio.frame_rate)
+    adjusted.export(output_file, format='wav')
+
+
+def make_lines(count: int, chapter_every: int = 200, seed: int = 0) -> list[dict]:
+    """生成演示台词：长度 8~40 字，三个角色轮流，每 chapter_every 行插入一个章节标记行"""
+    rng = random.Random(seed)
+    roles = ['旁白', '甲', '乙']
+    lines = []
+    for index in range(count):
+        if chapter_every and index % chapter_every == 0:
+            content = f"第{index // chapter_every + 1}章"
+        else:
+            content = ''.join(rng.choice(SENTENCE_CHARS) for _ in range(rng.randint(8, 40)))
+        lines.append({'index': index, 'role': roles[index % len(roles)], 'content': content, 'status': 'pending'})
+    return lines
+
+
+class PipelineBenchmark:
+    """在临时目录中对一个规模为 lines 的项目跑完整流水线"""
+
+    def __init__(self, workdir: Path, server: StubTTSServer, concurrency: int = 5, speed: float = 1.2,
+                 quality: str = 'balanced', workers: int = 0, save_repeat: int = 20, sample_ops: int = 50):
+        self.workdir = workdir
+        self.server = server
+        self.concurrency = concurrency
+        self.speed = speed
+        self.save_repeat = save_repeat
+        self.sample_ops = sample_ops
+        self.service = TTSService(quality, workers)
+        self.project_manager = ProjectManager(str(workdir / 'projects'))
+        self.reference = workdir / 'reference.wav'
+        self.reference.write_bytes(synth_wav(3.0))
+
+    def close(self):
+        self.service.workers.close(wait=True)
+
+    def run(self, lines: int) -> tuple[list[StageResult], dict]:
+        """返回 (各阶段结果, 生成配音的分阶段耗时报告)"""
+        name = self.project_manager.create_project(f"bench_{lines}")['name']
+        output_dir = self.project_manager.get_output_dir(name)
+        tasks = make_lines(lines)
+
+        results = [self.bench_generate(tasks, output_dir)]
+        completed = [t for t in tasks if t['status'] == 'completed']
+        if completed:
+            results.append(self.bench_trim(completed))
+            results.append(self.bench_speed(completed))
+            results.append(self.bench_speed_legacy(completed))
+            results.append(self.bench_export(name, completed))
+        results.append(self.bench_save(name, tasks))
+        return results, performance_report(tasks)
+
+    def bench_generate(self, tasks: list[dict], output_dir: Path) -> StageResult:
+        def generate(task: dict) -> float:
+            output_file = output_dir / f"{task['index']:04d}_{task['role']}.wav"
+            elapsed, result = _timed(self.service.generate, self.server.url, task['content'],
+                                     str(self.reference), str(output_file), speed=self.speed)
+            if result['success']:
+                task.update(status='completed', outputFile=result['output'],
+                            loudness=result['loudness'], timing=result['timing'], spans=result['spans'])
+            else:
+                task.update(status='error', error=result['error'])
+            return elapsed
+
+        # 与前端批量生成相同：固定并发数的请求
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            latencies = list(executor.map(generate, tasks))
+        seconds = time.perf_counter() - started
+        return StageResult('generate', len(tasks), seconds, latencies, _tree_size(output_dir),
+                           errors=sum(1 for t in tasks if t['status'] != 'completed'), peak_rss_mb=peak_rss_mb())
+
+    def _sample(self, tasks: list[dict]) -> list[dict]:
+        return tasks[:self.sample_ops] if self.sample_ops else tasks
+
+    def bench_trim(self, tasks: list[dict]) -> StageResult:
+        scratch = self.workdir / 'scratch_trim.wav'
+        latencies, written = [], 0
+        for task in self._sample(tasks):
+            # 已生成的配音开头静音已删掉，这里在前面补上静音后再删
+            raw = synth_wav(task['timing']['durationMs'] / 1000)
+            scratch.write_bytes(raw)
+            elapsed, _ = _timed(self.service.trim_leading_silence, str(scratch))
+            latencies.append(elapsed)
+            written += _file_size(scratch)
+        return StageResult('trim_leading_silence', len(latencies), sum(latencies), latencies, written,
+                           peak_rss_mb=peak_rss_mb())
+
+    def bench_speed(self, tasks: list[dict]) -> StageResult:
+        scratch = self.workdir / 'scratch_speed.wav'
+        latencies, written = [], 0
+        for task in self._sample(tasks):
+            elapsed, result = _timed(self.service.adjust_speed, task['outputFile'], self.speed, str(scratch))
+            latencies.append(elapsed)
+            written += _file_size(scratch) if result['success'] else 0
+        return StageResult('adjust_speed', len(latencies), sum(latencies), latencies, written,
+                           peak_rss_mb=peak_rss_mb())
+
+    def bench_speed_legacy(self, tasks: list[dict]) -> StageResult:
+        """与 bench_speed 相同的文件和倍率，使用旧版 pydub 变速"""
+        scratch = self.workdir / 'scratch_speed_legacy.wav'
+        latencies, written, errors = [], 0, 0
+        for task in self._sample(tasks):
+            try:
+                elapsed, _ = _timed(legacy_adjust_speed, task['outputFile'], self.speed, str(scratch))
+            except Exception as e:
+                logger.debug(f"Legacy speed change failed: {e}")
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            written += _file_size(scratch)
+        return StageResult('adjust_speed_legacy', len(latencies), sum(latencies), latencies, written,
+                           errors=errors, peak_rss_mb=peak_rss_mb())
+
+    def bench_export(self, name: str, tasks: list[dict]) -> StageResult:
+        """与 export_project 选择目录之后的步骤相同：校验输出文件，再分段合并音频、写字幕"""
+        export_path = self.workdir / 'export' / name
+        export_path.mkdir(parents=True, exist_ok=True)
+        exporter = ProjectExporter(self.service.workers)
+
+        started = time.perf_counter()
+        verify_seconds, invalid = _timed(verify_outputs, tasks)
+        export_seconds, result = _timed(exporter.export, name, tasks, export_path, ['srt', 'json'],
+                                        normalize=(-16.0, -1.0))
+        seconds = time.perf_counter() - started
+        logger.debug(f"verify {verify_seconds:.2f}s ({len(invalid)} invalid), "
+                     f"export {export_seconds:.2f}s ({len(result['parts'])} parts)")
+        return StageResult('export', len(tasks), seconds, [seconds],
+                           _tree_size(export_path), errors=len(invalid), peak_rss_mb=peak_rss_mb())
+
+    def bench_save(self, name: str, tasks: list[dict]) -> StageResult:
+        project_data = self.project_manager.load_project(name)['data']
+        project_data['tasks'] = tasks
+        project_file = self.project_manager.base_dir / f"{name}.json"
+        latencies, written = [], 0
+        for _ in range(self.save_repeat):
+            elapsed, _ = _timed(self.project_manager.save_project, name, project_data)
+            latencies.append(elapsed)
+            written += _file_size(project_file)
+        # 每次保存都写整个项目，"行数"按保存次数 × 项目行数计
+        return StageResult('save_project', len(tasks) * len(latencies), sum(latencies), latencies, written,
+                           peak_rss_mb=peak_rss_mb())
+
+
+def print_report(lines: int, results: list[StageResult], line_report: dict):
+    print(f"\n== {lines} lines ==")
+    print(f"{'stage':22s} {'lines/s':>10s} {'p50 ms':>9s} {'p95 ms':>9s} {'written':>10s} {'errors':>6s} {'rss MB':>7s}")
+    for r in results:
+        p50, p95 = r.percentile_ms(50), r.percentile_ms(95)
+        print(f"{r.name:22s} {r.lines_per_sec:10.1f} {p50 or 0:9.1f} {p95 or 0:9.1f} "
+              f"{r.bytes_written / 1e6:8.1f}MB {r.errors:6d} {r.peak_rss_mb:7.1f}")
+    if line_report['stages']:
+        print(f"generate breakdown (bottleneck: {line_report['bottleneck']})")
+        for stage, s in line_report['stages'].items():
+            print(f"  {stage:20s} {s['p50'] * 1000:9.1f} {s['p95'] * 1000:9.1f} ms  {s['share']:6.1%}")
+
+
+def find_regressions(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """与基线结果比较，吞吐下降或 p95 上升超过容差的阶段"""
+    regressions = []
+    for size, stages in current['runs'].items():
+        base_stages = {s['name']: s for s in baseline.get('runs', {}).get(size, [])}
+        for stage in stages:
+            base = base_stages.get(stage['name'])
+            if not base:
+                continue
+            if base['linesPerSec'] and stage['linesPerSec'] < base['linesPerSec'] * (1 - tolerance):
+                regressions.append(f"{size} lines / {stage['name']}: "
+                                   f"{stage['linesPerSec']} lines/s (baseline {base['linesPerSec']})")
+            if base['p95Ms'] and stage['p95Ms'] and stage['p95Ms'] > base['p95Ms'] * (1 + tolerance):
+                regressions.append(f"{size} lines / {stage['name']}: "
+                                   f"p95 {stage['p95Ms']:.1f}ms (baseline {base['p95Ms']:.1f}ms)")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the generation and export pipeline against a stub TTS server")
+    parser.add_argument('--lines', type=int, nargs='+', default=[100], help="project sizes, e.g. 100 2000 20000")
+    parser.add_argument('--latency', type=float, default=0.05, help="mean server latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.5, help="latency jitter as a fraction of the mean")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seconds-per-char', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--speed', type=float, default=1.2)
+    parser.add_argument('--quality', default='balanced')
+    parser.add_argument('--workers', type=int, default=0, help="post-processing processes, 0 = CPU count")
+    parser.add_argument('--sample-ops', type=int, default=50, help="lines used for trim/speed, 0 = all")
+    parser.add_argument('--save-repeat', type=int, default=20)
+    parser.add_argument('--workdir', help="keep outputs here instead of a temporary directory")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare against a previous --json result")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--verbose', action='store_true', help="show pipeline logs (injected errors are logged too)")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level='DEBUG' if args.verbose else 'CRITICAL')
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='hetang_bench_'))
+    server = StubTTSServer(args.latency, args.jitter, args.error_rate, args.seconds_per_char).start()
+    bench = PipelineBenchmark(workdir, server, args.concurrency, args.speed, args.quality, args.workers,
+                              args.save_repeat, args.sample_ops)
+    report = {'config': {k: v for k, v in vars(args).items() if k not in ('json', 'baseline')}, 'runs': {}}
+    try:
+        for lines in args.lines:
+            results, line_report = bench.run(lines)
+            print_report(lines, results, line_report)
+            report['runs'][str(lines)] = [r.to_dict() for r in results]
+            report.setdefault('lineStages', {})[str(lines)] = line_report['stages']
+    finally:
+        bench.close()
+        server.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report['peakRssMb'] = round(peak_rss_mb(), 1)
+    report['peakWorkerRssMb'] = round(peak_rss_mb(children=True), 1)
+    print(f"\npeak RSS: main {report['peakRssMb']} MB, workers {report['peakWorkerRssMb']} MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import json
+import threading
+from typing import Callable, Hashable, Optional
+from loguru import logger
+
+
+class EventBus:
+    """合并推送的前端事件通道
+
+    事件先进入缓冲区，由后台线程按固定间隔（默认100ms）一次性以数组形式推送给前端，
+    避免每条进度事件都调用一次 evaluate_js 阻塞 GUI 线程。
+    带 key 的事件会覆盖缓冲区中尚未推送的同 key 旧事件。key 由调用方决定，Api._notify_frontend 使用
+    (事件名, 'file'/'line', 文件/行号)，所以只有同一事件名下的事件会互相取代：例如 progress 事件中
+    同一文件的 type=processing 会被随后的 type=completed 取代，而不同事件名（如 progress 与 library）互不影响。
+    """
+
+    def __init__(self, sink: Callable[[str], None], interval: float = 0.1, max_pending: int = 5000):
+        self.sink = sink
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: list[Optional[dict]] = []
+        self._keys: dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动推送线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止推送线程并推送剩余事件"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.flush()
+
+    def emit(self, event: str, data: dict, key: Optional[Hashable] = None):
+        """加入一条事件，key 相同的未推送事件会被取代"""
+        item = {'event': event, 'data': data}
+        with self._lock:
+            if key is not None:
+                old_index = self._keys.get(key)
+                if old_index is not None:
+                    self._pending[old_index] = None
+                self._keys[key] = len(self._pending)
+            self._pending.append(item)
+            overflow = len(self._pending) >= self.max_pending
+        if overflow:
+            self._wakeup.set()
+
+    def flush(self):
+        """立即推送缓冲区中的全部事件"""
+        with self._lock:
+            batch = [item for item in self._pending if item is not None]
+            self._pending = []
+            self._keys = {}
+        if not batch:
+            return
+        try:
+            self.sink(json.dumps(batch, ensure_ascii=False))
+        except Exception as e:
+            logger.error(f"Failed to push {len(batch)} events to frontend: {e}")
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
@@ -1,13 +1,28 @@
+import atexit
+import hashlib
 import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional
 from loguru import logger
 
+# 早期版本写进默认配置、已作废的分析服务密钥（只保存哈希），加载时从用户配置中清除
+REVOKED_API_KEY_HASHES = {
+    'f45eb2e8521c88ec0a5fff83a06624a5ef495e47d326b6180f0582e1559381f6',
+}
+
 
 class GlobalConfig:
-    """全局配置管理"""
+    """全局配置管理
+
+    修改只在内存中生效并标记为脏，由后台定时器延迟（默认1秒）合并写盘；
+    在 batch() 中的修改会在批次结束时统一写一次。写盘采用临时文件 + 原子替换，
+    进程退出时会自动 flush 未写入的修改。
+    """
 
-    def __init__(self, config_dir: Optional[Path] = None):
+    def __init__(self, config_dir: Optional[Path] = None, flush_delay: float = 1.0):
         if config_dir is None:
             self.config_dir = Path.home() / ".config" / "hetang_dubbing"
         else:
@@ -15,14 +30,33 @@ class GlobalConfig:
 
         self.config_dir.mkdir(parents=True, exist_ok=True)
         self.config_file = self.config_dir / "config.json"
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        # 串行化写盘：取快照到原子替换完成期间持有，保证较新的快照最后落盘（先于 _lock 获取）
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._batch_depth = 0
+        self._flush_timer: Optional[threading.Timer] = None
         self.config = self._load_config()
+        self._favorite_set: set[str] = set(self.config['favorites'])
+        atexit.register(self.flush)
+        if self._dirty:
+            self.flush()
 
     def _load_config(self) -> dict:
         """加载配置"""
         if self.config_file.exists():
             try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    config = {**self._default_config(), **json.load(f)}
+                analyzer = config.get('analyzer')
+                if isinstance(analyzer, dict) and analyzer.get('api_key'):
+                    digest = hashlib.sha256(analyzer['api_key'].encode('utf-8')).hexdigest()
+                    if digest in REVOKED_API_KEY_HASHES:
+                        logger.warning("Removed a revoked analyzer API key from config")
+                        analyzer['api_key'] = ''
+                        self._dirty = True
+                return config
             except Exception as e:
                 logger.error(f"Failed to load config: {e}")
                 return self._default_config()
@@ -34,58 +68,133 @@ class GlobalConfig:
             'favorites': [],  # 收藏的参考音
             'recent_used': [],  # 最近使用的参考音
             'audio_notes': {},  # 参考音备注 {path: note}
-            'audio_tags': {}  # 参考音标签 {path: [tags]}
+            'audio_tags': {},  # 参考音标签 {path: [tags]}
+            'analyzer': {  # 声音分析服务
+                'base_url': 'https://api.shaohua.fun',
+                'api_key': '',  # 也可以用环境变量 HETANG_ANALYZER_API_KEY 提供
+                'num_workers': 5,
+                'requests_per_second': 0,  # 0 表示不限速
+                'upload_bytes_per_second': 0,
+                'max_retries': 5,
+                'preprocess': False,  # 上传前裁剪静音并转为单声道 16kHz
+                'preprocess_format': 'flac',
+                'preprocess_max_seconds': 20,
+                'output_formats': ['csv']  # 可追加 'jsonl' / 'sqlite'
+            },
+            'export': {  # 项目导出
+                'subtitle_formats': ['srt'],  # 可追加 'vtt' / 'lrc' / 'json'
+                'split_mode': 'none',  # 分段：none 导出为单个文件 / chapters（按章节标记行）/ duration
+                'max_part_minutes': 0,  # 每段最长分钟数，0 为不限（单个 WAV 仍不超过 4GB）
+                'chapter_pattern': '',  # 章节标记行正则，留空使用默认规则
+                'verify_checksums': True  # 导出前比对配音文件哈希（关闭时只检查文件头和采样数）
+            },
+            'tts': {  # 配音后处理
+                'time_stretch_quality': 'balanced',  # 变速质量：fast / balanced / high
+                'postprocess_workers': 0,  # 后处理进程数，0 为 CPU 核数
+                'loudness_normalize': True,  # 导出时把每条配音调整到相同响度
+                'loudness_target': -16.0,  # 目标综合响度（LUFS）
+                'loudness_max_peak': -1.0  # 归一化后的峰值上限（dBFS）
+            },
+            'metrics': {  # 性能指标
+                'prometheus_port': 0  # 设为端口号（如 9464）时开启本机 Prometheus 端点 http://127.0.0.1:<端口>/metrics，0 为关闭
+            }
         }
 
-    def _save_config(self):
-        """保存配置"""
+    def _mark_dirty(self):
+        """标记配置已修改，批次外安排延迟写盘"""
+        with self._lock:
+            self._dirty = True
+            if self._batch_depth == 0 and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    @contextmanager
+    def batch(self):
+        """批量修改，批次结束时只写一次盘（可嵌套）"""
+        with self._lock:
+            self._batch_depth += 1
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Failed to save config: {e}")
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+            if done:
+                self.flush()
+
+    def flush(self):
+        """立即写盘（无修改时跳过）"""
+        with self._write_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return
+                data = json.dumps(self.config, ensure_ascii=False, indent=2)
+                self._dirty = False
+
+            tmp_file = self.config_file.with_suffix('.json.tmp')
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_file, self.config_file)
+            except Exception as e:
+                logger.error(f"Failed to save config: {e}")
+                # 写盘失败时保留修改，下次再写
+                self._mark_dirty()
 
     def add_favorite(self, audio_path: str) -> bool:
         """添加收藏"""
-        if audio_path not in self.config['favorites']:
+        with self._lock:
+            if audio_path in self._favorite_set:
+                return False
+            self._favorite_set.add(audio_path)
             self.config['favorites'].append(audio_path)
-            self._save_config()
+            self._mark_dirty()
             return True
-        return False
 
     def remove_favorite(self, audio_path: str) -> bool:
         """移除收藏"""
-        if audio_path in self.config['favorites']:
+        with self._lock:
+            if audio_path not in self._favorite_set:
+                return False
+            self._favorite_set.discard(audio_path)
             self.config['favorites'].remove(audio_path)
-            self._save_config()
+            self._mark_dirty()
             return True
-        return False
 
     def is_favorite(self, audio_path: str) -> bool:
         """是否收藏"""
-        return audio_path in self.config['favorites']
+        return audio_path in self._favorite_set
 
     def add_recent_used(self, audio_path: str):
         """添加最近使用"""
-        if audio_path in self.config['recent_used']:
-            self.config['recent_used'].remove(audio_path)
-        self.config['recent_used'].insert(0, audio_path)
-        # 只保留最近20个
-        self.config['recent_used'] = self.config['recent_used'][:20]
-        self._save_config()
+        with self._lock:
+            recent = [p for p in self.config['recent_used'] if p != audio_path]
+            recent.insert(0, audio_path)
+            # 只保留最近20个
+            self.config['recent_used'] = recent[:20]
+            self._mark_dirty()
 
     def get_recent_used(self) -> list[str]:
         """获取最近使用"""
-        return self.config['recent_used']
+        with self._lock:
+            return list(self.config['recent_used'])
 
     def get_favorites(self) -> list[str]:
         """获取收藏列表"""
-        return self.config['favorites']
+        with self._lock:
+            return list(self.config['favorites'])
 
     def set_note(self, audio_path: str, note: str):
         """设置备注"""
-        self.config['audio_notes'][audio_path] = note
-        self._save_config()
+        with self._lock:
+            if self.config['audio_notes'].get(audio_path) == note:
+                return
+            self.config['audio_notes'][audio_path] = note
+            self._mark_dirty()
 
     def get_note(self, audio_path: str) -> str:
         """获取备注"""
@@ -93,13 +202,44 @@ class GlobalConfig:
 
     def set_tags(self, audio_path: str, tags: list[str]):
         """设置标签"""
-        self.config['audio_tags'][audio_path] = tags
-        self._save_config()
+        with self._lock:
+            if self.config['audio_tags'].get(audio_path) == tags:
+                return
+            self.config['audio_tags'][audio_path] = list(tags)
+            self._mark_dirty()
 
     def get_tags(self, audio_path: str) -> list[str]:
         """获取标签"""
         return self.config['audio_tags'].get(audio_path, [])
 
+    def remove_tags(self, audio_path: str) -> bool:
+        """删除标签"""
+        with self._lock:
+            if audio_path not in self.config['audio_tags']:
+                return False
+            del self.config['audio_tags'][audio_path]
+            self._mark_dirty()
+            return True
+
+    def move_audio(self, old_path: str, new_path: str):
+        """参考音改名或移动后，把标签、备注、收藏和最近使用迁移到新路径"""
+        with self._lock:
+            changed = False
+            for key in ('audio_tags', 'audio_notes'):
+                if old_path in self.config[key]:
+                    self.config[key][new_path] = self.config[key].pop(old_path)
+                    changed = True
+            for key in ('favorites', 'recent_used'):
+                items = self.config[key]
+                if old_path in items:
+                    items[items.index(old_path)] = new_path
+                    changed = True
+            if old_path in self._favorite_set:
+                self._favorite_set.discard(old_path)
+                self._favorite_set.add(new_path)
+            if changed:
+                self._mark_dirty()
+
     def extract_tags_from_filename(self, filename: str) -> list[str]:
         """从文件名提取标签"""
         tags = []
@@ -0,0 +1,251 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Optional
+from loguru import logger
+
+from backend.global_config import GlobalConfig
+from backend.scan_index import ScanIndex
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class _Inotify:
+    """基于 ctypes 的最小 inotify 封装（仅 Linux）"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wd_to_path: dict[int, str] = {}
+        self._path_to_wd: dict[str, int] = {}
+
+    def add_watch(self, path: str):
+        if path in self._path_to_wd:
+            return
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            logger.debug(f"inotify_add_watch failed for {path}: errno {ctypes.get_errno()}")
+            return
+        self._wd_to_path[wd] = path
+        self._path_to_wd[path] = wd
+
+    def sync_watches(self, dirs: list[str]):
+        """使监听集合与当前目录列表一致"""
+        wanted = set(dirs)
+        for path in list(self._path_to_wd):
+            if path not in wanted:
+                wd = self._path_to_wd.pop(path)
+                self._wd_to_path.pop(wd, None)
+                self._libc.inotify_rm_watch(self.fd, wd)
+        for path in dirs:
+            self.add_watch(path)
+
+    def read_changed_dirs(self, timeout: float) -> Optional[set[str]]:
+        """等待事件，返回发生变化的目录集合；超时返回空集合，队列溢出返回 None"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: set[str] = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size + name_len
+            if mask & IN_Q_OVERFLOW:
+                return None
+            path = self._wd_to_path.get(wd)
+            if path is None:
+                continue
+            if mask & IN_IGNORED:
+                self._wd_to_path.pop(wd, None)
+                self._path_to_wd.pop(path, None)
+            changed.add(path)
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                changed.add(os.path.dirname(path))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """参考音目录监听器
+
+    Linux 上使用 inotify 获知哪些目录发生了变化，其他平台（或 inotify 不可用时）退化为定时轮询。
+    两种方式都通过 ScanIndex 做增量重扫：inotify 模式只让变化的目录缓存失效，
+    轮询模式依赖目录 mtime，因此每次重扫只会重新读取变化的目录。
+    重扫结果与上一次快照比较，得到新增、删除、改名的文件；改名时把 GlobalConfig 中的标签等迁移到新路径，
+    再通过 on_delta 回调交给调用方推送给前端。
+    删除的文件不清理标签：根目录暂时不可读（NAS 断开、移动硬盘拔出）或文件超过大小限制时也会表现为删除，
+    用户整理的标签不能因此丢失。根目录无法读取时跳过本次重扫。
+    on_delta 参数：{'added': [(路径, 大小)], 'removed': [路径], 'renamed': [(旧路径, 新路径, 大小)]}
+    """
+
+    def __init__(self, directory: str, scan_index: ScanIndex, global_config: GlobalConfig,
+                 on_delta: Callable[[dict], None], max_depth: int = 3, max_size_kb: int = 1024,
+                 poll_interval: float = 2.0, debounce: float = 0.3):
+        self.directory = directory
+        self.scan_index = scan_index
+        self.global_config = global_config
+        self.on_delta = on_delta
+        self.max_depth = max_depth
+        self.max_size_bytes = max_size_kb * 1024
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode = 'polling'
+        self._snapshot: dict[str, int] = {}
+        self._identities: dict[str, tuple[int, int]] = {}  # 路径 -> (mtime_ns, inode)，用于识别改名
+        self._dirs: list[str] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+
+    def start(self):
+        """启动监听线程"""
+        self._snapshot, self._dirs, self._identities = self._scan()
+        if sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify()
+                self._inotify.sync_watches(self._dirs)
+                self.mode = 'inotify'
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify unavailable, falling back to polling: {e}")
+                self._inotify = None
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching reference directory ({self.mode}): {self.directory}")
+
+    def stop(self):
+        """停止监听"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        logger.info(f"Stopped watching reference directory: {self.directory}")
+
+    def _scan(self) -> tuple[dict[str, int], list[str], dict[str, tuple[int, int]]]:
+        dirs: list[str] = []
+        identities: dict[str, tuple[int, int]] = {}
+        files = {
+            path: size
+            for path, size in self.scan_index.scan(self.directory, self.max_depth, dirs, identities)
+            if size <= self.max_size_bytes
+        }
+        return files, dirs, identities
+
+    def _same_file(self, old_path: str, new_path: str, new_identities: dict[str, tuple[int, int]]) -> bool:
+        """改名前后是否为同一个文件：修改时间相同，且 inode 可用时也相同（删除后新建的文件可能复用 inode）"""
+        old = self._identities.get(old_path)
+        new = new_identities.get(new_path)
+        if not old or not new:
+            return False
+        old_mtime, old_inode = old
+        new_mtime, new_inode = new
+        if old_mtime != new_mtime:
+            return False
+        return not (old_inode and new_inode) or old_inode == new_inode
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self._inotify:
+                    changed = self._inotify.read_changed_dirs(self.poll_interval)
+                    if changed == set():
+                        continue
+                    # 合并短时间内的连续事件
+                    self._stop_event.wait(self.debounce)
+                    more = self._inotify.read_changed_dirs(0)
+                    if changed is None or more is None:
+                        for path in self._dirs:
+                            self.scan_index.invalidate(path)
+                    else:
+                        for path in changed | more:
+                            self.scan_index.invalidate(path)
+                elif self._stop_event.wait(self.poll_interval):
+                    break
+                self._refresh()
+            except Exception as e:
+                logger.exception(f"Reference directory watcher error: {e}")
+                self._stop_event.wait(self.poll_interval)
+
+    def _refresh(self):
+        """增量重扫并推送差异"""
+        snapshot, dirs, identities = self._scan()
+        if self.directory not in dirs:
+            # 根目录不可读（卸载、拔出、改名），保留上次的快照，等恢复后再比较
+            logger.warning(f"Reference directory unavailable, skipping refresh: {self.directory}")
+            return
+        if self._inotify:
+            self._inotify.sync_watches(dirs)
+        self._dirs = dirs
+
+        old = self._snapshot
+        added = {p: s for p, s in snapshot.items() if old.get(p) != s}
+        removed = {p: s for p, s in old.items() if p not in snapshot}
+        self._snapshot = snapshot
+        if not added and not removed:
+            self._identities = identities
+            return
+
+        # 大小相同且唯一对应、inode 或修改时间也相同的删除/新增视为改名
+        removed_by_size: dict[int, list[str]] = {}
+        for path, size in removed.items():
+            removed_by_size.setdefault(size, []).append(path)
+        added_by_size: dict[int, list[str]] = {}
+        for path, size in added.items():
+            if path not in old:
+                added_by_size.setdefault(size, []).append(path)
+
+        renamed: list[tuple[str, str]] = []
+        for size, old_paths in removed_by_size.items():
+            new_paths = added_by_size.get(size, [])
+            if (len(old_paths) == 1 and len(new_paths) == 1
+                    and self._same_file(old_paths[0], new_paths[0], identities)):
+                renamed.append((old_paths[0], new_paths[0]))
+                del removed[old_paths[0]]
+                del added[new_paths[0]]
+
+        self._identities = identities
+
+        with self.global_config.batch():
+            for old_path, new_path in renamed:
+                self.global_config.move_audio(old_path, new_path)
+
+        self.on_delta({
+            'added': list(added.items()),
+            'removed': list(removed),
+            'renamed': [(o, n, snapshot[n]) for o, n in renamed]
+        })
+        logger.info(f"Reference library changed: +{len(added)} -{len(removed)} ~{len(renamed)}")
@@ -0,0 +1,126 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+# 算法调整后递增，旧的测量值会被重新计算
+LOUDNESS_VERSION = 1
+
+BLOCK_SECONDS = 0.4
+STEP_SECONDS = 0.1
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+
+def _biquad_response(b: tuple, a: tuple, w: np.ndarray) -> np.ndarray:
+    """二阶滤波器在角频率 w 处的幅度响应"""
+    z1 = np.exp(-1j * w)
+    z2 = z1 * z1
+    return np.abs((b[0] + b[1] * z1 + b[2] * z2) / (a[0] + a[1] * z1 + a[2] * z2))
+
+
+def k_weighting(freqs: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    BS.1770 K 计权的幅度响应（高架滤波与高通滤波两级串联）
+
+    按采样率重新推导系数（与 libebur128 相同的做法），48kHz 时与标准给出的系数一致。
+    只关心能量，所以在频域按幅度响应相乘，不需要逐样本运行 IIR。
+    """
+    w = 2 * np.pi * freqs / sample_rate
+
+    # 高架滤波
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = _biquad_response(
+        ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        w
+    )
+
+    # 高通滤波
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = _biquad_response(
+        (1.0, -2.0, 1.0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        w
+    )
+    return shelf * highpass
+
+
+def measure_loudness(samples: np.ndarray, sample_rate: int) -> dict:
+    """
+    测量 EBU R128 / BS.1770 综合响度和采样峰值
+
+    参数:
+        samples: float32 数组 (采样数, 声道数)，取值 -1~1
+        sample_rate: 采样率
+
+    返回:
+        dict: {'version', 'lufs': 综合响度（LUFS，全静音时为 None）, 'peakDb': 采样峰值（dBFS）}
+    """
+    peak = float(np.abs(samples).max()) if samples.size else 0.0
+    peak_db = round(float(20 * np.log10(peak)), 2) if peak > 0 else None
+    if peak == 0:
+        return {'version': LOUDNESS_VERSION, 'lufs': None, 'peakDb': peak_db}
+
+    # 频域 K 计权（补零到 2 的幂，FFT 更快）
+    n = len(samples)
+    n_fft = 1 << (n - 1).bit_length()
+    spectrum = np.fft.rfft(samples, n=n_fft, axis=0)
+    spectrum *= k_weighting(np.fft.rfftfreq(n_fft, 1 / sample_rate), sample_rate)[:, None]
+    weighted = np.fft.irfft(spectrum, n=n_fft, axis=0)[:n]
+
+    # 400ms 块、75% 重叠的均方能量（各声道相加，单声道/立体声的声道权重都是 1）
+    energy = np.concatenate(([0.0], np.cumsum((weighted * weighted).sum(axis=1))))
+    block = int(BLOCK_SECONDS * sample_rate)
+    step = int(STEP_SECONDS * sample_rate)
+    if n < block:
+        block_energy = np.array([energy[-1] / n])
+    else:
+        starts = np.arange(0, n - block + 1, step)
+        block_energy = (energy[starts + block] - energy[starts]) / block
+
+    with np.errstate(divide='ignore'):
+        block_lufs = -0.691 + 10 * np.log10(block_energy)
+    gated = block_energy[block_lufs > ABSOLUTE_GATE_LUFS]
+    if not len(gated):
+        return {'version': LOUDNESS_VERSION, 'lufs': None, 'peakDb': peak_db}
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+    gated = block_energy[(block_lufs > ABSOLUTE_GATE_LUFS) & (block_lufs > relative_gate)]
+    lufs = -0.691 + 10 * np.log10(gated.mean())
+    return {'version': LOUDNESS_VERSION, 'lufs': round(float(lufs), 2), 'peakDb': peak_db}
+
+
+def measure_file(file_path: str, samples: np.ndarray, sample_rate: int) -> dict:
+    """测量响度，并记录文件大小和修改时间，用于判断缓存的测量值是否仍然有效"""
+    measurement = measure_loudness(samples, sample_rate)
+    stat = os.stat(file_path)
+    measurement['size'] = stat.st_size
+    measurement['mtime'] = stat.st_mtime
+    return measurement
+
+
+def is_current(measurement: Optional[dict], file_path: str) -> bool:
+    """缓存的测量值是否对应当前文件内容"""
+    if not measurement or measurement.get('version') != LOUDNESS_VERSION:
+        return False
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False
+    return measurement.get('size') == stat.st_size and measurement.get('mtime') == stat.st_mtime
+
+
+def normalization_gain_db(measurement: dict, target_lufs: float, max_peak_db: float) -> float:
+    """把一条音频调整到目标响度所需的增益（dB），同时保证峰值不超过 max_peak_db"""
+    if measurement.get('lufs') is None:
+        return 0.0
+    gain = target_lufs - measurement['lufs']
+    if measurement.get('peakDb') is not None:
+        gain = min(gain, max_peak_db - measurement['peakDb'])
+    return round(gain, 2)
@@ -0,0 +1,416 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+from loguru import logger
+
+from backend.audio_service import load_csv_results
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    root TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime INTEGER NOT NULL DEFAULT 0,
+    user_tags TEXT NOT NULL DEFAULT '[]',
+    note TEXT NOT NULL DEFAULT '',
+    favorite INTEGER NOT NULL DEFAULT 0,
+    ai_name TEXT NOT NULL DEFAULT '',
+    age TEXT NOT NULL DEFAULT '',
+    gender TEXT NOT NULL DEFAULT '',
+    type TEXT NOT NULL DEFAULT '',
+    ai_tags TEXT NOT NULL DEFAULT '[]',
+    description TEXT NOT NULL DEFAULT '',
+    est_gender TEXT NOT NULL DEFAULT '',
+    est_age TEXT NOT NULL DEFAULT '',
+    est_tags TEXT NOT NULL DEFAULT '[]',
+    search_text TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_clips_root ON clips(root);
+CREATE INDEX IF NOT EXISTS idx_clips_gender ON clips(gender);
+CREATE INDEX IF NOT EXISTS idx_clips_age ON clips(age);
+CREATE INDEX IF NOT EXISTS idx_clips_type ON clips(type);
+CREATE INDEX IF NOT EXISTS idx_clips_rank ON clips(favorite DESC, name);
+CREATE TABLE IF NOT EXISTS clip_tags (
+    clip_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (clip_id, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_clip_tags_tag ON clip_tags(tag, clip_id);
+CREATE TEMP TABLE IF NOT EXISTS search_matched (id INTEGER PRIMARY KEY, score REAL);
+"""
+
+# 多于此长度的关键词走 FTS（trigram 分词最少需要 3 个字符），更短的走 LIKE
+FTS_MIN_TOKEN = 3
+
+FACET_FIELDS = ('gender', 'age', 'type')
+
+# 旧版数据库缺少的列，打开时补齐
+ADDED_COLUMNS = {
+    'mtime': "INTEGER NOT NULL DEFAULT 0",
+    'est_gender': "TEXT NOT NULL DEFAULT ''",
+    'est_age': "TEXT NOT NULL DEFAULT ''",
+    'est_tags': "TEXT NOT NULL DEFAULT '[]'"
+}
+
+# 扫描写入的列，全部未变化时跳过该行
+CLIP_FIELDS = ('root', 'name', 'size', 'mtime', 'user_tags', 'note', 'favorite')
+
+
+class MetadataIndex:
+    """参考音元数据索引（SQLite + FTS5）
+
+    把 GlobalConfig 中的标签/备注/收藏、文件名提取的标签以及 AudioAnalyzer 的分析结果
+    合并到同一张表，提供带排序和分面统计的搜索。
+    本地声学特征的预估值单独存放在 est_* 列，不参与分面筛选，也不会覆盖分析结果。
+    """
+
+    def __init__(self, config_dir: Optional[Path] = None):
+        if config_dir is None:
+            config_dir = Path.home() / ".config" / "hetang_dubbing"
+        self.config_dir = Path(config_dir)
+        self.config_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = self.config_dir / "metadata_index.db"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self.has_fts = self._init_fts()
+
+    def _migrate(self):
+        """为旧版数据库补齐新增的列"""
+        existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(clips)")}
+        with self._conn:
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE clips ADD COLUMN {column} {definition}")
+
+    def _init_fts(self) -> bool:
+        """创建全文索引表，SQLite 不支持 trigram 时退化为 LIKE 搜索"""
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS clips_fts USING fts5(search_text, tokenize='trigram')"
+            )
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 trigram unavailable, falling back to LIKE search: {e}")
+            return False
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
+
+    def _upsert_row(self, path: str, fields: dict):
+        """插入或更新一行并重建其标签与全文索引（调用方持有锁）"""
+        row = self._conn.execute("SELECT * FROM clips WHERE path = ?", (path,)).fetchone()
+        record = dict(row) if row else {
+            'path': path, 'root': os.path.dirname(path), 'name': os.path.basename(path), 'size': 0,
+            'mtime': 0, 'user_tags': '[]', 'note': '', 'favorite': 0, 'ai_name': '', 'age': '', 'gender': '',
+            'type': '', 'ai_tags': '[]', 'description': '', 'est_gender': '', 'est_age': '', 'est_tags': '[]'
+        }
+        record.update(fields)
+
+        user_tags = json.loads(record['user_tags'])
+        ai_tags = json.loads(record['ai_tags'])
+        tags = list(dict.fromkeys(user_tags + ai_tags))
+        record['search_text'] = ' '.join([
+            record['name'], ' '.join(tags), record['note'], record['ai_name'],
+            record['age'], record['gender'], record['type'], record['description'],
+            record['est_gender'], record['est_age'], ' '.join(json.loads(record['est_tags']))
+        ])
+
+        columns = [c for c in record if c != 'id']
+        if row:
+            self._conn.execute(
+                f"UPDATE clips SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                [record[c] for c in columns] + [row['id']]
+            )
+            clip_id = row['id']
+        else:
+            cursor = self._conn.execute(
+                f"INSERT INTO clips ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [record[c] for c in columns]
+            )
+            clip_id = cursor.lastrowid
+
+        self._conn.execute("DELETE FROM clip_tags WHERE clip_id = ?", (clip_id,))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO clip_tags (clip_id, tag) VALUES (?, ?)",
+            [(clip_id, tag) for tag in tags]
+        )
+        if self.has_fts:
+            self._conn.execute("DELETE FROM clips_fts WHERE rowid = ?", (clip_id,))
+            self._conn.execute(
+                "INSERT INTO clips_fts (rowid, search_text) VALUES (?, ?)", (clip_id, record['search_text'])
+            )
+
+    def upsert_clips(self, root: str, files: list[dict], prune: bool = True):
+        """写入扫描得到的参考音条目（含 tags/note/isFavorite）
+
+        大小、mtime 和用户元数据都未变化的条目直接跳过；prune 为 True 时 files 视为该目录的完整扫描结果，
+        删除该目录下已不在 files 中的条目（分页写入时传 False，扫描结束后再调用 prune_clips）。
+        """
+        with self._lock, self._conn:
+            existing = {
+                row['path']: row for row in self._conn.execute(
+                    f"SELECT path, {', '.join(CLIP_FIELDS)} FROM clips WHERE path IN "
+                    f"(SELECT value FROM json_each(?))",
+                    (json.dumps([f['fullPath'] for f in files]),)
+                )
+            }
+            for f in files:
+                mtime = f.get('mtime')
+                if mtime is None:
+                    try:
+                        mtime = os.stat(f['fullPath']).st_mtime_ns
+                    except OSError:
+                        mtime = 0
+                fields = {
+                    'root': root,
+                    'name': f['name'],
+                    'size': f.get('size', 0),
+                    'mtime': mtime,
+                    'user_tags': json.dumps(f.get('tags', []), ensure_ascii=False),
+                    'note': f.get('note', ''),
+                    'favorite': int(bool(f.get('isFavorite')))
+                }
+                row = existing.get(f['fullPath'])
+                if row and all(row[c] == fields[c] for c in CLIP_FIELDS):
+                    continue
+                self._upsert_row(f['fullPath'], fields)
+            if prune:
+                self._prune(root, {f['fullPath'] for f in files})
+
+    def prune_clips(self, root: str, keep_paths: set[str]):
+        """删除 root 目录下不在 keep_paths 中的条目"""
+        with self._lock, self._conn:
+            self._prune(root, keep_paths)
+
+    def _prune(self, root: str, keep_paths: set[str]):
+        """删除 root 目录下不在 keep_paths 中的条目（调用方持有锁）"""
+        stale = [
+            row['id'] for row in self._conn.execute("SELECT id, path FROM clips WHERE root = ?", (root,))
+            if row['path'] not in keep_paths
+        ]
+        for clip_id in stale:
+            self._delete_row(clip_id)
+        if stale:
+            logger.info(f"Pruned {len(stale)} missing clips under {root}")
+
+    def _delete_row(self, clip_id: int):
+        """删除一行及其标签与全文索引（调用方持有锁）"""
+        self._conn.execute("DELETE FROM clips WHERE id = ?", (clip_id,))
+        self._conn.execute("DELETE FROM clip_tags WHERE clip_id = ?", (clip_id,))
+        if self.has_fts:
+            self._conn.execute("DELETE FROM clips_fts WHERE rowid = ?", (clip_id,))
+
+    def update_clip(self, path: str, tags: Optional[list[str]] = None, note: Optional[str] = None,
+                    favorite: Optional[bool] = None):
+        """更新已收录条目的用户元数据（未收录的路径忽略）"""
+        fields: dict = {}
+        if tags is not None:
+            fields['user_tags'] = json.dumps(tags, ensure_ascii=False)
+        if note is not None:
+            fields['note'] = note
+        if favorite is not None:
+            fields['favorite'] = int(favorite)
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM clips WHERE path = ?", (path,)).fetchone():
+                self._upsert_row(path, fields)
+
+    def remove_clips(self, paths: list[str]):
+        """删除条目"""
+        with self._lock, self._conn:
+            for path in paths:
+                row = self._conn.execute("SELECT id FROM clips WHERE path = ?", (path,)).fetchone()
+                if row:
+                    self._delete_row(row['id'])
+
+    def upsert_analysis(self, full_path: str, result: dict, root: str = ""):
+        """写入 AudioAnalyzer 的分析结果"""
+        self.upsert_analyses([(full_path, result)], root)
+
+    def upsert_analyses(self, items: list[tuple[str, dict]], root: str = ""):
+        """批量写入分析结果 [(完整路径, 结果)]"""
+        with self._lock, self._conn:
+            for full_path, result in items:
+                fields = {
+                    'ai_name': result.get('name', ''),
+                    'age': result.get('age', ''),
+                    'gender': result.get('gender', ''),
+                    'type': result.get('type', ''),
+                    'ai_tags': json.dumps(result.get('tags', []), ensure_ascii=False),
+                    'description': result.get('description', '')
+                }
+                exists = self._conn.execute("SELECT 1 FROM clips WHERE path = ?", (full_path,)).fetchone()
+                if not exists:
+                    fields['root'] = root or os.path.dirname(full_path)
+                    try:
+                        fields['size'] = os.path.getsize(full_path)
+                    except OSError:
+                        pass
+                self._upsert_row(full_path, fields)
+
+    def prefill_estimates(self, items: list[tuple[str, dict]], root: str = ""):
+        """批量写入本地声学特征的预估值 [(完整路径, estimate_attributes 结果)]
+
+        预估值写入单独的 est_* 列，不会覆盖或冒充远程分析结果。
+        """
+        with self._lock, self._conn:
+            for full_path, estimate in items:
+                fields = {
+                    'est_gender': estimate['gender'],
+                    'est_age': estimate['age'],
+                    'est_tags': json.dumps(estimate['tags'], ensure_ascii=False)
+                }
+                exists = self._conn.execute("SELECT 1 FROM clips WHERE path = ?", (full_path,)).fetchone()
+                if not exists:
+                    fields['root'] = root or os.path.dirname(full_path)
+                    try:
+                        fields['size'] = os.path.getsize(full_path)
+                    except OSError:
+                        pass
+                self._upsert_row(full_path, fields)
+
+    def import_analysis_csv(self, csv_path: str, base_dir: str) -> int:
+        """导入分析结果 CSV（相对路径相对于 base_dir），返回导入条数"""
+        items = [(os.path.join(base_dir, r['path']), r) for r in load_csv_results(csv_path)]
+        self.upsert_analyses(items, base_dir)
+        logger.info(f"Imported {len(items)} analysis results from {csv_path}")
+        return len(items)
+
+    def _build_query(self, query: str, filters: dict) -> tuple[str, str, list, bool]:
+        """构造 FROM/WHERE 子句，返回 (from, where, params, 是否使用 FTS)"""
+        conditions: list[str] = []
+        params: list = []
+        fts_tokens: list[str] = []
+
+        for token in query.split():
+            if self.has_fts and len(token) >= FTS_MIN_TOKEN:
+                fts_tokens.append('"' + token.replace('"', '""') + '"')
+            else:
+                escaped = token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                conditions.append("c.search_text LIKE ? ESCAPE '\\'")
+                params.append(f"%{escaped}%")
+
+        from_clause = "clips c"
+        if fts_tokens:
+            from_clause = "clips c JOIN clips_fts ON clips_fts.rowid = c.id"
+            conditions.insert(0, "clips_fts MATCH ?")
+            params.insert(0, ' AND '.join(fts_tokens))
+
+        for tag in filters.get('tags') or []:
+            conditions.append("c.id IN (SELECT clip_id FROM clip_tags WHERE tag = ?)")
+            params.append(tag)
+        for field in FACET_FIELDS:
+            if filters.get(field):
+                conditions.append(f"c.{field} = ?")
+                params.append(filters[field])
+        if filters.get('favorite'):
+            conditions.append("c.favorite = 1")
+        if filters.get('root'):
+            conditions.append("c.root = ?")
+            params.append(filters['root'])
+
+        where = ' AND '.join(conditions) if conditions else '1'
+        return from_clause, where, params, bool(fts_tokens)
+
+    def search(self, query: str = "", filters: Optional[dict] = None, limit: int = 50, offset: int = 0,
+               facet_limit: int = 30) -> dict:
+        """搜索参考音
+
+        query 按空白分词，所有词都需命中；filters 支持 tags（全部命中）、gender、age、type、favorite、root。
+        结果按收藏优先、相关度（bm25）、名称排序，并返回命中集合上的分面统计。
+        """
+        filters = filters or {}
+        from_clause, where, params, use_fts = self._build_query(query, filters)
+        score = "bm25(clips_fts)" if use_fts else "0"
+
+        with self._lock:
+            if where == '1':
+                # 无条件时直接在全表上聚合，走索引
+                rows = self._conn.execute(
+                    "SELECT c.*, 0 AS score FROM clips c ORDER BY c.favorite DESC, c.name LIMIT ? OFFSET ?",
+                    (limit, offset)
+                ).fetchall()
+                total = self._conn.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+                tag_source = "clip_tags"
+                field_source = "clips c WHERE"
+            else:
+                # 先把命中集合物化到临时表，结果和各分面都在其上计算
+                self._conn.execute("DELETE FROM temp.search_matched")
+                self._conn.execute(
+                    f"INSERT INTO temp.search_matched (id, score) "
+                    f"SELECT c.id, {score} FROM {from_clause} WHERE {where}",
+                    params
+                )
+                total = self._conn.execute("SELECT COUNT(*) FROM temp.search_matched").fetchone()[0]
+                # 命中集合小时从临时表出发做连接；集合大时让规划器顺着 clips/标签上的索引扫描更快
+                small = total <= 5000
+                join = "CROSS JOIN" if small else "JOIN"
+                rows = self._conn.execute(
+                    f"SELECT c.*, m.score AS score FROM temp.search_matched m {join} clips c ON c.id = m.id "
+                    f"ORDER BY c.favorite DESC, m.score, c.name LIMIT ? OFFSET ?",
+                    (limit, offset)
+                ).fetchall()
+                if small:
+                    tag_source = "temp.search_matched m CROSS JOIN clip_tags ON clip_tags.clip_id = m.id"
+                    field_source = "temp.search_matched m CROSS JOIN clips c ON c.id = m.id WHERE"
+                else:
+                    tag_source = "clip_tags WHERE clip_id IN (SELECT id FROM temp.search_matched)"
+                    field_source = "clips c WHERE c.id IN (SELECT id FROM temp.search_matched) AND"
+
+            facets: dict[str, list[dict]] = {
+                'tags': [
+                    {'value': r[0], 'count': r[1]}
+                    for r in self._conn.execute(
+                        f"SELECT tag, COUNT(*) FROM {tag_source} GROUP BY tag ORDER BY 2 DESC LIMIT ?",
+                        (facet_limit,)
+                    )
+                ]
+            }
+            for field in FACET_FIELDS:
+                facets[field] = [
+                    {'value': r[0], 'count': r[1]}
+                    for r in self._conn.execute(
+                        f"SELECT c.{field}, COUNT(*) FROM {field_source} c.{field} != '' "
+                        f"GROUP BY c.{field} ORDER BY 2 DESC LIMIT ?",
+                        (facet_limit,)
+                    )
+                ]
+
+        results = []
+        for row in rows:
+            user_tags = json.loads(row['user_tags'])
+            ai_tags = json.loads(row['ai_tags'])
+            results.append({
+                'path': os.path.relpath(row['path'], row['root']) if row['root'] else row['name'],
+                'fullPath': row['path'],
+                'name': row['name'],
+                'size': row['size'],
+                'tags': list(dict.fromkeys(user_tags + ai_tags)),
+                'note': row['note'],
+                'isFavorite': bool(row['favorite']),
+                'analysis': {
+                    'name': row['ai_name'],
+                    'age': row['age'],
+                    'gender': row['gender'],
+                    'type': row['type'],
+                    'description': row['description']
+                } if row['ai_name'] or row['description'] else None,
+                'estimate': {
+                    'gender': row['est_gender'],
+                    'age': row['est_age'],
+                    'tags': json.loads(row['est_tags'])
+                } if row['est_gender'] or row['est_age'] else None
+            })
+
+        return {'results': results, 'total': total, 'facets': facets}
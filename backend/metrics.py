@@ -0,0 +1,227 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+# 单条配音的阶段，按执行顺序：
+# encode 读取并编码参考音 / upload 上传请求 / server 服务端处理 / download 下载音频 /
+# queue 等待工作进程和进程间传递 / decode 解码 / trim 删静音 / speed 变速 / write 写 WAV / analyze 峰值、响度和哈希
+LINE_STAGES = ('encode', 'upload', 'server', 'download', 'queue', 'decode', 'trim', 'speed', 'write', 'analyze')
+
+# 直方图分桶上界（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = 'hetang'
+
+
+class StageTimer:
+    """记录各阶段耗时（秒），同名阶段累加"""
+
+    def __init__(self):
+        self.spans: dict[str, float] = {}
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + max(0.0, seconds)
+
+    def rounded(self) -> dict[str, float]:
+        """保留到 0.1ms，便于存进项目文件"""
+        return {name: round(seconds, 4) for name, seconds in self.spans.items()}
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+class Histogram:
+    """固定分桶的直方图（与 Prometheus histogram 相同的语义）"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按分桶线性插值估算分位数（与 Prometheus histogram_quantile 相同）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'mean': round(self.sum / self.count, 4) if self.count else None,
+            'p50': _round(self.quantile(0.5)),
+            'p95': _round(self.quantile(0.95)),
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.counts))
+        }
+
+
+class MetricsRegistry:
+    """进程内的阶段耗时直方图和计数器（线程安全）"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._histograms: dict[str, Histogram] = {}
+        self._counters: dict[tuple[str, str], int] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name: str, label: str = '', amount: int = 1):
+        with self._lock:
+            self._counters[(name, label)] = self._counters.get((name, label), 0) + amount
+
+    def record_line(self, spans: dict[str, float], success: bool):
+        """记录一条配音的各阶段耗时和结果"""
+        for stage, seconds in spans.items():
+            self.observe(stage, seconds)
+        if spans:
+            self.observe('line_total', sum(spans.values()))
+        self.increment('lines', 'success' if success else 'error')
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'uptime': round(time.time() - self.started_at, 1),
+                'stages': {stage: h.to_dict() for stage, h in self._histograms.items()},
+                'counters': {f"{name}:{label}" if label else name: value
+                             for (name, label), value in self._counters.items()}
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each generation/export stage",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip([*map(str, h.buckets), '+Inf'], h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+
+            counter_names = sorted({counter for counter, _ in self._counters})
+            for counter in counter_names:
+                full_name = f"{METRIC_PREFIX}_{counter}_total"
+                lines.append(f"# TYPE {full_name} counter")
+                for (counter_name, label), value in sorted(self._counters.items()):
+                    if counter_name == counter:
+                        lines.append(f'{full_name}{{status="{label}"}} {value}' if label else f'{full_name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def performance_report(tasks: list[dict]) -> dict:
+    """
+    根据任务上记录的各阶段耗时生成项目性能报告
+
+    返回:
+        dict: {'lines': 有记录的行数, 'totalSeconds', 'bottleneck': 总耗时最多的阶段,
+               'stages': {阶段: {'count', 'total', 'mean', 'p50', 'p95', 'max', 'share'}}}
+    """
+    per_stage: dict[str, list[float]] = {}
+    lines = 0
+    for task in tasks:
+        spans = task.get('spans')
+        if not spans:
+            continue
+        lines += 1
+        for stage, seconds in spans.items():
+            per_stage.setdefault(stage, []).append(seconds)
+
+    total = sum(sum(values) for values in per_stage.values())
+    order = {stage: i for i, stage in enumerate(LINE_STAGES)}
+    stages = {}
+    for stage in sorted(per_stage, key=lambda s: order.get(s, len(order))):
+        values = np.asarray(per_stage[stage])
+        stages[stage] = {
+            'count': len(values),
+            'total': round(float(values.sum()), 3),
+            'mean': round(float(values.mean()), 4),
+            'p50': round(float(np.percentile(values, 50)), 4),
+            'p95': round(float(np.percentile(values, 95)), 4),
+            'max': round(float(values.max()), 4),
+            'share': round(float(values.sum()) / total, 3) if total else 0.0
+        }
+    bottleneck = max(stages, key=lambda s: stages[s]['total']) if stages else None
+    return {'lines': lines, 'totalSeconds': round(total, 3), 'bottleneck': bottleneck, 'stages': stages}
+
+
+class MetricsServer:
+    """本地 HTTP 端点，GET /metrics 返回 Prometheus 文本格式"""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = '127.0.0.1'):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> bool:
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint not started on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Metrics endpoint: http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
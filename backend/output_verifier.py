@@ -0,0 +1,104 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from loguru import logger
+
+from backend.analysis_store import hash_file
+from backend.wav_file import read_wav_header
+
+# 问题代码 -> 说明
+ISSUES = {
+    'missing': '音频文件不存在',
+    'bad_header': 'WAV 文件头损坏',
+    'undecodable': '音频无法解码',
+    'truncated': '音频数据不完整',
+    'empty': '音频为空',
+    'length_mismatch': '采样数与生成时记录的不一致',
+    'checksum_mismatch': '文件内容与生成时记录的不一致',
+}
+
+
+def _is_riff(file_path: str) -> bool:
+    with open(file_path, 'rb') as f:
+        head = f.read(12)
+    return head[:4] == b'RIFF' and head[8:12] == b'WAVE'
+
+
+def _decoded_frames(file_path: str) -> Optional[tuple[int, int]]:
+    """用 pydub 解码不是 WAV 的音频，返回 (采样数, 采样率)，无法解码时返回 None"""
+    from pydub import AudioSegment
+
+    try:
+        audio = AudioSegment.from_file(file_path)
+    except Exception as e:
+        logger.debug(f"Failed to decode {file_path}: {e}")
+        return None
+    return int(audio.frame_count()), audio.frame_rate
+
+
+def verify_output(task: dict, check_checksum: bool = True) -> Optional[str]:
+    """
+    校验一条已完成配音的输出文件
+
+    WAV 只检查文件头和数据长度；其他格式（服务端返回的 MP3 等，导出时同样会解码合并）完整解码一遍。
+    任务上有生成时记录的 timing 时再比对采样数，check_checksum 为 True 且记录了哈希时比对文件内容哈希。
+
+    返回:
+        问题代码（见 ISSUES），文件正常时返回 None
+    """
+    output_file = task.get('outputFile')
+    if not output_file or not os.path.isfile(output_file):
+        return 'missing'
+    try:
+        is_wav = _is_riff(output_file)
+    except OSError:
+        return 'missing'
+    if is_wav:
+        info = read_wav_header(output_file)
+        if info is None:
+            return 'bad_header'
+        if info.truncated:
+            return 'truncated'
+        frames, frame_rate = info.frames, info.frame_rate
+    else:
+        decoded = _decoded_frames(output_file)
+        if decoded is None:
+            return 'undecodable'
+        frames, frame_rate = decoded
+    if frames == 0:
+        return 'empty'
+
+    timing = task.get('timing')
+    if not timing:
+        return None
+    if timing.get('frames') is not None and (frames, frame_rate) != (timing['frames'], timing['frameRate']):
+        return 'length_mismatch'
+    if check_checksum and timing.get('checksum'):
+        try:
+            if hash_file(output_file) != timing['checksum']:
+                return 'checksum_mismatch'
+        except OSError:
+            return 'missing'
+    return None
+
+
+def verify_outputs(tasks: list[dict], check_checksum: bool = True, max_workers: int = 0) -> list[dict]:
+    """
+    并行校验所有已完成任务的输出文件（读文件和计算哈希时会释放 GIL，用线程即可）
+
+    返回:
+        有问题的任务列表 [{'index', 'outputFile', 'issue', 'message'}]，按任务序号排列
+    """
+    completed = [task for task in tasks if task.get('status') == 'completed']
+    if not completed:
+        return []
+    workers = max_workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        issues = list(executor.map(lambda task: verify_output(task, check_checksum), completed))
+    invalid = [
+        {'index': task.get('index', 0), 'outputFile': task.get('outputFile', ''), 'issue': issue,
+         'message': ISSUES[issue]}
+        for task, issue in zip(completed, issues) if issue
+    ]
+    return sorted(invalid, key=lambda item: item['index'])
@@ -0,0 +1,207 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from backend.audio_workers import AudioWorkerPool
+from backend.loudness import is_current, normalization_gain_db
+from backend.subtitles import build_cues, line_frames, write_subtitles
+from backend.wav_file import read_wav_header
+
+# 分段方式
+SPLIT_MODES = ('none', 'chapters', 'duration')
+
+# 章节标记行：第X章/节/回/卷/集/部、Chapter N、Markdown 标题
+DEFAULT_CHAPTER_PATTERN = r'^\s*(第[0-9零〇一二三四五六七八九十百千万两]+[章节回卷集部]|chapter\s*\d+|#+\s)'
+
+# 单个 WAV 的数据不能超过 4GB（RIFF 头是 32 位），留出余量
+MAX_WAV_BYTES = 4_000_000_000
+
+
+@dataclass
+class ExportPart:
+    number: int  # 从 1 开始
+    title: str
+    tasks: list[dict] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def split_parts(
+    tasks: list[dict],
+    mode: str = 'none',
+    max_seconds: float = 0,
+    chapter_pattern: str = DEFAULT_CHAPTER_PATTERN
+) -> list[ExportPart]:
+    """
+    把按顺序排列的任务分成若干导出段
+
+    参数:
+        mode: none 不按章节分 / chapters 章节标记行开始新的一段 / duration 只按时长分
+        max_seconds: 每段最长时长，0 表示不限制；超过时从下一条开始新的一段（对所有方式都生效）
+        chapter_pattern: 章节标记行的正则（匹配台词内容，忽略大小写）
+
+    时长来自任务记录或 WAV 文件头，不解码音频。
+    """
+    marker = re.compile(chapter_pattern, re.IGNORECASE) if mode == 'chapters' and chapter_pattern else None
+    parts: list[ExportPart] = []
+    current: Optional[ExportPart] = None
+    chapter = ""  # 当前章节标题
+    continuation = 0  # 当前章节因超长被拆开的次数
+
+    for task in tasks:
+        frames = line_frames(task)
+        seconds = frames[0] / frames[1] if frames and frames[1] else 0.0
+        content = task.get('content', '').strip()
+
+        if marker and marker.search(content) and (current is None or current.tasks):
+            chapter = content[:40]
+            continuation = 0
+            current = None
+        elif current is not None and max_seconds > 0 and current.seconds + seconds > max_seconds:
+            continuation += 1
+            current = None
+
+        if current is None:
+            number = len(parts) + 1
+            if chapter:
+                title = f"{chapter} ({continuation + 1})" if continuation else chapter
+            else:
+                title = f"第{number}部分"
+            current = ExportPart(number, title)
+            parts.append(current)
+        current.tasks.append(task)
+        current.seconds += seconds
+
+    return parts
+
+
+def safe_filename(name: str, max_length: int = 40) -> str:
+    """去掉文件名中不允许的字符"""
+    name = re.sub(r'[\\/:*?"<>|\r\n\t]+', '_', name).strip(' ._')
+    return name[:max_length] or "part"
+
+
+def _cue_time(seconds: float) -> str:
+    """CUE 表时间 MM:SS:FF（每秒 75 帧）"""
+    frames = int(round(seconds * 75))
+    return f"{frames // 4500:02d}:{frames // 75 % 60:02d}:{frames % 75:02d}"
+
+
+def write_cue_sheet(path: str, project_name: str, parts: list[dict]):
+    def quote(text: str) -> str:
+        return '"' + text.replace('"', "'") + '"'
+
+    lines = [f'TITLE {quote(project_name)}']
+    for track, part in enumerate(parts, 1):
+        lines.append(f'FILE {quote(Path(part["audio"]).name)} WAVE')
+        lines.append(f'  TRACK {track:02d} AUDIO')
+        lines.append(f'    TITLE {quote(part["title"])}')
+        lines.append(f'    INDEX 01 {_cue_time(0)}')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+class ProjectExporter:
+    """
+    项目导出：按章节/时长分段，各段并行合并音频并写出各自的字幕，多段时另写清单和 CUE 表
+
+    每段在一个线程中按顺序写文件，解码和增益在共享的音频工作进程池中进行。
+    """
+
+    def __init__(self, workers: AudioWorkerPool):
+        self.workers = workers
+
+    def export(
+        self,
+        project_name: str,
+        tasks: list[dict],
+        export_path: Path,
+        subtitle_formats: list[str],
+        normalize: Optional[tuple[float, float]] = None,
+        split_mode: str = 'none',
+        max_part_minutes: float = 0,
+        chapter_pattern: str = DEFAULT_CHAPTER_PATTERN
+    ) -> dict:
+        """
+        参数:
+            tasks: 按顺序排列、输出文件存在的任务
+            normalize: (目标响度, 峰值上限)，为 None 时不做响度归一化
+
+        返回:
+            dict: {'parts': 各段信息, 'manifest': 清单路径（只有一段时为 None）, 'loudness': {任务序号: 新测量的响度}}
+        """
+        first = read_wav_header(tasks[0]['outputFile'])
+        target = (first.channels, first.sample_width, first.frame_rate) if first and first.is_int_pcm else None
+
+        # 单个 WAV 不能超过 4GB
+        max_seconds = max_part_minutes * 60 if split_mode != 'none' else 0
+        if target:
+            wav_limit = MAX_WAV_BYTES / (target[0] * target[1] * target[2])
+            max_seconds = min(max_seconds, wav_limit) if max_seconds else wav_limit
+        parts = split_parts(tasks, split_mode, max_seconds, chapter_pattern)
+        logger.info(f"Exporting {len(tasks)} lines in {len(parts)} parts")
+
+        def base_name(part: ExportPart) -> str:
+            if len(parts) == 1:
+                return project_name
+            return f"{project_name}_{part.number:02d}_{safe_filename(part.title)}"
+
+        # 同时进行的段共享解码窗口，限制共享内存占用
+        parallel = max(1, min(len(parts), self.workers.num_workers))
+        window = max(2, self.workers.num_workers * 2 // parallel)
+
+        def render(part: ExportPart) -> dict:
+            gains = None
+            if normalize:
+                gains = [
+                    normalization_gain_db(task['loudness'], *normalize)
+                    if is_current(task.get('loudness'), task['outputFile']) else None
+                    for task in part.tasks
+                ]
+            audio_path = str(export_path / f"{base_name(part)}.wav")
+            segments = self.workers.concat_to_wav(
+                [task['outputFile'] for task in part.tasks], audio_path, gains, normalize, window, target
+            )
+
+            # 字幕时间相对本段开头；不是 WAV 的行用解码得到的采样数
+            decoded = {task.get('index', 0): segment['frames'] / segment['frame_rate']
+                       for task, segment in zip(part.tasks, segments) if line_frames(task) is None}
+            cues = build_cues(part.tasks, decoded)
+            subtitles = write_subtitles(cues, str(export_path / base_name(part)), subtitle_formats)
+            return {
+                'number': part.number,
+                'title': part.title,
+                'audio': audio_path,
+                'subtitles': subtitles,
+                'duration': round(sum(s['frames'] / s['frame_rate'] for s in segments), 3),
+                'lines': [part.tasks[0].get('index', 0), part.tasks[-1].get('index', 0)],
+                'measured': {task.get('index', 0): segment['loudness']
+                             for task, segment in zip(part.tasks, segments) if 'loudness' in segment}
+            }
+
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            rendered = list(executor.map(render, parts))
+
+        measured = {}
+        start = 0.0
+        for part in rendered:
+            measured.update(part.pop('measured'))
+            part['start'] = round(start, 3)
+            start += part['duration']
+
+        manifest_path = None
+        if len(rendered) > 1:
+            manifest_path = str(export_path / f"{project_name}.json")
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump({'project': project_name, 'duration': round(start, 3), 'parts': [
+                    {**part, 'audio': Path(part['audio']).name,
+                     'subtitles': [Path(p).name for p in part['subtitles']]}
+                    for part in rendered
+                ]}, f, ensure_ascii=False, indent=2)
+            write_cue_sheet(str(export_path / f"{project_name}.cue"), project_name, rendered)
+
+        return {'parts': rendered, 'manifest': manifest_path, 'loudness': measured}
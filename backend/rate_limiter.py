@@ -0,0 +1,165 @@
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """令牌桶，rate <= 0 表示不限速
+
+    单次申请超过桶容量时按容量扣减并允许余额为负（透支），
+    这样大文件上传不会永远等不到足够的令牌，但后续请求会相应等待。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        """调整速率（容量不变）"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        """申请令牌，阻塞直到获得；should_stop 返回 True 时放弃并返回 False"""
+        if self.rate <= 0:
+            return True
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return True
+                wait = (needed - self._tokens) / self.rate
+            if should_stop and should_stop():
+                return False
+            time.sleep(min(wait, 0.2))
+
+
+@dataclass
+class RunMetrics:
+    """单次分析运行的吞吐统计"""
+    started_at: float = field(default_factory=time.monotonic)
+    files_done: int = 0
+    files_failed: int = 0
+    files_cached: int = 0
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    bytes_uploaded: int = 0
+    bytes_saved: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts: int):
+        """累加计数"""
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> dict:
+        """导出给前端的统计数据"""
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-6)
+            return {
+                'elapsed': round(elapsed, 1),
+                'filesDone': self.files_done,
+                'filesFailed': self.files_failed,
+                'filesCached': self.files_cached,
+                'requests': self.requests,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'bytesUploaded': self.bytes_uploaded,
+                'bytesSaved': self.bytes_saved,
+                'filesPerMinute': round(self.files_done * 60 / elapsed, 1),
+                'uploadBytesPerSecond': round(self.bytes_uploaded / elapsed)
+            }
+
+
+class AdaptiveRateLimiter:
+    """请求与上传带宽限速，并在被限流（429）时自适应降速
+
+    遇到 429 时请求速率减半（不低于 min_rate），之后每次成功按目标速率的 5% 逐步恢复（AIMD）。
+    未配置限速时以最近 window 秒内实际的请求速率为起点减半，恢复到该速率后解除限速。
+    重试等待时间按指数退避加抖动计算，服务端给出 Retry-After 时以其为下限。
+    """
+
+    def __init__(self, requests_per_second: float = 0, upload_bytes_per_second: float = 0,
+                 base_delay: float = 1.0, max_delay: float = 60.0, min_rate: float = 0.2,
+                 window: float = 10.0):
+        self.configured_rate = requests_per_second
+        self.target_rate = requests_per_second  # 恢复的目标速率
+        self.window = window
+        self._recent: deque = deque()  # 最近的请求时间
+        self.requests = TokenBucket(requests_per_second)
+        self.upload = TokenBucket(upload_bytes_per_second, capacity=max(upload_bytes_per_second, 1.0))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_rate = min_rate
+        self._lock = threading.Lock()
+
+    def acquire_request(self, should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        if not self.requests.acquire(1, should_stop):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._recent.append(now)
+            while self._recent and self._recent[0] < now - self.window:
+                self._recent.popleft()
+        return True
+
+    def observed_rate(self) -> float:
+        """最近 window 秒内实际发出请求的速率"""
+        with self._lock:
+            if not self._recent:
+                return 0.0
+            span = max(time.monotonic() - self._recent[0], 1.0)
+            return len(self._recent) / span
+
+    def acquire_upload(self, size: int, should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        return self.upload.acquire(size, should_stop)
+
+    def on_success(self):
+        """请求成功，逐步恢复速率"""
+        with self._lock:
+            current = self.requests.rate
+            if current <= 0 or self.target_rate <= 0 or current >= self.target_rate:
+                return
+            rate = current + self.target_rate * 0.05
+            if rate < self.target_rate:
+                self.requests.set_rate(rate)
+            else:
+                # 恢复到目标：有配置时回到配置速率，否则解除限速
+                self.requests.set_rate(self.configured_rate)
+                self.target_rate = self.configured_rate
+
+    def on_throttled(self):
+        """被限流，速率减半"""
+        observed = self.observed_rate() if self.requests.rate <= 0 else 0.0
+        with self._lock:
+            rate = self.requests.rate
+            if rate <= 0:
+                # 未限速：从实际速率开始降
+                rate = max(observed, self.min_rate * 2)
+                self.target_rate = rate
+            self.requests.set_rate(max(self.min_rate, rate / 2))
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试前的等待秒数"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay *= random.uniform(0.5, 1.0)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
@@ -0,0 +1,177 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from queue import Empty, Queue
+from typing import Optional
+from loguru import logger
+
+CSV_HEADER = ['名称', '相对路径', '年龄', '性别', '类型', '标签', '描述']
+
+# 支持的输出格式 -> 扩展名
+OUTPUT_FORMATS = {
+    'csv': '.csv',
+    'jsonl': '.jsonl',
+    'sqlite': '.db',
+}
+
+
+class CsvSink:
+    """CSV 输出（与旧版 save_to_csv 格式一致）"""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        append = resume and os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if not append:
+            self._writer.writerow(CSV_HEADER)
+
+    def write_many(self, rows: list[dict]):
+        self._writer.writerows(
+            [r['name'], r['path'], r['age'], r['gender'], r['type'], '|'.join(r['tags']), r['description']]
+            for r in rows
+        )
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlSink:
+    """JSON Lines 输出，每行一个结果对象"""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def write_many(self, rows: list[dict]):
+        self._file.writelines(json.dumps(r, ensure_ascii=False) + '\n' for r in rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteSink:
+    """SQLite 输出，按相对路径去重，便于直接查询"""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "path TEXT PRIMARY KEY, name TEXT, age TEXT, gender TEXT, type TEXT, "
+            "tags TEXT, description TEXT, updated_at REAL)"
+        )
+        self._conn.commit()
+
+    def write_many(self, rows: list[dict]):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (path, name, age, gender, type, tags, description, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(r['path'], r['name'], r['age'], r['gender'], r['type'],
+                  json.dumps(r['tags'], ensure_ascii=False), r['description'], now) for r in rows]
+            )
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+SINKS = {
+    'csv': CsvSink,
+    'jsonl': JsonlSink,
+    'sqlite': SqliteSink,
+}
+
+
+def open_sinks(csv_path: str, formats: list[str], resume: bool = False) -> list:
+    """按格式打开输出，csv 以外的格式使用与 csv_path 同名、不同扩展名的文件"""
+    base, _ = os.path.splitext(csv_path)
+    sinks = []
+    for fmt in dict.fromkeys(['csv'] + list(formats)):
+        if fmt not in SINKS:
+            logger.warning(f"Unknown analysis output format: {fmt}")
+            continue
+        path = csv_path if fmt == 'csv' else base + OUTPUT_FORMATS[fmt]
+        sinks.append(SINKS[fmt](path, resume))
+    return sinks
+
+
+class ResultWriter:
+    """分析结果写入线程
+
+    工作线程只把结果放进队列；写入线程保持输出文件打开，把积累的结果批量写入各个输出，
+    每 flush_interval 秒或积累 max_batch 条时落盘一次。close() 会写完队列中剩余的结果。
+    """
+
+    def __init__(self, sinks: list, flush_interval: float = 1.0, max_batch: int = 500):
+        self.sinks = sinks
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: Queue = Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def paths(self) -> list[str]:
+        return [sink.path for sink in self.sinks]
+
+    def write(self, result: dict):
+        """提交一条结果（不阻塞）"""
+        self._queue.put(result)
+
+    def _write_batch(self, batch: list[dict]):
+        for sink in self.sinks:
+            try:
+                sink.write_many(batch)
+                sink.flush()
+            except Exception as e:
+                logger.error(f"Failed to write analysis results to {sink.path}: {e}")
+
+    def _run(self):
+        batch: list[dict] = []
+        deadline: Optional[float] = None
+        closing = False
+        while not closing:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is None:
+                    closing = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except Empty:
+                pass
+
+            if batch and (closing or len(batch) >= self.max_batch or time.monotonic() >= deadline):
+                self._write_batch(batch)
+                batch = []
+                deadline = None
+
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logger.error(f"Failed to close {sink.path}: {e}")
+
+    def close(self):
+        """写完剩余结果并关闭输出"""
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+from loguru import logger
+
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.aac', '.flac', '.ogg'}
+
+
+class ScanIndex:
+    """参考音目录扫描索引
+
+    按目录记录 mtime、音频文件（名称、大小、mtime、inode）和子目录列表，并持久化到磁盘。
+    重新扫描时仍会 stat 每个目录，但只有 mtime 变化的目录才会重新 scandir，
+    未变化的目录直接复用缓存的条目，因此 NAS 上的大型参考音库重复打开时只需很少的 IO。
+    注意：目录 mtime 只反映条目增删改名，文件原地改写导致的大小变化不会被感知。
+    """
+
+    def __init__(self, config_dir: Optional[Path] = None, max_workers: int = 8):
+        if config_dir is None:
+            config_dir = Path.home() / ".config" / "hetang_dubbing"
+        self.config_dir = Path(config_dir)
+        self.config_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.config_dir / "scan_index.json"
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # 串行化写盘：取快照到原子替换完成期间持有，保证较新的快照最后落盘（先于 _lock 获取）
+        self._write_lock = threading.Lock()
+        self._dirs: dict[str, dict] = self._load_index()
+        self._dirty = False
+
+    def _load_index(self) -> dict:
+        """加载索引"""
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f).get('dirs', {})
+            except Exception as e:
+                logger.error(f"Failed to load scan index: {e}")
+        return {}
+
+    def save(self):
+        """保存索引（原子替换）"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps({'dirs': self._dirs}, ensure_ascii=False)
+                self._dirty = False
+            tmp_file = self.index_file.with_suffix('.json.tmp')
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_file, self.index_file)
+            except Exception as e:
+                logger.error(f"Failed to save scan index: {e}")
+                with self._lock:
+                    self._dirty = True
+
+    def _read_dir(self, path: str) -> Optional[dict]:
+        """读取单个目录（mtime 未变化时复用缓存）"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._dirs.get(path)
+        if cached and cached['mtime'] == mtime:
+            return cached
+
+        files: list[list] = []
+        dirs: list[str] = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            if os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                                stat = entry.stat()
+                                files.append([entry.name, stat.st_size, stat.st_mtime_ns, stat.st_ino])
+                        elif entry.is_dir() and not entry.name.startswith('.'):
+                            dirs.append(entry.name)
+                    except OSError:
+                        pass
+        except OSError:
+            return None
+
+        record = {'mtime': mtime, 'files': files, 'dirs': dirs}
+        with self._lock:
+            self._dirs[path] = record
+            self._dirty = True
+        return record
+
+    def invalidate(self, path: str):
+        """使某个目录的缓存失效"""
+        with self._lock:
+            if self._dirs.pop(path, None) is not None:
+                self._dirty = True
+
+    def iter_scan(self, directory: str, max_depth: Optional[int] = None,
+                  visited_dirs: Optional[list[str]] = None,
+                  identities: Optional[dict[str, tuple[int, int]]] = None) -> Iterator[list[tuple[str, int]]]:
+        """逐层并行扫描目录，每扫描完一层产出该层的 (完整路径, 大小) 列表
+
+        max_depth 与 Api.scan_reference_audio 一致，根目录为第 1 层，None 表示不限层数。
+        传入 visited_dirs 时会把实际读取到的目录追加进去；
+        传入 identities 时填入 {完整路径: (mtime_ns, inode)}（旧版索引中没有记录的文件不填）。
+        """
+        frontier = [directory]
+        depth = 1
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while frontier and (max_depth is None or depth <= max_depth):
+                records = executor.map(self._read_dir, frontier)
+                found: list[tuple[str, int]] = []
+                next_frontier: list[str] = []
+                for path, record in zip(frontier, records):
+                    if record is None:
+                        continue
+                    if visited_dirs is not None:
+                        visited_dirs.append(path)
+                    for name, size, *identity in record['files']:
+                        full_path = os.path.join(path, name)
+                        found.append((full_path, size))
+                        if identities is not None and identity:
+                            identities[full_path] = tuple(identity)
+                    next_frontier.extend(os.path.join(path, name) for name in record['dirs'])
+                yield found
+                frontier = next_frontier
+                depth += 1
+        self.save()
+
+    def scan(self, directory: str, max_depth: Optional[int] = None,
+             visited_dirs: Optional[list[str]] = None,
+             identities: Optional[dict[str, tuple[int, int]]] = None) -> list[tuple[str, int]]:
+        """扫描目录，返回全部 (完整路径, 大小)"""
+        result: list[tuple[str, int]] = []
+        for found in self.iter_scan(directory, max_depth, visited_dirs, identities):
+            result.extend(found)
+        return result
+
+    def scan_pages(self, directory: str, page_size: int, max_depth: Optional[int] = None,
+                   file_filter: Optional[Callable[[str, int], bool]] = None,
+                   identities: Optional[dict[str, tuple[int, int]]] = None) -> Iterator[list[tuple[str, int]]]:
+        """扫描目录并按 page_size 分页产出结果（identities 同 iter_scan）"""
+        page: list[tuple[str, int]] = []
+        for found in self.iter_scan(directory, max_depth, identities=identities):
+            for item in found:
+                if file_filter and not file_filter(*item):
+                    continue
+                page.append(item)
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
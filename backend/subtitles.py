@@ -0,0 +1,134 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.wav_file import read_wav_header
+
+# 格式 -> 扩展名
+SUBTITLE_FORMATS = {
+    'srt': '.srt',
+    'vtt': '.vtt',
+    'lrc': '.lrc',
+    'json': '.json',
+}
+
+
+@dataclass
+class Cue:
+    index: int  # 任务序号
+    start: float  # 秒
+    end: float
+    text: str
+    role: str = ""
+
+
+def record_timing(output_file: str, frames: int, frame_rate: int, checksum: str = "") -> dict:
+    """生成配音时记录的精确时长信息，附带文件大小、修改时间和内容哈希，用于判断是否仍然有效、文件是否损坏"""
+    stat = os.stat(output_file)
+    return {
+        'frames': frames,
+        'frameRate': frame_rate,
+        'durationMs': frames * 1000 // frame_rate if frame_rate else 0,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'checksum': checksum
+    }
+
+
+def line_frames(task: dict) -> Optional[tuple[int, int]]:
+    """
+    一条配音的 (采样数, 采样率)
+
+    优先使用生成时记录在任务上的 timing；没有或文件已变化时读 WAV 文件头，都不需要解码音频。
+    文件不存在或不是 WAV 时返回 None。
+    """
+    output_file = task.get('outputFile')
+    if not output_file:
+        return None
+    timing = task.get('timing')
+    try:
+        stat = os.stat(output_file)
+    except OSError:
+        return None
+    if timing and timing.get('size') == stat.st_size and timing.get('mtime') == stat.st_mtime:
+        return timing['frames'], timing['frameRate']
+    info = read_wav_header(output_file)
+    return (info.frames, info.frame_rate) if info else None
+
+
+def build_cues(tasks: list[dict], durations: Optional[dict[int, float]] = None) -> list[Cue]:
+    """
+    按任务顺序累加时长生成字幕条目
+
+    时间按采样数累加后再换算，不会因为逐条取整到毫秒而产生累积误差。
+    durations 可以为部分任务直接给出时长（秒），其余任务用 line_frames 获取；都没有的任务跳过。
+    """
+    cues: list[Cue] = []
+    current = 0.0
+    for task in sorted(tasks, key=lambda t: t.get('index', 0)):
+        index = task.get('index', 0)
+        if durations and index in durations:
+            duration = durations[index]
+        else:
+            frames = line_frames(task)
+            if frames is None or not frames[1]:
+                continue
+            duration = frames[0] / frames[1]
+        cues.append(Cue(index, current, current + duration, task.get('content', ''), task.get('role', '')))
+        current += duration
+    return cues
+
+
+def _clock(seconds: float, separator: str) -> str:
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms % 3600000 // 60000:02d}:{ms % 60000 // 1000:02d}{separator}{ms % 1000:03d}"
+
+
+def to_srt(cues: list[Cue]) -> str:
+    blocks = [f"{n}\n{_clock(c.start, ',')} --> {_clock(c.end, ',')}\n{c.text}\n" for n, c in enumerate(cues, 1)]
+    return '\n'.join(blocks)
+
+
+def to_vtt(cues: list[Cue]) -> str:
+    blocks = [f"{_clock(c.start, '.')} --> {_clock(c.end, '.')}\n{c.text}\n" for c in cues]
+    return '\n'.join(['WEBVTT\n'] + blocks)
+
+
+def to_lrc(cues: list[Cue]) -> str:
+    lines = []
+    for c in cues:
+        cs = int(round(c.start * 100))
+        lines.append(f"[{cs // 6000:02d}:{cs % 6000 // 100:02d}.{cs % 100:02d}]{c.text}")
+    return '\n'.join(lines) + '\n'
+
+
+def to_json(cues: list[Cue]) -> str:
+    # 每条一行：带 indent 的 json.dumps 会退回纯 Python 编码器，大项目慢一个数量级
+    items = [
+        json.dumps({'index': c.index, 'start': round(c.start, 3), 'end': round(c.end, 3),
+                    'role': c.role, 'text': c.text}, ensure_ascii=False)
+        for c in cues
+    ]
+    return '[\n' + ',\n'.join(f"  {item}" for item in items) + '\n]\n' if items else '[]\n'
+
+
+FORMATTERS = {
+    'srt': to_srt,
+    'vtt': to_vtt,
+    'lrc': to_lrc,
+    'json': to_json,
+}
+
+
+def write_subtitles(cues: list[Cue], base_path: str, formats: list[str]) -> list[str]:
+    """按格式写出字幕文件（base_path 不含扩展名），返回写出的路径"""
+    paths = []
+    for fmt in dict.fromkeys(formats):
+        if fmt not in FORMATTERS:
+            continue
+        path = base_path + SUBTITLE_FORMATS[fmt]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(FORMATTERS[fmt](cues))
+        paths.append(path)
+    return paths
@@ -0,0 +1,117 @@
+import numpy as np
+
+# 预设：(帧长 ms, 搜索范围 ms, 搜索时的降采样倍数)
+# 帧越长、搜索范围越大、降采样越少，拼接处越平滑，但计算量越大
+PRESETS = {
+    'fast': (30.0, 8.0, 4),
+    'balanced': (40.0, 12.0, 2),
+    'high': (50.0, 15.0, 1),
+}
+DEFAULT_PRESET = 'balanced'
+
+
+# 8 位 WAV 是无符号整数（静音为 128），16/32 位是有符号整数
+PCM_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def pcm_to_float(pcm: np.ndarray, sample_width: int, channels: int) -> np.ndarray:
+    """整数 PCM -> float32 数组 (采样数, 声道数)，取值 -1~1"""
+    samples = pcm.astype(np.float32)
+    if sample_width == 1:
+        samples -= 128.0
+    samples /= float(1 << (8 * sample_width - 1))
+    return samples.reshape(-1, channels)
+
+
+def float_to_pcm(samples: np.ndarray, sample_width: int) -> np.ndarray:
+    """float32 数组 -> 整数 PCM（超出范围的部分削波）"""
+    scale = float(1 << (8 * sample_width - 1))
+    pcm = np.clip(samples * scale, -scale, scale - 1)
+    if sample_width == 1:
+        pcm += 128.0
+    return pcm.astype(PCM_DTYPES[sample_width])
+
+
+def segment_pcm(audio) -> np.ndarray:
+    """pydub AudioSegment 的采样数据 -> 与 WAV 文件相同编码的整数 PCM（pydub 内部的 8 位数据是有符号的）"""
+    if audio.sample_width == 1:
+        return np.frombuffer(audio.raw_data, dtype=np.uint8) ^ np.uint8(0x80)
+    return np.frombuffer(audio.raw_data, dtype=PCM_DTYPES[audio.sample_width])
+
+
+def segment_to_array(audio) -> np.ndarray:
+    """pydub AudioSegment -> float32 数组 (采样数, 声道数)，取值 -1~1"""
+    return pcm_to_float(segment_pcm(audio), audio.sample_width, audio.channels)
+
+
+def array_to_segment(samples: np.ndarray, template):
+    """float32 数组 -> 与 template 采样格式相同的 AudioSegment"""
+    pcm = float_to_pcm(samples, template.sample_width)
+    if template.sample_width == 1:
+        pcm ^= np.uint8(0x80)
+    return template._spawn(pcm.tobytes())
+
+
+def wsola(samples: np.ndarray, rate: float, sample_rate: int, preset: str = DEFAULT_PRESET) -> np.ndarray:
+    """
+    WSOLA 变速不变调
+
+    参数:
+        samples: float32 数组 (采样数, 声道数)
+        rate: 速度倍率，大于 1 加速，小于 1 减速
+        sample_rate: 采样率
+        preset: fast / balanced / high
+
+    返回:
+        np.ndarray: 变速后的数组，长度约为原长度 / rate
+
+    每个输出帧在名义位置附近 ±搜索范围内找与上一帧自然延续最相似的输入片段，
+    只有找位置这一步需要逐帧进行（在降采样的单声道上做互相关），
+    取帧、加窗和 50% 重叠相加都是整块的数组运算。
+    """
+    frame_ms, search_ms, decimate = PRESETS.get(preset, PRESETS[DEFAULT_PRESET])
+    frame_len = int(sample_rate * frame_ms / 1000) // (2 * decimate) * (2 * decimate)
+    hop_out = frame_len // 2
+    hop_in = hop_out * rate
+    tolerance = int(sample_rate * search_ms / 1000) // decimate * decimate
+
+    total = len(samples)
+    n_frames = int(np.ceil(total / hop_in)) + 1
+    # 第一帧从输入起点前 hop_in 处开始，其后半段与第二帧（起点对齐输入开头）重叠
+    pad = frame_len + tolerance + int(np.ceil(hop_in))
+    padded = np.pad(samples, ((pad, pad + int(hop_in) + hop_out + 1), (0, 0)))
+
+    # 在降采样的单声道信号上搜索拼接位置
+    mono = padded.mean(axis=1)
+    search = mono[::decimate]
+    d_frame = frame_len // decimate
+    d_tol = tolerance // decimate
+
+    positions = np.empty(n_frames, dtype=np.int64)
+    positions[0] = pad - int(hop_in)
+    for k in range(1, n_frames):
+        # 上一帧的自然延续作为模板
+        natural = (positions[k - 1] + hop_out) // decimate
+        template = search[natural:natural + d_frame]
+        nominal = (pad + int((k - 1) * hop_in)) // decimate
+        region = search[nominal - d_tol:nominal + d_tol + d_frame]
+        corr = np.correlate(region, template, mode='valid')
+        positions[k] = (nominal - d_tol + int(np.argmax(corr))) * decimate
+
+    # 周期 Hann 窗在 50% 重叠时相加恒为 1
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_len) / frame_len)).astype(np.float32)
+    frames = padded[positions[:, None] + np.arange(frame_len)] * window[None, :, None]
+
+    output = np.zeros(((n_frames + 1) * hop_out, samples.shape[1]), dtype=np.float32)
+    output[:n_frames * hop_out] += frames[:, :hop_out].reshape(-1, samples.shape[1])
+    output[hop_out:(n_frames + 1) * hop_out] += frames[:, hop_out:].reshape(-1, samples.shape[1])
+
+    # 第一帧前半段只有一半窗且对应输入起点之前，去掉；按目标长度截断
+    target = int(round(total / rate))
+    return output[hop_out:hop_out + target]
+
+
+def time_stretch(audio, rate: float, preset: str = DEFAULT_PRESET):
+    """对 pydub AudioSegment 做变速不变调，返回新的 AudioSegment"""
+    stretched = wsola(segment_to_array(audio), rate, audio.frame_rate, preset)
+    return array_to_segment(stretched, audio)
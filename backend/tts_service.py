@@ -1,17 +1,46 @@
 import base64
+import json
+import re
+import time
 import requests
 from pathlib import Path
+from typing import Optional
 from loguru import logger
-from pydub import AudioSegment
-from pydub.effects import speedup
+
+from backend.audio_workers import AudioWorkerPool, leading_silence_ms, load_pcm, write_wav
+from backend.metrics import StageTimer
+from backend.subtitles import record_timing
+from backend.time_stretch import DEFAULT_PRESET, PRESETS, float_to_pcm, pcm_to_float, wsola
+
+# Server-Timing: total;dur=1234.5（毫秒），取各项之和作为服务端处理时间
+SERVER_TIMING_DUR = re.compile(r'dur=([0-9.]+)')
+
+
+def server_seconds(headers) -> Optional[float]:
+    """从响应头读取服务端处理耗时（Server-Timing 或 X-Process-Time），没有时返回 None"""
+    timing = headers.get('Server-Timing')
+    if timing:
+        durations = SERVER_TIMING_DUR.findall(timing)
+        if durations:
+            return sum(float(d) for d in durations) / 1000
+    process_time = headers.get('X-Process-Time')
+    if process_time:
+        try:
+            return float(process_time)
+        except ValueError:
+            pass
+    return None
 
 
 class TTSService:
     """TTS 配音服务"""
 
-    def __init__(self):
+    def __init__(self, time_stretch_quality: str = DEFAULT_PRESET, postprocess_workers: int = 0):
         self.default_emo_control_method = 0
         self.default_emo_weight = 1.0
+        self.time_stretch_quality = time_stretch_quality if time_stretch_quality in PRESETS else DEFAULT_PRESET
+        # 删静音、变速和导出时的解码在进程池中进行，调用线程只做网络请求
+        self.workers = AudioWorkerPool(postprocess_workers)
 
     def trim_leading_silence(
         self,
@@ -35,28 +64,20 @@ class TTSService:
         try:
             logger.info(f"处理音频开头静音: {audio_file}")
 
-            # 加载音频文件
-            audio = AudioSegment.from_file(audio_file)
-
-            # 检测开头静音的结束位置
-            silence_end_ms = 0
-            chunk_size = 10  # 每10ms检测一次
+            # 加载音频文件（PCM WAV 直接内存映射）
+            pcm, channels, sample_width, frame_rate = load_pcm(audio_file)
+            samples = pcm_to_float(pcm, sample_width, channels)
+            del pcm
 
-            for i in range(0, len(audio), chunk_size):
-                chunk = audio[i:i + chunk_size]
-                if chunk.dBFS > silence_thresh_db:
-                    silence_end_ms = i
-                    break
-            else:
-                # 整个音频都是静音
-                silence_end_ms = len(audio)
+            # 检测开头静音的结束位置（每10ms一块）
+            silence_end_ms = leading_silence_ms(samples, frame_rate, silence_thresh_db)
 
             # 计算需要裁剪的位置（保留 keep_ms 的静音）
             trim_position = max(0, silence_end_ms - keep_ms)
 
             if trim_position > 0:
                 # 裁剪音频
-                trimmed_audio = audio[trim_position:]
+                trimmed = samples[trim_position * frame_rate // 1000:]
                 logger.info(f"裁剪开头静音: {trim_position}ms (保留 {keep_ms}ms)")
 
                 # 确定输出文件
@@ -64,7 +85,7 @@ class TTSService:
                     output_file = audio_file
 
                 # 保存处理后的音频
-                trimmed_audio.export(output_file, format="wav")
+                write_wav(output_file, float_to_pcm(trimmed, sample_width), channels, sample_width, frame_rate)
                 logger.info(f"静音处理完成: {output_file}")
 
                 return {
@@ -85,14 +106,15 @@ class TTSService:
             logger.exception(error_msg)
             return {"success": False, "error": error_msg}
 
-    def adjust_speed(self, audio_file: str, speed: float, output_file: str = None) -> dict:
+    def adjust_speed(self, audio_file: str, speed: float, output_file: str = None, quality: str = None) -> dict:
         """
-        调整音频播放速度
+        调整音频播放速度（WSOLA，加速和减速都保持音高）
 
         参数:
             audio_file: 输入音频文件路径
             speed: 速度倍率（0.5-2.0），大于1加速，小于1减速
             output_file: 输出文件路径，如果为None则覆盖原文件
+            quality: 变速质量预设 fast / balanced / high，为None时使用 time_stretch_quality
 
         返回:
             dict: {'success': bool, 'output': str, 'error': str}
@@ -107,30 +129,20 @@ class TTSService:
 
             logger.info(f"调整音频速度: {audio_file}, 倍率: {speed}x")
 
-            # 加载音频文件
-            audio = AudioSegment.from_file(audio_file)
+            # 加载音频文件（PCM WAV 直接内存映射）
+            pcm, channels, sample_width, frame_rate = load_pcm(audio_file)
+            samples = pcm_to_float(pcm, sample_width, channels)
+            del pcm
 
             # 调整速度
-            # 方法1: 使用 speedup (保持音高)
-            if speed > 1.0:
-                # 加速
-                adjusted_audio = speedup(audio, playback_speed=speed)
-            else:
-                # 减速：通过改变帧率实现
-                # 先改变帧率（不改变播放速度）
-                new_frame_rate = int(audio.frame_rate * speed)
-                adjusted_audio = audio._spawn(audio.raw_data, overrides={
-                    "frame_rate": new_frame_rate
-                })
-                # 然后重新采样回原始帧率
-                adjusted_audio = adjusted_audio.set_frame_rate(audio.frame_rate)
+            adjusted = wsola(samples, speed, frame_rate, quality or self.time_stretch_quality)
 
             # 确定输出文件
             if output_file is None:
                 output_file = audio_file
 
             # 保存调整后的音频
-            adjusted_audio.export(output_file, format="wav")
+            write_wav(output_file, float_to_pcm(adjusted, sample_width), channels, sample_width, frame_rate)
 
             logger.info(f"速度调整完成: {output_file}")
             return {"success": True, "output": output_file}
@@ -175,9 +187,24 @@ class TTSService:
             emo_random: 是否随机情感
 
         返回:
-            dict: {'success': bool, 'output': str, 'error': str}
+            dict: {'success': bool, 'output': str, 'loudness': dict, 'timing': dict, 'error': str,
+                   'spans': 各阶段耗时（秒），见 metrics.LINE_STAGES}
         """
+        timer = StageTimer()
+        result = self._generate(timer, server_url, text, spk_audio_file, output_file, speed, emo_control_method,
+                                emo_ref_file, emo_weight, emo_vec, emo_text, emo_random)
+        result['spans'] = timer.rounded()
+        spans = ', '.join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in result['spans'].items())
+        # spans 同时绑定到日志记录上，序列化输出（serialize=True）时可直接解析
+        logger.bind(spans=result['spans']).info(
+            f"配音耗时 [{'ok' if result['success'] else 'failed'}] {Path(output_file).name}: {spans}")
+        return result
+
+    def _generate(self, timer: StageTimer, server_url: str, text: str, spk_audio_file: str, output_file: str,
+                  speed: float, emo_control_method: int, emo_ref_file: str, emo_weight: float, emo_vec: list,
+                  emo_text: str, emo_random: bool) -> dict:
         try:
+            started = time.perf_counter()
             # 检查参考音频文件是否存在
             if not Path(spk_audio_file).exists():
                 error_msg = f"参考音频文件不存在: {spk_audio_file}"
@@ -215,43 +242,61 @@ class TTSService:
             if emo_text and emo_control_method == 3:
                 payload["emo_text"] = emo_text
 
+            body = json.dumps(payload).encode('utf-8')
+            timer.add('encode', time.perf_counter() - started)
+
             logger.info(f"发送 TTS 请求到: {server_url}")
             logger.debug(f"文本长度: {len(text)} 字符")
             logger.debug(f"情感控制方式: {emo_control_method}")
 
-            # 发送请求
-            response = requests.post(server_url, json=payload, timeout=60)
+            # 发送请求：收到响应头时请求已上传完、服务端已处理完，之后读取响应体为下载
+            started = time.perf_counter()
+            response = requests.post(server_url, data=body, headers={'Content-Type': 'application/json'},
+                                     timeout=60, stream=True)
+            request_seconds = time.perf_counter() - started
+            reported = server_seconds(response.headers)
+            if reported is not None and reported <= request_seconds:
+                timer.add('upload', request_seconds - reported)
+                timer.add('server', reported)
+            else:
+                # 服务端没有报告处理耗时，上传和处理无法区分，全部计入 server
+                timer.add('server', request_seconds)
+            with timer.span('download'):
+                content = response.content
 
             if response.status_code == 200:
                 # 确保输出目录存在
                 output_path = Path(output_file)
                 output_path.parent.mkdir(parents=True, exist_ok=True)
 
-                # 保存音频文件
-                with open(output_file, "wb") as f:
-                    f.write(response.content)
-
-                logger.info(f"音频已保存到: {output_file}")
-
-                # 后处理：删除开头静音
-                trim_result = self.trim_leading_silence(output_file)
-                if not trim_result["success"]:
-                    logger.warning(f"静音处理失败: {trim_result.get('error')}")
-                    # 静音处理失败不影响整体流程，继续执行
-
-                # 如果需要调整语速
-                if speed != 1.0:
-                    logger.info(f"开始调整语速: {speed}x")
-                    speed_result = self.adjust_speed(output_file, speed)
-                    if not speed_result["success"]:
-                        logger.error(f"语速调整失败: {speed_result.get('error')}")
-                        return {
-                            "success": False,
-                            "error": f"音频生成成功但语速调整失败: {speed_result.get('error')}"
-                        }
-                    logger.info(f"语速调整完成: {speed}x")
-
-                return {"success": True, "output": str(output_file)}
+                # 后处理：删除开头静音、调整语速，在工作进程中完成并写出文件
+                try:
+                    started = time.perf_counter()
+                    processed = self.workers.process_speech(
+                        content, str(output_file), speed, self.time_stretch_quality
+                    )
+                    postprocess_seconds = time.perf_counter() - started
+                except Exception as e:
+                    # 未变速/未转换的音频不能当作完成的配音，删掉可能写了一半的文件，整条标记为失败
+                    logger.exception(f"音频后处理失败: {e}")
+                    output_path.unlink(missing_ok=True)
+                    return {"success": False, "error": f"音频生成成功但后处理失败: {str(e)}"}
+
+                # 工作进程内各阶段之外的时间为排队等待和进程间传递
+                for stage, seconds in processed['spans'].items():
+                    timer.add(stage, seconds)
+                timer.add('queue', postprocess_seconds - sum(processed['spans'].values()))
+
+                logger.info(f"音频已保存到: {output_file} "
+                            f"(裁剪开头静音 {processed['trimmed_ms']}ms, 语速 {speed}x)")
+                return {
+                    "success": True,
+                    "output": str(output_file),
+                    "loudness": processed['loudness'],
+                    # 精确的采样数，导出字幕时不需要再读音频
+                    "timing": record_timing(str(output_file), processed['frames'], processed['frame_rate'],
+                                            processed['checksum'])
+                }
             else:
                 error_msg = f"TTS 请求失败 (HTTP {response.status_code})"
                 try:
@@ -0,0 +1,350 @@
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from loguru import logger
+
+from backend.acoustic_features import load_mono
+
+# 嵌入算法调整后递增，旧索引会被整体重建
+EMBEDDING_VERSION = 1
+
+SAMPLE_RATE = 16000
+FRAME_LEN = 400  # 25ms
+HOP = 160  # 10ms
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 20
+EMBEDDING_DIM = 2 * (N_MFCC - 1)
+
+# 少于此数量的文件直接在当前线程计算，不值得启动进程池
+POOL_THRESHOLD = 8
+
+# 标准化时加在各维标准差上，避免除以 0
+STD_EPS = 1e-6
+
+
+def _mel_filterbank(sample_rate: int = SAMPLE_RATE, n_fft: int = N_FFT, n_mels: int = N_MELS) -> np.ndarray:
+    """三角形 mel 滤波器组 (n_mels, n_fft // 2 + 1)"""
+    def hz_to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    def mel_to_hz(mel):
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    mel_points = np.linspace(hz_to_mel(60), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+    bank = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for i in range(n_mels):
+        left, center, right = bins[i], bins[i + 1], bins[i + 2]
+        if center > left:
+            bank[i, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            bank[i, center:right] = (right - np.arange(center, right)) / (right - center)
+    return bank
+
+
+def _dct_matrix(n_out: int = N_MFCC, n_in: int = N_MELS) -> np.ndarray:
+    """DCT-II 矩阵 (n_out, n_in)"""
+    k = np.arange(n_out)[:, None]
+    n = np.arange(n_in)[None, :]
+    return np.cos(np.pi * k * (2 * n + 1) / (2 * n_in)).astype(np.float32)
+
+
+MEL_BANK = _mel_filterbank()
+DCT = _dct_matrix()
+
+
+def compute_embedding(file_path: str, max_seconds: float = 20.0) -> np.ndarray:
+    """
+    计算音色嵌入：有声帧 MFCC（去掉与音量相关的 c0）的均值和标准差
+
+    在进程池中运行，返回 float32 向量 (EMBEDDING_DIM,)。
+    """
+    samples = load_mono(file_path, SAMPLE_RATE, max_seconds)
+    if len(samples) < FRAME_LEN:
+        samples = np.pad(samples, (0, FRAME_LEN - len(samples)))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_LEN)[::HOP]
+
+    power = np.abs(np.fft.rfft(frames * np.hanning(FRAME_LEN), n=N_FFT, axis=1)) ** 2
+    log_mel = np.log(power @ MEL_BANK.T + 1e-10)
+    mfcc = log_mel @ DCT.T
+
+    # 只保留较响的帧，避免静音段拉偏统计
+    energy = log_mel.mean(axis=1)
+    active = energy > energy.max() - 8
+    if np.count_nonzero(active) >= 10:
+        mfcc = mfcc[active]
+    coeffs = mfcc[:, 1:]
+    return np.concatenate([coeffs.mean(axis=0), coeffs.std(axis=0)]).astype(np.float32)
+
+
+def _safe_embedding(file_path: str) -> Optional[np.ndarray]:
+    try:
+        return compute_embedding(file_path)
+    except Exception as e:
+        logger.warning(f"Failed to embed {file_path}: {e}")
+        return None
+
+
+class NotEnoughVoicesError(Exception):
+    """索引中可比较的音色不足，无法排序相似度"""
+
+
+class VoiceIndex:
+    """参考音音色相似度索引
+
+    每个文件一行嵌入向量，保存为 voice_index.npy（float32 矩阵），
+    对应的路径/大小/mtime 保存在 voice_index.json，两者按行对齐。
+    同步目录时只为新增或变化的文件计算嵌入，已删除的文件移除对应行。
+    查询时对按维度标准化并归一化后的矩阵做一次矩阵-向量乘法，10 万条约几毫秒。
+    """
+
+    def __init__(self, config_dir: Optional[Path] = None, num_workers: int = 0):
+        if config_dir is None:
+            config_dir = Path.home() / ".config" / "hetang_dubbing"
+        self.config_dir = Path(config_dir)
+        self.config_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_file = self.config_dir / "voice_index.npy"
+        self.meta_file = self.config_dir / "voice_index.json"
+        self.num_workers = num_workers
+        self._lock = threading.Lock()
+        self._paths: list[str] = []
+        self._stamps: list[list[int]] = []  # [size, mtime_ns]
+        self._rows: dict[str, int] = {}
+        self._vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._normalized: Optional[tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._dirty = False
+        self.is_running = False
+        self.should_stop = False
+        self._load()
+
+    def _load(self):
+        """加载索引（版本或行数不一致时丢弃）"""
+        if not self.meta_file.exists() or not self.vectors_file.exists():
+            return
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            vectors = np.load(self.vectors_file)
+            if meta.get('version') != EMBEDDING_VERSION or len(meta['paths']) != len(vectors):
+                logger.info("Voice index is outdated, it will be rebuilt")
+                return
+            self._paths = meta['paths']
+            self._stamps = meta['stamps']
+            self._vectors = vectors.astype(np.float32, copy=False)
+            self._rows = {p: i for i, p in enumerate(self._paths)}
+        except Exception as e:
+            logger.error(f"Failed to load voice index: {e}")
+
+    def save(self):
+        """保存索引（原子替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            meta = {'version': EMBEDDING_VERSION, 'paths': list(self._paths), 'stamps': list(self._stamps)}
+            vectors = self._vectors
+            self._dirty = False
+        try:
+            tmp_vectors = self.vectors_file.with_suffix('.tmp.npy')
+            np.save(tmp_vectors, vectors)
+            tmp_meta = self.meta_file.with_suffix('.json.tmp')
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_vectors, self.vectors_file)
+            os.replace(tmp_meta, self.meta_file)
+        except Exception as e:
+            logger.error(f"Failed to save voice index: {e}")
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def _embed_many(self, paths: list[str], on_progress: Optional[Callable[[int], None]] = None) -> list:
+        """批量计算嵌入，文件较多时使用进程池"""
+        if len(paths) < POOL_THRESHOLD:
+            results = []
+            for i, path in enumerate(paths):
+                if self.should_stop:
+                    break
+                results.append(_safe_embedding(path))
+                if on_progress:
+                    on_progress(i + 1)
+            return results
+
+        results = []
+        with ProcessPoolExecutor(max_workers=self.num_workers or None) as executor:
+            for i, vector in enumerate(executor.map(_safe_embedding, paths, chunksize=16)):
+                if self.should_stop:
+                    executor.shutdown(cancel_futures=True)
+                    break
+                results.append(vector)
+                if on_progress:
+                    on_progress(i + 1)
+        return results
+
+    def _set_rows(self, items: list[tuple[str, list[int], np.ndarray]]):
+        """写入或替换若干行（调用方持有锁）"""
+        if not items:
+            return
+        appended = []
+        for path, stamp, vector in items:
+            row = self._rows.get(path)
+            if row is None:
+                self._rows[path] = len(self._paths) + len(appended)
+                appended.append((path, stamp, vector))
+            else:
+                self._stamps[row] = stamp
+                self._vectors[row] = vector
+        if appended:
+            self._paths.extend(p for p, _, _ in appended)
+            self._stamps.extend(s for _, s, _ in appended)
+            self._vectors = np.vstack([self._vectors, np.stack([v for _, _, v in appended])])
+        self._normalized = None
+        self._dirty = True
+
+    def _remove_rows(self, paths: list[str]):
+        """删除若干行（调用方持有锁）"""
+        rows = sorted(self._rows.pop(p) for p in paths if p in self._rows)
+        if not rows:
+            return
+        keep = np.ones(len(self._paths), dtype=bool)
+        keep[rows] = False
+        self._paths = [p for p, k in zip(self._paths, keep) if k]
+        self._stamps = [s for s, k in zip(self._stamps, keep) if k]
+        self._vectors = self._vectors[keep]
+        self._rows = {p: i for i, p in enumerate(self._paths)}
+        self._normalized = None
+        self._dirty = True
+
+    def update_files(self, paths: list[str], on_progress: Optional[Callable[[int], None]] = None) -> int:
+        """为新增或变化（大小/mtime 不同）的文件计算嵌入，返回更新的文件数"""
+        changed: list[tuple[str, list[int]]] = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp = [st.st_size, st.st_mtime_ns]
+            with self._lock:
+                row = self._rows.get(path)
+                if row is not None and self._stamps[row] == stamp:
+                    continue
+            changed.append((path, stamp))
+
+        vectors = self._embed_many([p for p, _ in changed], on_progress)
+        items = [(p, s, v) for (p, s), v in zip(changed, vectors) if v is not None]
+        with self._lock:
+            self._set_rows(items)
+        return len(items)
+
+    def remove_files(self, paths: list[str]):
+        """移除文件"""
+        with self._lock:
+            self._remove_rows(paths)
+
+    def rename_file(self, old_path: str, new_path: str):
+        """文件改名时沿用原有嵌入"""
+        with self._lock:
+            if old_path not in self._rows:
+                return
+            if new_path in self._rows:
+                self._remove_rows([new_path])
+            row = self._rows.pop(old_path)
+            self._paths[row] = new_path
+            self._rows[new_path] = row
+            self._dirty = True
+
+    def sync_directory(self, root: str, files: list[str],
+                       on_progress: Optional[Callable[[int, int], None]] = None) -> dict:
+        """
+        把 root 下的索引同步为 files：移除已不存在的文件，只为新增或变化的文件计算嵌入
+
+        返回:
+            dict: {'total', 'updated', 'removed'}
+        """
+        self.is_running = True
+        self.should_stop = False
+        try:
+            prefix = os.path.join(root, '')
+            wanted = set(files)
+            with self._lock:
+                stale = [p for p in self._paths if p.startswith(prefix) and p not in wanted]
+                self._remove_rows(stale)
+
+            total = len(files)
+            updated = self.update_files(files, on_progress and (lambda done: on_progress(done, total)))
+            self.save()
+        finally:
+            self.is_running = False
+        logger.info(f"Voice index synced for {root}: {updated} updated, {len(stale)} removed, {len(self)} total")
+        return {'total': total, 'updated': updated, 'removed': len(stale)}
+
+    def stop(self):
+        """停止同步"""
+        self.should_stop = True
+
+    def _normalized_matrix(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """按维度标准化后 L2 归一化的矩阵及标准化参数（调用方持有锁，结果缓存到下次修改）"""
+        if self._normalized is None:
+            mean = self._vectors.mean(axis=0)
+            std = self._vectors.std(axis=0) + STD_EPS
+            matrix = (self._vectors - mean) / std
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            self._normalized = (matrix.astype(np.float32), mean, std)
+        return self._normalized
+
+    def find_similar(self, audio_path: str, k: int = 10, root: str = "") -> list[dict]:
+        """
+        查找音色最相近的参考音
+
+        参数:
+            audio_path: 查询音频（不在索引中时现场计算嵌入）
+            k: 返回条数
+            root: 只返回该目录下的文件（为空时不限制）
+
+        返回:
+            list[dict]: [{'path': 完整路径, 'score': 余弦相似度}]，按相似度降序，不含查询文件本身
+
+        索引中少于 2 条或所有向量都相同（无法标准化，相似度没有意义）时抛出 NotEnoughVoicesError。
+        """
+        with self._lock:
+            if len(self._paths) < 2:
+                raise NotEnoughVoicesError(f"Voice index has {len(self._paths)} voice(s), "
+                                 f"build it for a directory with at least 2 reference audios first")
+            row = self._rows.get(audio_path)
+            query = self._vectors[row] if row is not None else None
+        if query is None:
+            query = compute_embedding(audio_path)
+
+        with self._lock:
+            matrix, mean, std = self._normalized_matrix()
+            if np.all(std <= 2 * STD_EPS):
+                raise NotEnoughVoicesError("All voices in the voice index are identical, similarity cannot be ranked")
+            paths = self._paths
+            q = (query - mean) / std
+            q /= np.linalg.norm(q) + 1e-12
+            scores = matrix @ q.astype(np.float32)
+
+            # 多取一些候选以便排除查询文件本身和 root 之外的文件
+            want = min(len(scores), k + 1 if not root else max(4 * k, 64))
+            candidates = np.argpartition(-scores, want - 1)[:want]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            if root:
+                prefix = os.path.join(root, '')
+                if sum(paths[i].startswith(prefix) for i in candidates) < k + 1:
+                    candidates = np.argsort(-scores)
+
+        results = []
+        prefix = os.path.join(root, '') if root else ''
+        for i in candidates:
+            path = paths[i]
+            if path == audio_path or not path.startswith(prefix):
+                continue
+            results.append({'path': path, 'score': round(float(scores[i]), 4)})
+            if len(results) >= k:
+                break
+        return results
@@ -0,0 +1,127 @@
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# 只读取文件头时最多看这么多字节（fmt 之前可能有 LIST/JUNK 等块）
+HEADER_READ_LIMIT = 1 << 16
+
+
+@dataclass
+class WavInfo:
+    """WAV 文件头信息"""
+    channels: int
+    sample_width: int
+    frame_rate: int
+    frames: int
+    data_offset: int
+    format_tag: int
+    truncated: bool = False  # 实际数据比文件头声明的短（写入被中断）
+
+    @property
+    def duration_ms(self) -> int:
+        return self.frames * 1000 // self.frame_rate if self.frame_rate else 0
+
+    @property
+    def is_int_pcm(self) -> bool:
+        """是否为可以直接映射的 8/16/32 位整数 PCM"""
+        return self.format_tag == WAVE_FORMAT_PCM and self.sample_width in (1, 2, 4)
+
+
+def read_wav_header(file_path: str) -> Optional[WavInfo]:
+    """
+    只解析 RIFF/WAVE 文件头，不读取采样数据
+
+    返回:
+        WavInfo，文件不是可识别的 WAV 时返回 None
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            file_size = f.seek(0, 2)
+            f.seek(0)
+            riff = f.read(12)
+            if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+                return None
+
+            fmt = None
+            while f.tell() < min(file_size, HEADER_READ_LIMIT):
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, chunk_size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+                if chunk_id == b'fmt ':
+                    body = f.read(chunk_size)
+                    if len(body) < 16:
+                        return None
+                    format_tag, channels, frame_rate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+                    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        # 子格式 GUID 的前两个字节即实际格式
+                        format_tag = struct.unpack('<H', body[24:26])[0]
+                    fmt = (format_tag, channels, frame_rate, block_align, bits)
+                    f.seek(chunk_size & 1, 1)
+                elif chunk_id == b'data':
+                    if fmt is None or not fmt[1] or not fmt[3]:
+                        return None
+                    format_tag, channels, frame_rate, block_align, bits = fmt
+                    data_offset = f.tell()
+                    # 流式写出的 WAV 可能把 data 大小写成 0 或 0xFFFFFFFF，以实际文件长度为准
+                    available = file_size - data_offset
+                    streamed = chunk_size in (0, 0xFFFFFFFF)
+                    data_size = available if streamed else min(chunk_size, available)
+                    return WavInfo(
+                        channels=channels,
+                        sample_width=block_align // channels,
+                        frame_rate=frame_rate,
+                        frames=data_size // block_align,
+                        data_offset=data_offset,
+                        format_tag=format_tag,
+                        truncated=(not streamed and chunk_size > available) or data_size % block_align != 0
+                    )
+                else:
+                    f.seek(chunk_size + (chunk_size & 1), 1)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+def wav_duration_ms(file_path: str) -> Optional[int]:
+    """只读文件头得到时长（毫秒），不是 WAV 时返回 None"""
+    info = read_wav_header(file_path)
+    return info.duration_ms if info else None
+
+
+def open_wav(file_path: str) -> Optional[tuple[WavInfo, np.ndarray]]:
+    """
+    内存映射整数 PCM WAV 的采样数据
+
+    返回:
+        (WavInfo, 只读数组 (采样数, 声道数))，数组直接映射文件内容，不复制；
+        8 位 WAV 为无符号数据。不是整数 PCM WAV 时返回 None
+    """
+    info = read_wav_header(file_path)
+    if info is None or not info.is_int_pcm:
+        return None
+    dtype = {1: np.uint8, 2: '<i2', 4: '<i4'}[info.sample_width]
+    if info.frames == 0:
+        return info, np.zeros((0, info.channels), dtype=dtype)
+    samples = np.memmap(file_path, dtype=dtype, mode='r', offset=info.data_offset,
+                        shape=(info.frames, info.channels))
+    return info, samples
+
+
+def read_wav_float(file_path: str) -> Optional[tuple[WavInfo, np.ndarray]]:
+    """读取整数 PCM WAV 为 float32 数组 (采样数, 声道数)，取值 -1~1；不是整数 PCM WAV 时返回 None"""
+    opened = open_wav(file_path)
+    if opened is None:
+        return None
+    info, pcm = opened
+    samples = pcm.astype(np.float32)
+    if info.sample_width == 1:
+        samples -= 128.0
+    samples /= float(1 << (8 * info.sample_width - 1))
+    return info, samples
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# 文件格式变化时递增，旧的 sidecar 会被重新生成
+PEAKS_VERSION = 2
+PEAKS_MAGIC = b'HTPK'
+# magic, 版本, 采样率, 总采样数, 源文件大小, 源文件修改时间（纳秒）, 最细一级每格采样数, 相邻级别倍数, 级别数
+HEADER = struct.Struct('<4sHIQQQIHH')
+
+BASE_SAMPLES = 64  # 最细一级每格 64 个采样（24kHz 时约 2.7ms）
+LEVEL_FACTOR = 4
+MIN_BINS = 16  # 格数少于这个值时不再生成更粗的级别
+
+SIDECAR_SUFFIX = '.peaks'
+
+
+@dataclass
+class PeakLevel:
+    samples_per_bin: int
+    data: np.ndarray  # int8 (格数, 2)，每格的最小值和最大值，-127~127
+
+
+@dataclass
+class Peaks:
+    frame_rate: int
+    frames: int
+    levels: list[PeakLevel]
+
+    @property
+    def duration_ms(self) -> int:
+        return self.frames * 1000 // self.frame_rate if self.frame_rate else 0
+
+    def select(self, bins: int, start_frame: int = 0, end_frame: Optional[int] = None) -> PeakLevel:
+        """
+        为指定的显示宽度选取峰值
+
+        选每格采样数不超过 (范围采样数 / bins) 的最粗级别，截取范围内的格，
+        再合并相邻格使格数不超过 bins。
+        """
+        end_frame = self.frames if end_frame is None else min(end_frame, self.frames)
+        start_frame = max(0, min(start_frame, end_frame))
+        span = max(end_frame - start_frame, 1)
+        bins = max(1, bins)
+
+        level = self.levels[0]
+        for candidate in self.levels:
+            if candidate.samples_per_bin * bins <= span:
+                level = candidate
+        data = level.data[start_frame // level.samples_per_bin:-(-end_frame // level.samples_per_bin)]
+
+        group = -(-len(data) // bins)
+        if group > 1:
+            data = _reduce(data, group)
+        return PeakLevel(level.samples_per_bin * max(group, 1), data)
+
+
+def _reduce(data: np.ndarray, group: int) -> np.ndarray:
+    """每 group 格合并为一格（最小取最小，最大取最大）"""
+    n = -(-len(data) // group)
+    padded = np.concatenate([data, np.repeat(data[-1:], n * group - len(data), axis=0)])
+    grouped = padded.reshape(n, group, 2)
+    return np.stack([grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)], axis=1)
+
+
+def compute_peaks(samples: np.ndarray, frame_rate: int) -> Peaks:
+    """
+    计算多分辨率最小/最大峰值（所有声道合并）
+
+    参数:
+        samples: float32 数组 (采样数, 声道数)，取值 -1~1
+        frame_rate: 采样率
+    """
+    frames = len(samples)
+    if frames == 0:
+        return Peaks(frame_rate, 0, [PeakLevel(BASE_SAMPLES, np.zeros((0, 2), dtype=np.int8))])
+
+    n = -(-frames // BASE_SAMPLES)
+    padded = np.zeros((n * BASE_SAMPLES, samples.shape[1]), dtype=np.float32)
+    padded[:frames] = samples
+    blocks = padded.reshape(n, -1)
+    base = np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1)
+    levels = [PeakLevel(BASE_SAMPLES, np.clip(np.round(base * 127), -127, 127).astype(np.int8))]
+
+    while len(levels[-1].data) >= MIN_BINS * LEVEL_FACTOR:
+        previous = levels[-1]
+        levels.append(PeakLevel(previous.samples_per_bin * LEVEL_FACTOR, _reduce(previous.data, LEVEL_FACTOR)))
+    return Peaks(frame_rate, frames, levels)
+
+
+def write_peaks(sidecar_path: str, peaks: Peaks, source_path: str):
+    """写出峰值 sidecar，记录源文件大小和修改时间用于判断是否过期"""
+    stat = os.stat(source_path)
+    tmp_path = f"{sidecar_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, peaks.frame_rate, peaks.frames,
+                            stat.st_size, stat.st_mtime_ns, BASE_SAMPLES, LEVEL_FACTOR, len(peaks.levels)))
+        f.write(struct.pack(f'<{len(peaks.levels)}I', *(len(level.data) for level in peaks.levels)))
+        for level in peaks.levels:
+            f.write(level.data.tobytes())
+    os.replace(tmp_path, sidecar_path)
+
+
+def read_peaks(sidecar_path: str, source_path: Optional[str] = None) -> Optional[Peaks]:
+    """读取 sidecar；文件不存在、格式不对或（给出 source_path 时）源文件已变化则返回 None"""
+    try:
+        with open(sidecar_path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return None
+            magic, version, frame_rate, frames, size, mtime, base, factor, n_levels = HEADER.unpack(header)
+            if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+                return None
+            if source_path is not None:
+                stat = os.stat(source_path)
+                if stat.st_size != size or stat.st_mtime_ns != mtime:
+                    return None
+            counts = struct.unpack(f'<{n_levels}I', f.read(4 * n_levels))
+            data = np.frombuffer(f.read(), dtype=np.int8)
+    except (OSError, struct.error):
+        return None
+
+    if 2 * sum(counts) != len(data):
+        return None
+    levels = []
+    offset = 0
+    samples_per_bin = base
+    for count in counts:
+        levels.append(PeakLevel(samples_per_bin, data[offset:offset + 2 * count].reshape(-1, 2)))
+        offset += 2 * count
+        samples_per_bin *= factor
+    return Peaks(frame_rate, frames, levels)
+
+
+def compute_peaks_file(source_path: str, sidecar_path: str) -> dict:
+    """解码文件并写出峰值 sidecar（在进程池中运行）"""
+    from backend.audio_workers import load_pcm
+    from backend.time_stretch import pcm_to_float
+
+    pcm, channels, sample_width, frame_rate = load_pcm(source_path)
+    samples = pcm_to_float(pcm, sample_width, channels)
+    del pcm
+    peaks = compute_peaks(samples, frame_rate)
+    write_peaks(sidecar_path, peaks, source_path)
+    return {'frames': peaks.frames, 'levels': len(peaks.levels)}
+
+
+class PeakStore:
+    """
+    波形峰值 sidecar 的存取
+
+    生成的配音在写出时由工作进程在同目录写 <文件名>.peaks；
+    参考音所在目录不一定可写，峰值统一放在 ~/.config/hetang_dubbing/peaks/ 下，按路径哈希命名。
+    """
+
+    def __init__(self, config_dir: Optional[Path] = None):
+        if config_dir is None:
+            config_dir = Path.home() / ".config" / "hetang_dubbing"
+        self.cache_dir = Path(config_dir) / "peaks"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def sidecar_for(audio_path: str) -> str:
+        """同目录 sidecar 路径"""
+        return audio_path + SIDECAR_SUFFIX
+
+    def cache_path_for(self, audio_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(audio_path).encode('utf-8')).hexdigest()
+        return str(self.cache_dir / f"{key}{SIDECAR_SUFFIX}")
+
+    def get(self, audio_path: str) -> Optional[Peaks]:
+        """读取有效的峰值（同目录优先，其次缓存目录），没有时返回 None"""
+        return (read_peaks(self.sidecar_for(audio_path), audio_path)
+                or read_peaks(self.cache_path_for(audio_path), audio_path))
+
+    def target_for(self, audio_path: str, adjacent: bool = False) -> str:
+        """新生成峰值的写入位置：要求同目录或同目录已有 sidecar 时写同目录，否则写到缓存目录"""
+        sidecar = self.sidecar_for(audio_path)
+        return sidecar if adjacent or os.path.exists(sidecar) else self.cache_path_for(audio_path)
+
+    def remove(self, audio_paths: list[str]):
+        """删除音频对应的峰值（缓存目录和同目录的 sidecar）"""
+        for path in audio_paths:
+            for sidecar in (self.cache_path_for(path), self.sidecar_for(path)):
+                try:
+                    os.remove(sidecar)
+                except OSError:
+                    pass
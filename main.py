@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import sys
 import webview
@@ -63,4 +64,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序使用进程池时需要
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,47 @@
+import json
+import unittest
+from pathlib import Path
+
+from backend.analysis_parser import parse_age, parse_analysis, parse_analysis_json
+
+FIXTURES = Path(__file__).parent / "fixtures" / "analysis_responses.json"
+FIELDS = ('name', 'age', 'gender', 'type', 'tags', 'description')
+
+
+class ParseAnalysisCorpusTest(unittest.TestCase):
+    """按固定语料逐条比对解析结果"""
+
+    def test_corpus(self):
+        cases = json.loads(FIXTURES.read_text(encoding='utf-8'))
+        for case in cases:
+            parse = parse_analysis_json if case['format'] == 'json' else parse_analysis
+            with self.subTest(case['id']):
+                self.assertEqual(dict(zip(FIELDS, parse(case['response']))), case['expected'])
+
+
+class ParseAgeTest(unittest.TestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_age("5-7岁"), "5-7岁")
+        self.assertEqual(parse_age("13~18岁"), "13-18岁")
+        self.assertEqual(parse_age("18至25岁"), "18-25岁")
+        self.assertEqual(parse_age("25 - 35 岁"), "25-35岁")
+
+    def test_single_age_on_band_boundary(self):
+        self.assertEqual(parse_age("男，18岁"), "18-25岁")
+        self.assertEqual(parse_age("25岁"), "25-35岁")
+        self.assertEqual(parse_age("12岁"), "8-12岁")
+
+    def test_age_above(self):
+        self.assertEqual(parse_age("50岁以上"), "50岁+")
+        self.assertEqual(parse_age("35+"), "35-50岁")
+
+    def test_words(self):
+        self.assertEqual(parse_age("青年男性"), "18-25岁")
+        # 同时出现时按词表优先级，而不是出现顺序
+        self.assertEqual(parse_age("小孩口吻的老人"), "50岁+")
+        self.assertEqual(parse_age("无法判断"), "未知")
+
+
+if __name__ == '__main__':
+    unittest.main()
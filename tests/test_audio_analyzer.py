@@ -0,0 +1,55 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.audio_service import AnalyzerSettings, AudioAnalyzer
+
+
+class AbandonedWorkersTest(unittest.TestCase):
+    """停止超时后被放弃的工作线程退出之前，不能开始新的运行"""
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self._dir.name)
+        self.files = [str(self.dir / f"{i}.wav") for i in range(2)]
+        settings = AnalyzerSettings(base_url='http://127.0.0.1:9', api_key='test', num_workers=1,
+                                    stop_timeout=0.1)
+        self.analyzer = AudioAnalyzer(settings)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_refuses_to_start_until_stale_workers_exit(self):
+        release = threading.Event()
+        entered = threading.Event()
+
+        def stuck(file_path, index, total):
+            # 模拟停止时无法中断的请求
+            entered.set()
+            release.wait(5)
+            return None
+
+        with mock.patch.object(self.analyzer, 'process_single_file', side_effect=stuck):
+            run = threading.Thread(target=self.analyzer.start_analysis,
+                                   args=(str(self.dir), str(self.dir / 'a.csv')), kwargs={'files': self.files})
+            run.start()
+            self.assertTrue(entered.wait(5))
+            self.analyzer.stop_analysis()
+            run.join(5)
+            self.assertFalse(run.is_alive())
+
+            self.assertFalse(self.analyzer.is_running)
+            self.assertTrue(self.analyzer.workers_alive)
+            with self.assertRaises(RuntimeError):
+                self.analyzer.start_analysis(str(self.dir), str(self.dir / 'b.csv'), files=self.files)
+
+            release.set()
+            for thread in self.analyzer._threads:
+                thread.join(5)
+            self.assertFalse(self.analyzer.workers_alive)
+
+
+if __name__ == '__main__':
+    unittest.main()
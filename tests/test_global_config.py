@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.global_config import GlobalConfig
+
+
+class GlobalConfigFlushTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.config_dir = Path(self._dir.name)
+        # 延迟足够长，测试期间后台定时器不会自己写盘
+        self.config = GlobalConfig(self.config_dir, flush_delay=60)
+
+    def tearDown(self):
+        self.config.flush()
+        self._dir.cleanup()
+
+    def _count_writes(self):
+        return mock.patch('backend.global_config.os.replace', wraps=os.replace)
+
+    def test_flush_writes_once_and_clears_dirty(self):
+        self.config.add_favorite('a.wav')
+        with self._count_writes() as replace:
+            self.config.flush()
+            self.config.flush()
+        self.assertEqual(replace.call_count, 1)
+        self.assertFalse(self.config._dirty)
+        saved = json.loads((self.config_dir / 'config.json').read_text(encoding='utf-8'))
+        self.assertEqual(saved['favorites'], ['a.wav'])
+
+    def test_empty_batch_does_not_write(self):
+        self.config.add_favorite('a.wav')
+        self.config.flush()
+        with self._count_writes() as replace:
+            with self.config.batch():
+                pass
+            self.config.flush()
+        replace.assert_not_called()
+
+    def test_batch_writes_once_at_end(self):
+        with self._count_writes() as replace:
+            with self.config.batch():
+                self.config.add_favorite('a.wav')
+                self.config.set_note('a.wav', '旁白')
+                with self.config.batch():
+                    self.config.set_tags('a.wav', ['温柔'])
+                self.assertEqual(replace.call_count, 0)
+        self.assertEqual(replace.call_count, 1)
+        reloaded = GlobalConfig(self.config_dir, flush_delay=60)
+        self.assertEqual(reloaded.get_tags('a.wav'), ['温柔'])
+        self.assertEqual(reloaded.get_note('a.wav'), '旁白')
+
+    def test_unchanged_value_does_not_mark_dirty(self):
+        self.config.set_note('a.wav', '旁白')
+        self.config.flush()
+        self.config.set_note('a.wav', '旁白')
+        self.assertFalse(self.config._dirty)
+
+    def test_failed_write_keeps_changes(self):
+        self.config.add_favorite('a.wav')
+        with mock.patch('backend.global_config.os.replace', side_effect=OSError('disk full')):
+            self.config.flush()
+        self.assertTrue(self.config._dirty)
+        self.config.flush()
+        self.assertFalse(self.config._dirty)
+        self.assertTrue((self.config_dir / 'config.json').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
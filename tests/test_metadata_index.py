@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.metadata_index import MetadataIndex
+
+
+class MetadataIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self._dir.name)
+        self.root = str(self.dir / 'refs')
+        self.index = MetadataIndex(self.dir)
+
+    def tearDown(self):
+        self.index.close()
+        self._dir.cleanup()
+
+    def _file(self, name: str, size: int = 100, mtime: int = 1, **meta) -> dict:
+        return {'fullPath': os.path.join(self.root, name), 'name': name, 'size': size, 'mtime': mtime, **meta}
+
+    def _paths(self) -> list[str]:
+        return sorted(r['name'] for r in self.index.search()['results'])
+
+    def test_upsert_prunes_missing_files(self):
+        self.index.upsert_clips(self.root, [self._file('a.wav'), self._file('b.wav')])
+        self.index.upsert_clips(self.root, [self._file('a.wav')])
+        self.assertEqual(self._paths(), ['a.wav'])
+        self.assertEqual(self.index.search('b.wav')['total'], 0)
+
+    def test_prune_only_touches_given_root(self):
+        other = {'fullPath': str(self.dir / 'other' / 'c.wav'), 'name': 'c.wav', 'size': 1, 'mtime': 1}
+        self.index.upsert_clips(str(self.dir / 'other'), [other])
+        self.index.upsert_clips(self.root, [self._file('a.wav')])
+        self.index.upsert_clips(self.root, [])
+        self.assertEqual(self._paths(), ['c.wav'])
+
+    def test_paged_upsert_prunes_after_last_page(self):
+        self.index.upsert_clips(self.root, [self._file('a.wav'), self._file('b.wav')])
+        self.index.upsert_clips(self.root, [self._file('c.wav')], prune=False)
+        self.assertEqual(self._paths(), ['a.wav', 'b.wav', 'c.wav'])
+        self.index.prune_clips(self.root, {self._file('a.wav')['fullPath'], self._file('c.wav')['fullPath']})
+        self.assertEqual(self._paths(), ['a.wav', 'c.wav'])
+
+    def test_unchanged_rows_are_skipped(self):
+        self.index.upsert_clips(self.root, [self._file('a.wav'), self._file('b.wav')])
+        with mock.patch.object(self.index, '_upsert_row', wraps=self.index._upsert_row) as upsert:
+            self.index.upsert_clips(self.root, [self._file('a.wav'), self._file('b.wav', mtime=2)])
+            self.index.upsert_clips(self.root, [self._file('a.wav', tags=['温柔']), self._file('b.wav', mtime=2)])
+        self.assertEqual([c.args[0] for c in upsert.call_args_list],
+                         [self._file('b.wav')['fullPath'], self._file('a.wav')['fullPath']])
+        self.assertEqual(self.index.search(filters={'tags': ['温柔']})['total'], 1)
+
+    def test_estimates_do_not_look_like_or_overwrite_analysis(self):
+        path = self._file('a.wav')['fullPath']
+        self.index.upsert_clips(self.root, [self._file('a.wav'), self._file('b.wav')])
+        estimate = {'gender': '女', 'age': '18-25岁', 'tags': ['明亮']}
+        self.index.prefill_estimates([(path, estimate)], self.root)
+
+        result = self.index.search('a.wav')['results'][0]
+        self.assertIsNone(result['analysis'])
+        self.assertEqual(result['estimate'], estimate)
+        self.assertEqual(result['tags'], [])
+        self.assertEqual(self.index.search(filters={'gender': '女'})['total'], 0)
+
+        analysis = {'name': '晨曦', 'age': '25-35岁', 'gender': '男', 'type': '配音', 'tags': ['低沉'],
+                    'description': '成年男声'}
+        self.index.upsert_analysis(path, analysis, self.root)
+        self.index.prefill_estimates([(path, estimate)], self.root)
+        result = self.index.search('a.wav')['results'][0]
+        self.assertEqual((result['analysis']['gender'], result['analysis']['age']), ('男', '25-35岁'))
+        self.assertEqual(result['tags'], ['低沉'])
+        self.assertEqual(self.index.search(filters={'gender': '男'})['total'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
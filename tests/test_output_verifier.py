@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from pydub import AudioSegment
+
+from backend.analysis_store import hash_file
+from backend.audio_workers import write_wav
+from backend.output_verifier import verify_output, verify_outputs
+from backend.subtitles import record_timing
+
+FRAME_RATE = 24000
+
+
+class VerifyOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self._dir.name)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _line(self, name: str = 'line.wav', frames: int = FRAME_RATE // 2) -> dict:
+        """写一条正常的配音并返回带 timing 的已完成任务"""
+        path = str(self.dir / name)
+        pcm = (np.sin(np.arange(frames) / 10) * 10000).astype(np.int16)
+        write_wav(path, pcm, 1, 2, FRAME_RATE)
+        return {
+            'index': 0,
+            'status': 'completed',
+            'outputFile': path,
+            'timing': record_timing(path, frames, FRAME_RATE, hash_file(path))
+        }
+
+    def test_valid(self):
+        self.assertIsNone(verify_output(self._line()))
+
+    def test_missing_file(self):
+        task = self._line()
+        os.remove(task['outputFile'])
+        self.assertEqual(verify_output(task), 'missing')
+        self.assertEqual(verify_output({'status': 'completed'}), 'missing')
+
+    def test_bad_header(self):
+        task = self._line()
+        with open(task['outputFile'], 'r+b') as f:
+            f.seek(12)
+            f.write(b'\0' * 24)  # 覆盖 fmt 块
+        self.assertEqual(verify_output(task), 'bad_header')
+
+    def test_truncated(self):
+        task = self._line()
+        size = os.path.getsize(task['outputFile'])
+        with open(task['outputFile'], 'r+b') as f:
+            f.truncate(size - 1000)
+        self.assertEqual(verify_output(task), 'truncated')
+
+    def test_empty(self):
+        task = self._line(frames=0)
+        self.assertEqual(verify_output(task), 'empty')
+
+    def test_length_mismatch(self):
+        task = self._line()
+        task['timing']['frames'] += 1
+        self.assertEqual(verify_output(task), 'length_mismatch')
+
+    def test_checksum_mismatch(self):
+        task = self._line()
+        with open(task['outputFile'], 'r+b') as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b'\x12\x34')  # 只改采样数据，文件头和长度不变
+        self.assertEqual(verify_output(task), 'checksum_mismatch')
+        self.assertIsNone(verify_output(task, check_checksum=False))
+
+    def test_non_wav_is_decoded(self):
+        path = str(self.dir / 'line.mp3')
+        with open(path, 'wb') as f:
+            f.write(b'ID3' + b'\0' * 100)
+        task = {'index': 0, 'status': 'completed', 'outputFile': path}
+        decoded = AudioSegment.silent(duration=500, frame_rate=FRAME_RATE)
+        with mock.patch.object(AudioSegment, 'from_file', return_value=decoded):
+            self.assertIsNone(verify_output(task))
+        with mock.patch.object(AudioSegment, 'from_file', side_effect=Exception('invalid data')):
+            self.assertEqual(verify_output(task), 'undecodable')
+
+    def test_verify_outputs_reports_only_problems_in_order(self):
+        good = self._line('a.wav')
+        missing = {**self._line('b.wav'), 'index': 2}
+        os.remove(missing['outputFile'])
+        broken = {**self._line('c.wav'), 'index': 1}
+        broken['timing']['frames'] = 1
+        pending = {'index': 3, 'status': 'pending', 'outputFile': str(self.dir / 'none.wav')}
+
+        invalid = verify_outputs([missing, good, pending, broken], max_workers=2)
+        self.assertEqual([(item['index'], item['issue']) for item in invalid],
+                         [(1, 'length_mismatch'), (2, 'missing')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from backend.audio_service import load_csv_results
+from backend.result_writer import ResultWriter, open_sinks
+
+
+def result(path: str, name: str = '晨曦') -> dict:
+    return {'name': name, 'path': path, 'age': '18-25岁', 'gender': '女', 'type': '配音',
+            'tags': ['明亮', '清脆'], 'description': '明亮清脆的年轻女声。'}
+
+
+class ResultWriterResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self._dir.name)
+        self.csv_path = str(self.dir / 'results.csv')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _run(self, results: list[dict], resume: bool):
+        writer = ResultWriter(open_sinks(self.csv_path, ['jsonl', 'sqlite'], resume=resume), flush_interval=60)
+        for r in results:
+            writer.write(r)
+        writer.close()
+
+    def _jsonl_paths(self) -> list[str]:
+        with open(self.dir / 'results.jsonl', encoding='utf-8') as f:
+            return [json.loads(line)['path'] for line in f]
+
+    def _sqlite_rows(self) -> list[tuple]:
+        conn = sqlite3.connect(self.dir / 'results.db')
+        try:
+            return conn.execute("SELECT path, name FROM results ORDER BY path").fetchall()
+        finally:
+            conn.close()
+
+    def test_close_writes_pending_results(self):
+        self._run([result('a.wav'), result('b.wav')], resume=False)
+        self.assertEqual(load_csv_results(self.csv_path), [result('a.wav'), result('b.wav')])
+        self.assertEqual(self._jsonl_paths(), ['a.wav', 'b.wav'])
+        self.assertEqual(self._sqlite_rows(), [('a.wav', '晨曦'), ('b.wav', '晨曦')])
+
+    def test_resume_appends_to_every_output(self):
+        self._run([result('a.wav')], resume=False)
+        self._run([result('b.wav'), result('a.wav', '暖阳')], resume=True)
+
+        with open(self.csv_path, encoding='utf-8') as f:
+            self.assertEqual(f.read().count('名称'), 1)  # 续写不重复表头
+        self.assertEqual([r['path'] for r in load_csv_results(self.csv_path)], ['a.wav', 'b.wav', 'a.wav'])
+        self.assertEqual(self._jsonl_paths(), ['a.wav', 'b.wav', 'a.wav'])
+        # SQLite 按路径去重，保留最新结果
+        self.assertEqual(self._sqlite_rows(), [('a.wav', '暖阳'), ('b.wav', '晨曦')])
+
+    def test_without_resume_replaces_previous_outputs(self):
+        self._run([result('a.wav')], resume=False)
+        self._run([result('b.wav')], resume=False)
+        self.assertEqual([r['path'] for r in load_csv_results(self.csv_path)], ['b.wav'])
+        self.assertEqual(self._jsonl_paths(), ['b.wav'])
+        self.assertEqual(self._sqlite_rows(), [('b.wav', '晨曦')])
+
+    def test_resume_of_empty_csv_writes_header(self):
+        open(self.csv_path, 'w').close()
+        self._run([result('a.wav')], resume=True)
+        self.assertEqual(load_csv_results(self.csv_path), [result('a.wav')])
+        self.assertTrue(os.path.exists(self.dir / 'results.jsonl'))
+
+
+if __name__ == '__main__':
+    unittest.main()
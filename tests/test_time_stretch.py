@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+from pydub import AudioSegment
+
+from backend.time_stretch import PRESETS, array_to_segment, segment_to_array, time_stretch, wsola
+
+FRAME_RATE = 24000
+
+
+def tone(freq: float, seconds: float = 1.0, channels: int = 1) -> np.ndarray:
+    t = np.arange(int(FRAME_RATE * seconds)) / FRAME_RATE
+    samples = (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.repeat(samples[:, None], channels, axis=1)
+
+
+def dominant_freq(samples: np.ndarray) -> float:
+    """取中间一段的主频（避开首尾的淡入淡出）"""
+    mono = samples.mean(axis=1)
+    middle = mono[len(mono) // 4:3 * len(mono) // 4]
+    spectrum = np.abs(np.fft.rfft(middle * np.hanning(len(middle))))
+    return float(np.fft.rfftfreq(len(middle), 1 / FRAME_RATE)[np.argmax(spectrum)])
+
+
+class WsolaTest(unittest.TestCase):
+
+    def test_output_length(self):
+        samples = tone(220, 1.3, channels=2)
+        for preset in PRESETS:
+            for rate in (0.5, 0.8, 1.0, 1.25, 2.0):
+                with self.subTest(preset=preset, rate=rate):
+                    out = wsola(samples, rate, FRAME_RATE, preset)
+                    self.assertEqual(out.shape, (int(round(len(samples) / rate)), 2))
+
+    def test_pitch_is_preserved(self):
+        samples = tone(220, 2.0)
+        for rate in (0.75, 1.5):
+            with self.subTest(rate=rate):
+                out = wsola(samples, rate, FRAME_RATE)
+                self.assertAlmostEqual(dominant_freq(out), 220, delta=5)
+
+    def test_unit_rate_keeps_signal(self):
+        samples = tone(220, 1.0)
+        out = wsola(samples, 1.0, FRAME_RATE)
+        self.assertLess(np.abs(out - samples).max(), 0.05)
+
+
+class TimeStretchSegmentTest(unittest.TestCase):
+
+    def test_keeps_format_and_scales_duration(self):
+        for sample_width in (1, 2):
+            with self.subTest(sample_width=sample_width):
+                audio = array_to_segment(tone(220, 1.0), AudioSegment.silent(
+                    duration=0, frame_rate=FRAME_RATE).set_sample_width(sample_width))
+                stretched = time_stretch(audio, 1.25)
+                self.assertEqual((stretched.frame_rate, stretched.sample_width, stretched.channels),
+                                 (FRAME_RATE, sample_width, 1))
+                self.assertEqual(len(stretched), 800)
+                self.assertAlmostEqual(dominant_freq(segment_to_array(stretched)), 220, delta=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
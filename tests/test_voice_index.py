@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from backend.audio_workers import write_wav
+from backend.voice_index import NotEnoughVoicesError, VoiceIndex
+
+FRAME_RATE = 16000
+
+
+class VoiceIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self._dir.name)
+        self.root = self.dir / 'refs'
+        self.root.mkdir()
+        self.index = VoiceIndex(self.dir / 'config')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _voice(self, name: str, freq: float, seconds: float = 1.0) -> str:
+        """写一段谐波丰富的合成音（不同基频对应不同音色）"""
+        path = str(self.root / name)
+        t = np.arange(int(FRAME_RATE * seconds)) / FRAME_RATE
+        wave = sum(np.sin(2 * np.pi * freq * h * t) / h for h in range(1, 6))
+        write_wav(path, (wave * 5000).astype(np.int16), 1, 2, FRAME_RATE)
+        return path
+
+    def test_sync_only_embeds_new_or_changed_files(self):
+        files = [self._voice('a.wav', 120), self._voice('b.wav', 220), self._voice('c.wav', 400)]
+        self.assertEqual(self.index.sync_directory(str(self.root), files),
+                         {'total': 3, 'updated': 3, 'removed': 0})
+        self.assertEqual(self.index.sync_directory(str(self.root), files)['updated'], 0)
+
+        self._voice('b.wav', 230, seconds=1.5)
+        self.assertEqual(self.index.sync_directory(str(self.root), files)['updated'], 1)
+
+        self.assertEqual(self.index.sync_directory(str(self.root), files[:2]),
+                         {'total': 2, 'updated': 0, 'removed': 1})
+        self.assertEqual(len(self.index), 2)
+
+    def test_sync_keeps_other_roots(self):
+        other = self.dir / 'refs2'
+        other.mkdir()
+        outside = str(other / 'x.wav')
+        write_wav(outside, np.zeros(FRAME_RATE, dtype=np.int16), 1, 2, FRAME_RATE)
+        self.index.update_files([outside])
+        self.index.sync_directory(str(self.root), [self._voice('a.wav', 120)])
+        self.assertEqual(len(self.index), 2)
+
+    def test_saved_index_is_reloaded(self):
+        files = [self._voice('a.wav', 120), self._voice('b.wav', 220)]
+        self.index.sync_directory(str(self.root), files)
+        reloaded = VoiceIndex(self.dir / 'config')
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual(reloaded.update_files(files), 0)
+
+    def test_rename_keeps_embedding(self):
+        files = [self._voice('a.wav', 120), self._voice('b.wav', 220), self._voice('c.wav', 400)]
+        self.index.sync_directory(str(self.root), files)
+        before = self.index.find_similar(files[0], k=2)
+
+        renamed = str(self.root / 'renamed.wav')
+        os.rename(files[1], renamed)
+        self.index.rename_file(files[1], renamed)
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.update_files([files[0], renamed, files[2]]), 0)
+
+        after = self.index.find_similar(files[0], k=2)
+        self.assertEqual([r['score'] for r in after], [r['score'] for r in before])
+        self.assertIn(renamed, [r['path'] for r in after])
+        self.assertNotIn(files[1], [r['path'] for r in after])
+
+    def test_find_similar_ranks_closest_voice_first(self):
+        files = [self._voice('low.wav', 110), self._voice('low2.wav', 115), self._voice('high.wav', 500)]
+        self.index.sync_directory(str(self.root), files)
+        results = self.index.find_similar(files[0], k=5)
+        self.assertEqual([r['path'] for r in results], [files[1], files[2]])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+    def test_find_similar_needs_two_distinct_voices(self):
+        with self.assertRaises(NotEnoughVoicesError):
+            self.index.find_similar(self._voice('a.wav', 120))
+
+        files = [str(self.root / 'a.wav')]
+        self.index.sync_directory(str(self.root), files)
+        with self.assertRaises(NotEnoughVoicesError):
+            self.index.find_similar(files[0])
+
+        # 内容相同的两个文件嵌入完全一样，标准化后无法比较
+        twin = str(self.root / 'twin.wav')
+        with open(files[0], 'rb') as src, open(twin, 'wb') as dst:
+            dst.write(src.read())
+        self.index.sync_directory(str(self.root), files + [twin])
+        self.assertEqual(len(self.index), 2)
+        with self.assertRaisesRegex(NotEnoughVoicesError, 'identical'):
+            self.index.find_similar(files[0])
+
+        self.index.sync_directory(str(self.root), files + [twin, self._voice('b.wav', 300)])
+        self.assertEqual(len(self.index.find_similar(files[0])), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from backend.waveform_peaks import (BASE_SAMPLES, LEVEL_FACTOR, PeakStore, compute_peaks, read_peaks,
+                                    write_peaks)
+
+FRAME_RATE = 24000
+
+
+class PeaksSelectTest(unittest.TestCase):
+
+    def setUp(self):
+        # 10 秒的斜坡，每个位置的取值已知
+        self.frames = FRAME_RATE * 10
+        ramp = np.linspace(-1, 1, self.frames, dtype=np.float32)[:, None]
+        self.peaks = compute_peaks(ramp, FRAME_RATE)
+
+    def test_levels(self):
+        self.assertEqual(self.peaks.duration_ms, 10000)
+        self.assertEqual(self.peaks.levels[0].samples_per_bin, BASE_SAMPLES)
+        for finer, coarser in zip(self.peaks.levels, self.peaks.levels[1:]):
+            self.assertEqual(coarser.samples_per_bin, finer.samples_per_bin * LEVEL_FACTOR)
+
+    def test_select_never_returns_more_bins_than_requested(self):
+        for bins in (1, 7, 100, 800, 5000, 10 ** 6):
+            with self.subTest(bins=bins):
+                level = self.peaks.select(bins)
+                self.assertLessEqual(len(level.data), bins)
+                self.assertGreaterEqual(level.samples_per_bin * len(level.data), self.frames)
+
+    def test_select_uses_coarsest_sufficient_level(self):
+        # 每格采样数不超过 240000 / 800 = 300 的最粗级别是 256，938 格再两两合并为 469 格
+        level = self.peaks.select(800)
+        self.assertEqual(level.samples_per_bin, BASE_SAMPLES * LEVEL_FACTOR * 2)
+        self.assertEqual(len(level.data), 469)
+        # 范围刚好是整数格时直接使用该级别，不合并
+        bins = 900
+        level = self.peaks.select(bins, 0, bins * BASE_SAMPLES * LEVEL_FACTOR)
+        self.assertEqual((level.samples_per_bin, len(level.data)), (BASE_SAMPLES * LEVEL_FACTOR, bins))
+
+    def test_select_full_range_keeps_extremes(self):
+        level = self.peaks.select(3)
+        self.assertEqual(int(level.data[:, 0].min()), -127)
+        self.assertEqual(int(level.data[:, 1].max()), 127)
+
+    def test_select_range(self):
+        start, end = FRAME_RATE * 2, FRAME_RATE * 3
+        level = self.peaks.select(100, start, end)
+        self.assertLessEqual(len(level.data), 100)
+        self.assertLessEqual(level.samples_per_bin, (end - start) // 100 * LEVEL_FACTOR)
+        # 斜坡在 2~3 秒之间的取值是 -0.6~-0.4
+        self.assertAlmostEqual(level.data[0, 0] / 127, -0.6, delta=0.02)
+        self.assertAlmostEqual(level.data[-1, 1] / 127, -0.4, delta=0.02)
+
+    def test_select_clamps_out_of_range(self):
+        self.assertEqual(len(self.peaks.select(10, self.frames * 2, self.frames * 3).data), 0)
+        full = self.peaks.select(50)
+        np.testing.assert_array_equal(self.peaks.select(50, -100, self.frames * 2).data, full.data)
+
+    def test_empty(self):
+        peaks = compute_peaks(np.zeros((0, 1), dtype=np.float32), FRAME_RATE)
+        self.assertEqual(peaks.duration_ms, 0)
+        self.assertEqual(len(peaks.select(100).data), 0)
+
+
+class PeaksSidecarTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self._dir.name)
+        self.source = str(self.dir / 'line.wav')
+        with open(self.source, 'wb') as f:
+            f.write(b'\0' * 100)
+        self.sidecar = self.source + '.peaks'
+        samples = np.sin(np.arange(FRAME_RATE) / 10).astype(np.float32)[:, None]
+        self.peaks = compute_peaks(samples, FRAME_RATE)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_round_trip(self):
+        write_peaks(self.sidecar, self.peaks, self.source)
+        loaded = read_peaks(self.sidecar, self.source)
+        self.assertEqual((loaded.frame_rate, loaded.frames), (FRAME_RATE, FRAME_RATE))
+        self.assertEqual(len(loaded.levels), len(self.peaks.levels))
+        for a, b in zip(loaded.levels, self.peaks.levels):
+            self.assertEqual(a.samples_per_bin, b.samples_per_bin)
+            np.testing.assert_array_equal(a.data, b.data)
+
+    def test_stale_when_source_changes(self):
+        write_peaks(self.sidecar, self.peaks, self.source)
+        with open(self.source, 'ab') as f:
+            f.write(b'\0')
+        self.assertIsNone(read_peaks(self.sidecar, self.source))
+        self.assertIsNotNone(read_peaks(self.sidecar))
+
+    def test_stale_when_mtime_changes_below_float_precision(self):
+        # 整秒时间加 1ns 在 float 秒里无法区分
+        mtime_ns = 1_700_000_000 * 10 ** 9
+        os.utime(self.source, ns=(mtime_ns, mtime_ns))
+        write_peaks(self.sidecar, self.peaks, self.source)
+        mtime = os.stat(self.source).st_mtime
+        os.utime(self.source, ns=(mtime_ns, mtime_ns + 1))
+        self.assertEqual(os.stat(self.source).st_mtime, mtime)
+        self.assertIsNone(read_peaks(self.sidecar, self.source))
+
+    def test_store_remove_deletes_cached_and_adjacent_sidecars(self):
+        store = PeakStore(self.dir / 'config')
+        cached = store.cache_path_for(self.source)
+        write_peaks(cached, self.peaks, self.source)
+        write_peaks(store.sidecar_for(self.source), self.peaks, self.source)
+        self.assertIsNotNone(store.get(self.source))
+
+        store.remove([self.source, str(self.dir / 'missing.wav')])
+        self.assertFalse(os.path.exists(cached))
+        self.assertFalse(os.path.exists(self.sidecar))
+        self.assertIsNone(store.get(self.source))
+
+    def test_corrupt_sidecar(self):
+        write_peaks(self.sidecar, self.peaks, self.source)
+        with open(self.sidecar, 'r+b') as f:
+            f.truncate(os.path.getsize(self.sidecar) - 1)
+        self.assertIsNone(read_peaks(self.sidecar, self.source))
+        self.assertIsNone(read_peaks(str(self.dir / 'missing.peaks')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,8 @@
 import { useState, useCallback, useEffect, useRef } from 'react';
 import { ProjectListPage } from './components/ProjectListPage';
 import { Workspace } from './components/Workspace';
-import { usePyWebView } from './hooks/usePyWebView';
-import type { AudioFile, RoleConfig, DubbingTask, Project } from './types';
+import { usePyWebView, useBackendEvents } from './hooks/usePyWebView';
+import type { AudioFile, RoleConfig, DubbingTask, Project, ProgressEvent, LibraryDeltaEvent, ScanEvent } from './types';
 import './index.css';
 
 // 批量生成进度状态
@@ -45,6 +45,8 @@ function App() {
   // 参考音
   const [referenceDirectory, setReferenceDirectory] = useState('');
   const [referenceAudios, setReferenceAudios] = useState<AudioFile[]>([]);
+  // 当前分页扫描的标识，旧扫描推送过来的页直接丢弃
+  const referenceScanRef = useRef('');
   const [favorites, setFavorites] = useState<string[]>([]);
   const [recentUsed, setRecentUsed] = useState<string[]>([]);
   const [playingAudio, setPlayingAudio] = useState<string | null>(null);
@@ -83,6 +85,18 @@ function App() {
     }
   }, [api]);
 
+  // 后台分页扫描参考音，结果通过 scan 事件逐页加入列表
+  const startReferenceScan = useCallback(async (directory: string) => {
+    if (!api) return;
+    const scanId = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    referenceScanRef.current = scanId;
+    setReferenceAudios([]);
+    const result = await api.scan_reference_audio_paged(directory, 3, 1024, 500, true, scanId);
+    if (!result.success) {
+      console.error('参考音扫描失败:', result.error);
+    }
+  }, [api]);
+
   const selectProject = useCallback(async (name: string) => {
     if (!api) return;
     const result = await api.load_project(name);
@@ -115,15 +129,12 @@ function App() {
       if (result.data.referenceDirectory) {
         setReferenceDirectory(result.data.referenceDirectory);
         // 扫描参考音文件
-        const scanResult = await api.scan_reference_audio_with_tags(result.data.referenceDirectory, 3, 1024);
-        if (scanResult.success) {
-          setReferenceAudios(scanResult.files);
-        }
+        startReferenceScan(result.data.referenceDirectory);
       }
 
       setView('workspace');
     }
-  }, [api]);
+  }, [api, startReferenceScan]);
 
   const saveProject = useCallback(async () => {
     if (!api || !currentProject || !projectData) return;
@@ -234,12 +245,50 @@ function App() {
         ...projectData,
         referenceDirectory: result.path
       });
-      const scanResult = await api.scan_reference_audio_with_tags(result.path, 3, 1024);
-      if (scanResult.success) {
-        setReferenceAudios(scanResult.files);
+      startReferenceScan(result.path);
+    }
+  }, [api, projectData, startReferenceScan]);
+
+  // 监听参考音目录，增量更新参考音列表和音色相似度索引
+  useEffect(() => {
+    if (!api || !referenceDirectory) return;
+    api.watch_reference_directory(referenceDirectory, 3, 1024);
+    api.build_voice_index(referenceDirectory, 3, 1024);
+    return () => {
+      api.unwatch_reference_directory();
+    };
+  }, [api, referenceDirectory]);
+
+  const handleBackendEvent = useCallback((event: string, data: ProgressEvent) => {
+    if (event === 'scan') {
+      const scan = data as unknown as ScanEvent;
+      if (scan.scanId !== referenceScanRef.current) return;
+      if (scan.type === 'page') {
+        const files = scan.files;
+        setReferenceAudios(prev => {
+          // 监听目录推送的增量可能已经加入了同一文件
+          const known = new Set(prev.map(a => a.fullPath));
+          return [...prev, ...files.filter(a => !known.has(a.fullPath))];
+        });
+      } else if (scan.type === 'error') {
+        console.error('参考音扫描失败:', scan.error);
       }
+      return;
     }
-  }, [api, projectData]);
+    if (event !== 'library') return;
+    const delta = data as unknown as LibraryDeltaEvent;
+    setReferenceAudios(prev => {
+      const dropped = new Set([...delta.removed, ...delta.renamed.map(r => r.from)]);
+      const upserts = [...delta.added, ...delta.renamed.map(r => r.file)];
+      const upsertPaths = new Set(upserts.map(a => a.fullPath));
+      return [
+        ...prev.filter(a => !dropped.has(a.fullPath) && !upsertPaths.has(a.fullPath)),
+        ...upserts
+      ];
+    });
+  }, []);
+
+  useBackendEvents(handleBackendEvent);
 
   const handleToggleFavorite = useCallback(async (audioPath: string, isFavorite: boolean) => {
     if (!api) return;
@@ -347,7 +396,7 @@ function App() {
 
       if (result.success) {
         setTasks(prev => prev.map(t =>
-          t.index === index ? { ...t, status: 'completed' as const, outputFile: result.output } : t
+          t.index === index ? { ...t, status: 'completed' as const, outputFile: result.output, loudness: result.loudness, timing: result.timing, spans: result.spans } : t
         ));
       } else {
         setTasks(prev => prev.map(t =>
@@ -439,7 +488,7 @@ function App() {
               if (result.success) {
                 completedCount++;
                 setTasks(prev => prev.map(t =>
-                  t.index === index ? { ...t, status: 'completed' as const, outputFile: result.output } : t
+                  t.index === index ? { ...t, status: 'completed' as const, outputFile: result.output, loudness: result.loudness, timing: result.timing, spans: result.spans } : t
                 ));
               } else {
                 failedCount++;
@@ -519,7 +568,31 @@ function App() {
     if (!api || !currentProject) return;
     const result = await api.export_project(currentProject);
     if (result.success) {
-      alert(`导出成功!\n路径: ${result.path}`);
+      const measured = result.loudness;
+      if (measured && Object.keys(measured).length > 0) {
+        setTasks(prev => prev.map(t => measured[t.index] ? { ...t, loudness: measured[t.index] } : t));
+      }
+      const parts = result.parts && result.parts.length > 1 ? `\n共 ${result.parts.length} 段` : '';
+      alert(`导出成功!\n路径: ${result.path}${parts}`);
+    } else if (result.invalid && result.invalid.length > 0) {
+      // 缺失或损坏的配音已在后端改回待生成，这里同步状态并自动重新生成
+      const invalid = new Map(result.invalid.map(item => [item.index, item.message]));
+      setTasks(prev => prev.map(t => invalid.has(t.index)
+        ? { ...t, status: 'pending' as const, error: invalid.get(t.index) }
+        : t));
+      const preview = result.invalid.slice(0, 5).map(item => `#${item.index + 1} ${item.message}`).join('\n');
+      alert(`有 ${result.invalid.length} 条配音缺失或损坏，将自动重新生成，完成后请再次导出\n${preview}`);
+      await handleBatchGenerate(result.invalid.map(item => item.index));
+    } else {
+      alert(`导出失败: ${result.error}`);
+    }
+  }, [api, currentProject, handleBatchGenerate]);
+
+  const handleExportSubtitles = useCallback(async () => {
+    if (!api || !currentProject) return;
+    const result = await api.export_subtitles(currentProject);
+    if (result.success) {
+      alert(`字幕导出成功!\n路径: ${result.path}`);
     } else {
       alert(`导出失败: ${result.error}`);
     }
@@ -578,6 +651,7 @@ function App() {
         onBatchGenerate={handleBatchGenerate}
         onStopGenerate={handleStopGenerate}
         onExport={handleExport}
+        onExportSubtitles={handleExportSubtitles}
         canExport={canExport}
         playingAudio={playingAudio}
         onPlayAudio={handlePlayAudio}
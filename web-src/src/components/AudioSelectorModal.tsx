@@ -1,6 +1,7 @@
-import { X, Search, Star, Clock, Music, Play, Square, Edit2, Save } from 'lucide-react';
+import { X, Search, Star, Clock, Music, Play, Square, Edit2, Save, Sparkles } from 'lucide-react';
 import { useState, useMemo } from 'react';
 import type { AudioFile } from '../types';
+import { usePyWebView } from '../hooks/usePyWebView';
 
 interface AudioSelectorModalProps {
   isOpen: boolean;
@@ -35,8 +36,27 @@ export function AudioSelectorModal({
   const [searchQuery, setSearchQuery] = useState('');
   const [editingNote, setEditingNote] = useState<string | null>(null);
   const [noteText, setNoteText] = useState('');
+  const { api } = usePyWebView();
+  const [similar, setSimilar] = useState<{ source: AudioFile; scores: Map<string, number> } | null>(null);
+
+  const handleFindSimilar = async (audio: AudioFile) => {
+    if (!api) return;
+    const res = await api.find_similar_voices(audio.fullPath, 20);
+    if (res.success) {
+      setSimilar({ source: audio, scores: new Map(res.results.map(r => [r.path, r.score])) });
+    } else {
+      alert(`无法查找相似音色: ${res.error}`);
+    }
+  };
 
   const filteredAudios = useMemo(() => {
+    // 相似音色模式：按相似度排序，忽略其他筛选
+    if (similar) {
+      return audios
+        .filter(a => similar.scores.has(a.fullPath))
+        .sort((a, b) => similar.scores.get(b.fullPath)! - similar.scores.get(a.fullPath)!);
+    }
+
     let result = audios;
 
     // 按类型筛选
@@ -68,7 +88,7 @@ export function AudioSelectorModal({
     }
 
     return result;
-  }, [audios, filterType, tagFilter, searchQuery, favorites, recentUsed]);
+  }, [audios, filterType, tagFilter, searchQuery, favorites, recentUsed, similar]);
 
   const handleSaveNote = (audioPath: string) => {
     onSetNote(audioPath, noteText);
@@ -147,6 +167,20 @@ export function AudioSelectorModal({
             ))}
           </div>
 
+          {/* Similar */}
+          {similar && (
+            <div className="flex items-center justify-between px-3 py-2 bg-indigo-50 text-indigo-700 rounded-lg text-sm">
+              <span>与「{similar.source.name}」音色相近</span>
+              <button
+                onClick={() => setSimilar(null)}
+                className="p-1 hover:bg-indigo-100 rounded"
+                title="返回全部"
+              >
+                <X size={16} />
+              </button>
+            </div>
+          )}
+
           {/* Search */}
           <div className="relative">
             <Search size={18} className="absolute left-3 top-1/2 -translate-y-1/2 text-gray-400" />
@@ -195,7 +229,14 @@ export function AudioSelectorModal({
                       {/* Info */}
                       <div className="flex-1 min-w-0">
                         <div className="flex items-start justify-between gap-2 mb-2">
-                          <h3 className="font-medium text-gray-800 truncate">{audio.name}</h3>
+                          <h3 className="font-medium text-gray-800 truncate">
+                            {audio.name}
+                            {similar?.scores.has(audio.fullPath) && (
+                              <span className="ml-2 text-xs text-indigo-500">
+                                {Math.round(similar.scores.get(audio.fullPath)! * 100)}%
+                              </span>
+                            )}
+                          </h3>
                           <div className="flex items-center gap-1 flex-shrink-0">
                             <button
                               onClick={() => onToggleFavorite(audio.fullPath, !isFavorite)}
@@ -208,6 +249,13 @@ export function AudioSelectorModal({
                             >
                               <Star size={18} fill={isFavorite ? 'currentColor' : 'none'} />
                             </button>
+                            <button
+                              onClick={() => handleFindSimilar(audio)}
+                              className="p-1.5 rounded text-gray-400 hover:text-indigo-600 hover:bg-indigo-50"
+                              title="查找相似音色"
+                            >
+                              <Sparkles size={18} />
+                            </button>
                             <button
                               onClick={() => {
                                 onSelect(audio);
@@ -42,6 +42,7 @@ interface WorkspaceProps {
   onBatchGenerate: (indices: number[]) => void;
   onStopGenerate: () => void;
   onExport: () => void;
+  onExportSubtitles: () => void;
   canExport: boolean;
   playingAudio: string | null;
   onPlayAudio: (audioPath: string) => void;
@@ -73,6 +74,7 @@ export function Workspace({
   onBatchGenerate,
   onStopGenerate,
   onExport,
+  onExportSubtitles,
   canExport,
   playingAudio,
   onPlayAudio,
@@ -200,6 +202,14 @@ export function Workspace({
                 <Download size={16} />
                 导出
               </button>
+              <button
+                onClick={onExportSubtitles}
+                disabled={!canExport}
+                className="px-3 py-1.5 text-sm text-green-700 border border-green-600 rounded-lg hover:bg-green-50 disabled:text-gray-400 disabled:border-gray-300 disabled:cursor-not-allowed"
+                title={canExport ? '只导出字幕（不处理音频）' : '请先完成所有任务'}
+              >
+                仅字幕
+              </button>
               <div className="w-px h-6 bg-gray-300" />
               <button
                 onClick={() => setShowSidebar(!showSidebar)}
@@ -32,8 +32,13 @@ export function usePyWebView() {
 export function useBackendEvents(onEvent: (event: string, data: ProgressEvent) => void) {
   useEffect(() => {
     window.onBackendEvent = onEvent;
+    // 后端按批推送事件，逐条分发
+    window.onBackendEvents = (events) => {
+      events.forEach(e => onEvent(e.event, e.data));
+    };
     return () => {
       window.onBackendEvent = undefined;
+      window.onBackendEvents = undefined;
     };
   }, [onEvent]);
 }
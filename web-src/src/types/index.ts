@@ -6,6 +6,7 @@ export interface AudioFile {
   tags?: string[];
   note?: string;
   isFavorite?: boolean;
+  mtime?: number;
 }
 
 export interface AnalysisResult {
@@ -16,6 +17,41 @@ export interface AnalysisResult {
   type: string;
   tags: string[];
   description: string;
+  warnings?: string[];
+}
+
+export interface AcousticFeatures {
+  version: number;
+  duration: number;
+  f0Median: number | null;
+  f0P10: number | null;
+  f0P90: number | null;
+  f0RangeSemitones: number | null;
+  voicedRatio: number;
+  spectralCentroid: number;
+  loudnessDb: number;
+  loudnessStdDb: number;
+  dynamicRangeDb: number;
+  speakingRate: number;
+}
+
+export interface VoiceEstimate {
+  gender: string;
+  age: string;
+  tags: string[];
+}
+
+export interface FeatureEvent {
+  type: 'start' | 'completed' | 'error' | 'finish';
+  file?: string;
+  current?: number;
+  total?: number;
+  features?: AcousticFeatures;
+  estimate?: VoiceEstimate;
+  error?: string;
+  done?: number;
+  cached?: number;
+  failed?: number;
 }
 
 export interface ParsedLine {
@@ -38,6 +74,80 @@ export interface DubbingTask {
   status: 'pending' | 'generating' | 'completed' | 'error';
   outputFile?: string;
   error?: string;
+  loudness?: LoudnessInfo;
+  timing?: LineTiming;
+  spans?: LineSpans;
+}
+
+// 生成一条配音各阶段的耗时（秒）
+export type LineStage = 'encode' | 'upload' | 'server' | 'download' | 'queue' | 'decode' | 'trim' | 'speed' | 'write' | 'analyze';
+export type LineSpans = Partial<Record<LineStage, number>>;
+
+export interface StageHistogram {
+  count: number;
+  sum: number;
+  mean: number | null;
+  p50: number | null;
+  p95: number | null;
+  buckets: Record<string, number>;
+}
+
+export interface StageReport {
+  count: number;
+  total: number;
+  mean: number;
+  p50: number;
+  p95: number;
+  max: number;
+  share: number;
+}
+
+export interface PerformanceReport {
+  lines: number;
+  totalSeconds: number;
+  bottleneck: string | null;
+  stages: Record<string, StageReport>;
+}
+
+// 生成时记录的精确时长（导出字幕时不需要读音频）
+export interface LineTiming {
+  frames: number;
+  frameRate: number;
+  durationMs: number;
+  size: number;
+  mtime: number;
+  checksum?: string;
+}
+
+// 导出前校验发现的缺失或损坏的配音
+export type OutputIssue = 'missing' | 'bad_header' | 'undecodable' | 'truncated' | 'empty' | 'length_mismatch' | 'checksum_mismatch';
+
+export interface InvalidOutput {
+  index: number;
+  outputFile: string;
+  issue: OutputIssue;
+  message: string;
+}
+
+export type SubtitleFormat = 'srt' | 'vtt' | 'lrc' | 'json';
+
+export type ExportSplitMode = 'none' | 'chapters' | 'duration';
+
+// 分段导出的一段
+export interface ExportPart {
+  number: number;
+  title: string;
+  duration: number;
+  lines: [number, number];
+}
+
+// 配音的响度测量（生成时计算，导出归一化时复用）
+export interface LoudnessInfo {
+  version: number;
+  lufs: number | null;
+  peakDb: number | null;
+  size: number;
+  mtime: number;
 }
 
 export interface Project {
@@ -61,6 +171,63 @@ export interface ProgressEvent {
   result?: AnalysisResult;
   error?: string;
   success?: number;
+  skipped?: number;
+  cached?: boolean;
+  stopped?: boolean;
+  stats?: AnalysisStats;
+}
+
+export interface AnalysisStats {
+  elapsed: number;
+  filesDone: number;
+  filesFailed: number;
+  filesCached: number;
+  requests: number;
+  retries: number;
+  throttled: number;
+  bytesUploaded: number;
+  bytesSaved: number;
+  filesPerMinute: number;
+  uploadBytesPerSecond: number;
+}
+
+export interface SearchFacet {
+  value: string;
+  count: number;
+}
+
+export interface ReferenceSearchResult extends AudioFile {
+  analysis: Omit<AnalysisResult, 'path' | 'tags'> | null;
+  estimate: VoiceEstimate | null;
+}
+
+export interface ReferenceSearchResponse extends ApiResponse {
+  results: ReferenceSearchResult[];
+  total: number;
+  facets: Record<'tags' | 'gender' | 'age' | 'type', SearchFacet[]>;
+}
+
+export interface LibraryDeltaEvent {
+  type: 'delta';
+  directory: string;
+  added: AudioFile[];
+  removed: string[];
+  renamed: Array<{ from: string; to: string; file: AudioFile }>;
+}
+
+export type ScanEvent =
+  | { type: 'page'; scanId: string; directory: string; page: number; files: AudioFile[] }
+  | { type: 'finish'; scanId: string; directory: string; total: number }
+  | { type: 'error'; scanId: string; directory: string; error: string };
+
+export interface ScanReferencePagedResponse extends ApiResponse {
+  directory?: string;
+  scanId?: string;
+}
+
+export interface SimilarVoice {
+  path: string;
+  score: number;
 }
 
 export interface ApiResponse<T = unknown> {
@@ -80,6 +247,7 @@ export interface ScanFilesResponse extends ApiResponse {
 
 export interface StartAnalysisResponse extends ApiResponse {
   csvPath: string;
+  resumed: boolean;
 }
 
 export interface GetResultsResponse extends ApiResponse {
@@ -91,6 +259,7 @@ export interface GetStatusResponse {
   selectedDirectory: string;
   fileCount: number;
   resultCount: number;
+  stats: AnalysisStats;
 }
 
 export interface ExportCsvResponse extends ApiResponse {
@@ -123,22 +292,48 @@ export interface ProjectResponse extends ApiResponse {
   data?: Project;
 }
 
+// 波形峰值：peaks 为 base64 编码的 int8 数据，每格依次为最小值、最大值（-127~127）
+export interface WaveformPeaks {
+  frameRate: number;
+  durationMs: number;
+  startMs: number;
+  samplesPerBin: number;
+  bins: number;
+  peaks: string;
+}
+
+export interface ProjectPeaksLine extends WaveformPeaks {
+  index: number;
+  offsetMs: number;
+}
+
 export interface GenerateAudioResponse extends ApiResponse {
   output: string;
+  loudness?: LoudnessInfo;
+  timing?: LineTiming;
+  spans?: LineSpans;
   line_index: number;
 }
 
 export interface PyWebViewApi {
   select_directory(): Promise<SelectDirectoryResponse>;
   scan_audio_files(directory?: string): Promise<ScanFilesResponse>;
-  start_analysis(output_dir?: string): Promise<StartAnalysisResponse>;
+  start_analysis(output_dir?: string, resume_csv?: string, force?: boolean, num_workers?: number, paths?: string[]): Promise<StartAnalysisResponse>;
   stop_analysis(): Promise<ApiResponse>;
+  start_feature_extraction(directory?: string): Promise<ApiResponse>;
+  stop_feature_extraction(): Promise<ApiResponse>;
+  get_acoustic_features(audio_path: string): Promise<{ success: boolean; features?: AcousticFeatures; estimate?: VoiceEstimate; error?: string }>;
   get_results(): Promise<GetResultsResponse>;
   get_status(): Promise<GetStatusResponse>;
   export_csv(output_path?: string): Promise<ExportCsvResponse>;
   select_reference_directory(): Promise<SelectDirectoryResponse>;
   scan_reference_audio(directory: string, max_depth?: number, max_size_kb?: number): Promise<ScanReferenceResponse>;
   scan_reference_audio_with_tags(directory: string, max_depth?: number, max_size_kb?: number): Promise<ScanReferenceResponse>;
+  scan_reference_audio_paged(directory: string, max_depth?: number, max_size_kb?: number, page_size?: number, with_tags?: boolean, scan_id?: string): Promise<ScanReferencePagedResponse>;
+  watch_reference_directory(directory: string, max_depth?: number, max_size_kb?: number): Promise<ApiResponse>;
+  unwatch_reference_directory(): Promise<ApiResponse>;
+  build_voice_index(directory: string, max_depth?: number, max_size_kb?: number): Promise<ApiResponse>;
+  find_similar_voices(audio_path: string, k?: number, directory?: string): Promise<{ success: boolean; results: SimilarVoice[]; error?: string }>;
   parse_text_content(text: string, delimiter?: string): Promise<ParseTextResponse>;
   list_projects(): Promise<ProjectListResponse>;
   create_project(name?: string): Promise<ProjectResponse>;
@@ -158,8 +353,16 @@ export interface PyWebViewApi {
   set_audio_tags(audio_path: string, tags: string[]): Promise<ApiResponse>;
   get_audio_tags(audio_path: string): Promise<{ success: boolean; tags: string[] }>;
   extract_audio_tags(filename: string): Promise<{ success: boolean; tags: string[] }>;
+  search_reference_audio(query?: string, filters?: { tags?: string[]; gender?: string; age?: string; type?: string; favorite?: boolean; root?: string }, limit?: number, offset?: number): Promise<ReferenceSearchResponse>;
+  import_analysis_csv(csv_path: string, base_dir: string): Promise<{ success: boolean; count?: number; error?: string }>;
   get_audio_data_url(audio_path: string): Promise<{ success: boolean; dataUrl?: string; mimeType?: string; size?: number; error?: string }>;
-  export_project(project_name: string): Promise<{ success: boolean; path?: string; error?: string }>;
+  get_waveform_peaks(audio_path: string, bins?: number, start_ms?: number, end_ms?: number): Promise<{ success: boolean; error?: string } & Partial<WaveformPeaks>>;
+  get_project_peaks(project_name: string, bins?: number): Promise<{ success: boolean; durationMs?: number; lines?: ProjectPeaksLine[]; error?: string }>;
+  get_metrics(): Promise<{ success: boolean; uptime?: number; stages?: Record<string, StageHistogram>; counters?: Record<string, number>; error?: string }>;
+  get_performance_report(project_name: string): Promise<{ success: boolean; error?: string } & Partial<PerformanceReport>>;
+  export_subtitles(project_name: string, formats?: SubtitleFormat[]): Promise<{ success: boolean; path?: string; files?: string[]; cues?: number; error?: string }>;
+  verify_project(project_name: string, check_checksum?: boolean): Promise<{ success: boolean; checked?: number; invalid?: InvalidOutput[]; error?: string }>;
+  export_project(project_name: string, subtitle_formats?: SubtitleFormat[], split_mode?: ExportSplitMode, max_part_minutes?: number): Promise<{ success: boolean; path?: string; parts?: ExportPart[]; manifest?: string | null; loudness?: Record<number, LoudnessInfo>; invalid?: InvalidOutput[]; error?: string }>;
 }
 
 declare global {
@@ -168,5 +371,6 @@ declare global {
       api: PyWebViewApi;
     };
     onBackendEvent?: (event: string, data: ProgressEvent) => void;
+    onBackendEvents?: (events: Array<{ event: string; data: ProgressEvent }>) => void;
   }
 }